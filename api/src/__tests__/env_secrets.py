@@ -0,0 +1,33 @@
+import env
+
+
+def test_env_secrets_file(tmp_path, monkeypatch):
+    secrets_file = tmp_path / 'secrets.env'
+    secrets_file.write_text('# local secrets\nDATABASE_APP_HOST=localhost\nexport DATABASE_APP_PORT="5432"\n')
+    monkeypatch.setenv('SECRETS_FILE', str(secrets_file))
+    monkeypatch.delenv('DATABASE_APP_HOST', raising=False)
+    monkeypatch.delenv('DATABASE_APP_PORT', raising=False)
+    monkeypatch.delenv('SERVICE_CACHE_POOL_SIZE', raising=False)
+    env.secrets_load(force=True)
+    # --- tests: values come from the file
+    assert env.env_get_database_app_host() == 'localhost', 'Secret not read from file'
+    assert env.env_get_database_app_port() == '5432', 'Quoted/exported secret not read from file'
+    # --- tests: os.environ wins over the snapshot
+    monkeypatch.setenv('DATABASE_APP_HOST', 'db.internal')
+    assert env.env_get_database_app_host() == 'db.internal', 'os.environ should override secrets'
+
+
+def test_env_secrets_fetched_once(tmp_path, monkeypatch):
+    secrets_file = tmp_path / 'secrets.json'
+    secrets_file.write_text('{"MEMBER_ID_SUFFIX_KEY": "abc"}')
+    monkeypatch.setenv('SECRETS_FILE', str(secrets_file))
+    monkeypatch.delenv('MEMBER_ID_SUFFIX_KEY', raising=False)
+    monkeypatch.delenv('WORKER_CONCURRENCY', raising=False)
+    env.secrets_load(force=True)
+    fetches = []
+    monkeypatch.setattr(env, '_secrets_fetch', lambda: fetches.append(1) or {})
+    # --- tests: present + missing keys are both answered from the snapshot (no refetch)
+    for _ in range(3):
+        assert env.env_get_member_id_suffix_key() == 'abc', 'Secret not read from snapshot'
+        assert env.env_get_worker_concurrency() == 4, 'Missing key should fall back to default'
+    assert len(fetches) == 0, 'Secrets were refetched'
@@ -1,39 +1,94 @@
 from contextvars import ContextVar
+import time
+import orjson
 from sanic import Sanic
 from sanic_cors import CORS
 
 from api.error_handler import APIErrorHandler
+from api.middleware import endpoint_cache_invalidation_listener
 import env
+from dbs.database_redis import redis_client_close, redis_client_connect
 from dbs.routes import blueprint_database
-from dbs.sa_sessions import create_sqlalchemy_session
+from dbs.sa_sessions import LazySQLAlchemySession, sqlalchemy_engine_connect, sqlalchemy_engine_dispose, sqlalchemy_session_stats_record
+from jobs.routes import blueprint_jobs
+from member_id.member_id_suffix import member_id_suffix_key
 from member_id.routes import blueprint_member_id
+from metrics.metrics_aggregate import metrics_snapshot_publisher
+from metrics.metrics_registry import metrics_counter_inc, metrics_histogram_observe, metrics_labels
+from metrics.routes import blueprint_metrics
 
 
 # INIT
-app_api = Sanic('api')
+# --- orjson encodes every json() response (straight to bytes) + decodes request bodies. non-str keys are allowed, like the stdlib encoder
+app_api = Sanic('api', dumps=lambda body, **kwargs: orjson.dumps(body, option=orjson.OPT_NON_STR_KEYS), loads=orjson.loads)
 # --- cors (TODO: make it restrictive to domains of frontend services)
 CORS(app_api)
 
 
+# LISTENERS
+# --- secrets snapshot (per worker, so the fetch happens before serving rather than on a request)
+@app_api.listener('before_server_start')
+async def load_secrets(app):
+    env.secrets_load()
+    member_id_suffix_key() # fail at boot, not on the first create, if the suffix key is missing
+# --- db engine + pool (per worker)
+@app_api.listener('before_server_start')
+async def connect_database(app):
+    sqlalchemy_engine_connect()
+@app_api.listener('after_server_stop')
+async def close_database(app):
+    await sqlalchemy_engine_dispose()
+# --- cache client + pool (per worker)
+@app_api.listener('before_server_start')
+async def connect_cache(app):
+    await redis_client_connect()
+    app.add_task(endpoint_cache_invalidation_listener(), name='endpoint_cache_invalidation_listener')
+@app_api.listener('after_server_stop')
+async def close_cache(app):
+    await app.cancel_task('endpoint_cache_invalidation_listener', raise_exception=False)
+    await app.cancel_task('metrics_snapshot_publisher', raise_exception=False)
+    await redis_client_close()
+# --- metrics (each worker publishes a snapshot, so /metrics on any worker can sum the node)
+@app_api.listener('after_server_start')
+async def publish_metrics(app):
+    app.add_task(metrics_snapshot_publisher(), name='metrics_snapshot_publisher')
+
+
 # MIDDLEWARE
+# --- route latency + status (registered first, so it wraps the other middleware. response middleware runs in reverse)
+@app_api.middleware('request')
+async def start_request_timer(request):
+    request.ctx.started_at = time.perf_counter()
+@app_api.middleware('response')
+async def record_request_metrics(request, response):
+    if hasattr(request.ctx, 'started_at'):
+        route_labels = metrics_labels(route=request.uri_template if request.route != None else 'unmatched', method=request.method)
+        metrics_histogram_observe('http_request_duration_seconds', route_labels, time.perf_counter() - request.ctx.started_at)
+        metrics_counter_inc('http_requests_total', f'{route_labels},{metrics_labels(status=response.status if response != None else 0)}')
 # --- db driver + session context (https://docs.sqlalchemy.org/en/14/orm/session_api.html#sqlalchemy.orm.Session.params.autocommit)
+# --- sessions are lazy, so cache hits + validation failures never create one or touch the pool
 _base_model_session_ctx = ContextVar('session')
 @app_api.middleware('request')
 async def inject_session(request):
-    request.ctx.session = create_sqlalchemy_session()
+    request.ctx.session = LazySQLAlchemySession()
     request.ctx.session_ctx_token = _base_model_session_ctx.set(request.ctx.session)
 @app_api.middleware('response')
 async def close_session(request, response):
     if hasattr(request.ctx, "session_ctx_token"):
         _base_model_session_ctx.reset(request.ctx.session_ctx_token)
+        sqlalchemy_session_stats_record(request.ctx.session)
         await request.ctx.session.close()
 
 
 # ROUTES (felt like set/list/dict was too easy, so decided to do w/ ORM example)
 # --- databases
 app_api.blueprint(blueprint_database)
+# --- jobs
+app_api.blueprint(blueprint_jobs)
 # --- members
 app_api.blueprint(blueprint_member_id)
+# --- metrics
+app_api.blueprint(blueprint_metrics)
 
 
 # ERROR HANDLER
@@ -48,5 +103,5 @@ def start_api():
         host=host,
         port=port,
         auto_reload=env.env_is_local(),
-        workers=2)
+        workers=1 if env.env_is_database_app_sqlite() else 2) # sqlite: one process, so its one writer connection is the only writer
  
\ No newline at end of file
@@ -1,37 +1,237 @@
+import asyncio
 from functools import wraps
-import json as json_lib
-from sanic.response import json
+import time
+import uuid
+from redis.exceptions import RedisError
+from sanic.response import HTTPResponse
 
+from dbs.cache_local import LocalCache
 from dbs.database_redis import Cacher
+from metrics.metrics_registry import metrics_counter_inc, metrics_histogram_observe, metrics_labels
 
-def endpoint_cache(expire: int, key_on: str = None):
+
+# Endpoint Cache Thoughts:
+# - entries hold the encoded body + headers we sent, so a hit is just bytes back out (no json decode/encode)
+# - an entry is 'fresh' for `expire` seconds, then 'stale' for another `stale` seconds before redis drops it
+# - single flight: one request rebuilds an expired entry (w/ a redis lock across workers + a shared future within a worker),
+#   everyone else gets the stale copy, or waits for the rebuild if there's nothing stale to give
+# - a slow/down cache is treated as a miss, it shouldn't take the endpoint down w/ it
+# - two tiers: an opt-in LRU inside each worker (L1, `local_ttl`) in front of redis (L2)
+# - every endpoint has a generation number in redis that's part of its keys. writes bump it (orphaning every L2 entry at once)
+#   and publish the bump, so each worker drops its L1 entries for that endpoint
+
+ENDPOINT_CACHE_LOCAL_MAXSIZE = 1024 # entries per worker
+_CACHE_LOCK_WAIT_INTERVAL = 0.025 # seconds between checks while another worker rebuilds an entry
+_CACHE_INVALIDATE_CHANNEL = ['endpoint_cache', 'invalidate']
+
+_inflight_rebuilds: dict[str, asyncio.Future] = {} # cache key -> future of the entry being rebuilt in this worker
+_local_cache = LocalCache(maxsize=ENDPOINT_CACHE_LOCAL_MAXSIZE)
+_endpoint_generations: dict[str, int] = {} # endpoint name -> generation, as last seen by this worker
+_remote_cache_stats = { 'hits': 0, 'stale_hits': 0, 'misses': 0, 'errors': 0 }
+
+
+def endpoint_cache_stats() -> dict:
+    '''Hit/miss counters per tier, for this worker'''
+    return { 'l1': _local_cache.stats(), 'l2': dict(_remote_cache_stats) }
+
+
+def _endpoint_generation_apply(endpoint_name: str, generation: int):
+    if generation > _endpoint_generations.get(endpoint_name, -1):
+        _endpoint_generations[endpoint_name] = generation
+        _local_cache.delete_prefix(f'endpoint_cache:::{endpoint_name}:::')
+
+async def _endpoint_generation(endpoint_name: str) -> int:
+    '''Generation for an endpoint's keys. Fetched once per worker, then kept current by the invalidation listener'''
+    if endpoint_name not in _endpoint_generations:
+        try:
+            generation = await Cacher().get(['endpoint_cache_generation', endpoint_name])
+        except RedisError:
+            return 0
+        _endpoint_generation_apply(endpoint_name, int(generation or 0))
+    return _endpoint_generations[endpoint_name]
+
+
+async def endpoint_cache_invalidate(*endpoints):
+    '''Drops every cached response for the given (decorated) endpoints, on all workers + nodes'''
+    cacher = Cacher()
+    for endpoint in endpoints:
+        try:
+            generation = await cacher.incr(['endpoint_cache_generation', endpoint.__name__])
+            _endpoint_generation_apply(endpoint.__name__, generation)
+            await cacher.publish(_CACHE_INVALIDATE_CHANNEL, f'{endpoint.__name__}:{generation}')
+        except RedisError:
+            _remote_cache_stats['errors'] += 1
+            metrics_counter_inc('endpoint_cache_errors_total', metrics_labels(endpoint=endpoint.__name__))
+
+
+async def endpoint_cache_invalidation_listener():
+    '''Keeps this worker's L1 coherent. Run as a background task per worker'''
+    cacher = Cacher()
+    while True:
+        pubsub = cacher.pubsub()
+        try:
+            await pubsub.subscribe(cacher.namespace_key(_CACHE_INVALIDATE_CHANNEL))
+            # --- anything we hold could have been invalidated while we weren't listening
+            _local_cache.clear()
+            _endpoint_generations.clear()
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    endpoint_name, generation = message['data'].decode().rsplit(':', 1)
+                    _endpoint_generation_apply(endpoint_name, int(generation))
+        except RedisError:
+            _remote_cache_stats['errors'] += 1
+            metrics_counter_inc('endpoint_cache_errors_total', metrics_labels(endpoint='_invalidation_listener'))
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.reset()
+
+
+def _entry_from_response(response, expire: int) -> dict:
+    return {
+        'body': response.body or b'',
+        'status': response.status,
+        'content_type': response.content_type or '',
+        'headers': '\r\n'.join(f'{name}: {value}' for name, value in response.headers.items()
+            if name.lower() not in ('content-type', 'content-length')),
+        'fresh_until': time.time() + expire,
+    }
+
+def _entry_from_cache(cached_hash: dict[bytes, bytes]) -> dict:
+    return {
+        'body': cached_hash[b'body'],
+        'status': int(cached_hash[b'status']),
+        'content_type': cached_hash[b'content_type'].decode(),
+        'headers': cached_hash[b'headers'].decode(),
+        'fresh_until': float(cached_hash[b'fresh_until']),
+    }
+
+def _response_from_entry(entry: dict) -> HTTPResponse:
+    headers = dict(line.split(': ', 1) for line in entry['headers'].split('\r\n') if line)
+    return HTTPResponse(entry['body'], status=entry['status'], headers=headers, content_type=entry['content_type'])
+
+
+def endpoint_cache(expire: int, key_on: str = None, stale: int = 0, lock_timeout: int = 5, local_ttl: float = None):
     '''
     Sanic endpoint decorator request/response auto-caching.
-    expire: seconds held in cache
-    key_on: 'json' or 'args' or None. That can be pulled off the request obj and serialized for key
+    expire: seconds held in cache as fresh
+    key_on: 'json' or 'args' or None. That can be pulled off the request obj and used raw for key
+    stale: extra seconds an expired entry can be served while one request rebuilds it (stale-while-revalidate)
+    lock_timeout: max seconds one request holds the rebuild lock (others stop waiting on it after this)
+    local_ttl: if set, fresh entries are also held in this worker's memory for up to this many seconds
     '''
     def decorator(f):
+        # --- metric labels per endpoint, formed once
+        metric_labels = metrics_labels(endpoint=f.__name__)
+        metric_labels_lookup = { (tier, result): metrics_labels(endpoint=f.__name__, tier=tier, result=result) for tier in ('l1', 'l2') for result in ('hit', 'stale', 'miss') }
+        metric_labels_get, metric_labels_set = metrics_labels(endpoint=f.__name__, operation='get'), metrics_labels(endpoint=f.__name__, operation='set')
+
+        def cache_error():
+            _remote_cache_stats['errors'] += 1
+            metrics_counter_inc('endpoint_cache_errors_total', metric_labels)
+
         @wraps(f)
         async def decorated_function(request, *args, **kwargs):
             # PARAMS/KEY
-            cache_keys = ['endpoint_cache', f.__name__]
+            cache_keys = ['endpoint_cache', f.__name__, f'g{await _endpoint_generation(f.__name__)}']
             if key_on != None:
-                key_request_params = json_lib.dumps(request.args if key_on == 'args' else request.json)
-                cache_keys.append(key_request_params)
+                cache_keys.append(request.query_string if key_on == 'args' else request.body.decode())
+            cache_key = ':::'.join(cache_keys)
+            cacher = Cacher()
+
+            def cache_set_local(entry: dict):
+                if local_ttl != None:
+                    _local_cache.set(cache_key, entry, expires_at=min(entry['fresh_until'], time.time() + local_ttl))
+
+            async def cache_get() -> dict or None:
+                started = time.perf_counter()
+                try:
+                    cached_hash = await cacher.get_hash(cache_keys)
+                except RedisError:
+                    cache_error()
+                    return None
+                finally:
+                    metrics_histogram_observe('endpoint_cache_operation_duration_seconds', metric_labels_get, time.perf_counter() - started)
+                return _entry_from_cache(cached_hash) if cached_hash != None else None
+
+            async def rebuild() -> tuple[dict or None, HTTPResponse]:
+                '''Runs the endpoint and stores its response. Returns (entry, response), entry is None if it can't be cached'''
+                response = await f(request, *args, **kwargs)
+                # --- streamed responses have already been sent, and we only keep successes
+                if response == None or response.status != 200:
+                    return None, response
+                entry = _entry_from_response(response, expire)
+                started = time.perf_counter()
+                try:
+                    await cacher.set_hash(cache_keys, entry, ex=expire + stale)
+                except RedisError:
+                    cache_error()
+                finally:
+                    metrics_histogram_observe('endpoint_cache_operation_duration_seconds', metric_labels_set, time.perf_counter() - started)
+                cache_set_local(entry)
+                return entry, response
+
+            async def rebuild_single_flight(stale_entry: dict = None) -> HTTPResponse:
+                # --- another request in this worker is already rebuilding, share its result
+                if cache_key in _inflight_rebuilds:
+                    entry = await asyncio.shield(_inflight_rebuilds[cache_key])
+                    return _response_from_entry(entry) if entry != None else (await f(request, *args, **kwargs))
+                future = asyncio.get_running_loop().create_future()
+                _inflight_rebuilds[cache_key] = future
+                lock_keys, lock_token = ['endpoint_cache_lock', *cache_keys[1:]], uuid.uuid4().hex
+                entry = None
+                try:
+                    # --- another worker is rebuilding. serve stale if we have it, otherwise wait for theirs to land
+                    try:
+                        is_locked_by_other = not await cacher.lock_acquire(lock_keys, lock_token, ex_ms=lock_timeout * 1000)
+                    except RedisError:
+                        is_locked_by_other = False
+                    if is_locked_by_other and stale_entry != None:
+                        _remote_cache_stats['stale_hits'] += 1
+                        metrics_counter_inc('endpoint_cache_lookups_total', metric_labels_lookup[('l2', 'stale')])
+                        entry = stale_entry
+                        return _response_from_entry(entry)
+                    if is_locked_by_other:
+                        wait_until = time.time() + lock_timeout
+                        while time.time() < wait_until:
+                            await asyncio.sleep(_CACHE_LOCK_WAIT_INTERVAL)
+                            entry = await cache_get()
+                            if entry != None and entry['fresh_until'] > time.time():
+                                cache_set_local(entry)
+                                return _response_from_entry(entry)
+                        entry = None
+                    # --- we're the one rebuilding
+                    try:
+                        entry, response = await rebuild()
+                    finally:
+                        if not is_locked_by_other:
+                            try:
+                                await cacher.lock_release(lock_keys, lock_token)
+                            except RedisError:
+                                pass
+                    return response
+                finally:
+                    del _inflight_rebuilds[cache_key]
+                    future.set_result(entry)
 
             # CHECK CACHE
-            cached_response = Cacher().get(cache_keys)
-            # --- if cache hit, interrupt and respond with value (prior payload)
-            if cached_response != None:
-                print('endpoint cache hit!')
-                return json(json_lib.loads(cached_response))
-            
-            # MISS? RESPOND
-            response = await f(request, *args, **kwargs)
-            # --- cache the outgoing json payload
-            Cacher().set(cache_keys, json_lib.dumps(response.raw_body), ex=expire)
-            # --- respond
-            return response
+            # --- L1 (this worker's memory)
+            if local_ttl != None:
+                entry = _local_cache.get(cache_key)
+                metrics_counter_inc('endpoint_cache_lookups_total', metric_labels_lookup[('l1', 'miss' if entry == None else 'hit')])
+                if entry != None:
+                    return _response_from_entry(entry)
+            # --- L2 (redis). if fresh hit, interrupt and respond with value (prior payload, as sent)
+            entry = await cache_get()
+            if entry != None and entry['fresh_until'] > time.time():
+                _remote_cache_stats['hits'] += 1
+                metrics_counter_inc('endpoint_cache_lookups_total', metric_labels_lookup[('l2', 'hit')])
+                cache_set_local(entry)
+                return _response_from_entry(entry)
+            _remote_cache_stats['misses'] += 1
+            metrics_counter_inc('endpoint_cache_lookups_total', metric_labels_lookup[('l2', 'miss')])
+
+            # MISS/STALE? REBUILD (once)
+            return await rebuild_single_flight(stale_entry=entry)
 
         return decorated_function
-    return decorator
\ No newline at end of file
+    return decorator
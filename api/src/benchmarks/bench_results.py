@@ -0,0 +1,105 @@
+# Benchmark results: machine readable baselines (JSON) for micro.py + load.py, so runs can be compared across commits
+# Baselines are only comparable on the same machine, so none are committed (benchmarks/baselines/ is gitignored). Record one on the machine
+# you compare on (ex: CI runs the parent commit w/ --out, then the change w/ --compare), and results_compare refuses a baseline from another machine
+
+import datetime
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+# --- which direction is better, by metric name suffix. metrics w/ neither suffix (ex: counts) are reported but never compared
+HIGHER_IS_BETTER_SUFFIX = '_per_second'
+LOWER_IS_BETTER_SUFFIX = '_ms'
+
+
+def _git_commit() -> str or None:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        is_dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip() != ''
+        return f'{commit}-dirty' if is_dirty else commit
+    except Exception:
+        return None
+
+
+def _machine() -> str:
+    '''What a run's numbers depend on: os/arch, cpu model + count'''
+    cpu_model = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as file:
+            cpu_model = next((line.split(':', 1)[1].strip() for line in file if line.startswith('model name')), cpu_model)
+    except OSError:
+        pass
+    return f'{platform.system()} {platform.machine()} {cpu_model or "unknown cpu"} ({os.cpu_count()} cpus)'
+
+
+def percentile(values: list[float], percent: float) -> float:
+    '''Nearest-rank percentile (ex: percent=99 for p99)'''
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(latencies_ms: list[float], seconds: float) -> dict:
+    '''Output: Returns p50/p99/mean latency + throughput for requests/ops that took `seconds` of wall time overall'''
+    return {
+        'requests': len(latencies_ms),
+        'p50_ms': round(percentile(latencies_ms, 50), 3),
+        'p99_ms': round(percentile(latencies_ms, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies_ms), 3),
+        'requests_per_second': round(len(latencies_ms) / seconds, 1),
+    }
+
+
+def results_write(path: str, suite: str, results: dict[str, dict]) -> dict:
+    '''
+    Input: Takes a path, suite name (ex: 'micro'), and metrics by benchmark name. Ex: { "to_date (warm)": { "ops_per_second": 1200000 } }
+    Output: Writes + returns the document w/ enough context (commit, python, machine) to know if two runs are comparable
+    '''
+    document = {
+        'suite': suite,
+        'commit': _git_commit(),
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': _machine(),
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(document, file, indent=2)
+        file.write('\n')
+    return document
+
+
+def results_compare(baseline_path: str, results: dict[str, dict], tolerance: float = 0.2, allow_other_machine: bool = False) -> list[str]:
+    '''
+    Input: Takes a baseline written by results_write, this run's results, how much worse a metric can get before it counts (0.2 = 20%),
+        and whether to compare against a baseline recorded on a different machine/python anyway
+    Output: Prints a delta per metric, and returns descriptions of the regressions (empty when everything is within tolerance).
+        Raises a ValueError if the baseline is from another machine/python, since its deltas would be noise
+    '''
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    machine, python = _machine(), platform.python_version()
+    if (baseline.get('machine') != machine or baseline.get('python') != python) and not allow_other_machine:
+        raise ValueError(f'Baseline {baseline_path} was recorded on {baseline.get("machine")} (python {baseline.get("python")}), this is {machine} (python {python}). '
+            'Record a baseline on this machine first (run the base commit w/ --out)')
+    print(f'compared to {baseline_path} (commit {baseline["commit"]}, {baseline["machine"]})')
+    regressions = []
+    for name, metrics in results.items():
+        baseline_metrics = baseline['results'].get(name)
+        if baseline_metrics == None:
+            print(f'  {name:<36} (new, no baseline)')
+            continue
+        for metric, value in metrics.items():
+            baseline_value = baseline_metrics.get(metric)
+            if baseline_value in (None, 0) or not (metric.endswith(HIGHER_IS_BETTER_SUFFIX) or metric.endswith(LOWER_IS_BETTER_SUFFIX)):
+                continue
+            change = (value - baseline_value) / baseline_value
+            is_regression = change < -tolerance if metric.endswith(HIGHER_IS_BETTER_SUFFIX) else change > tolerance
+            print(f'  {name:<36} {metric:<22} {baseline_value:>14,.3f} -> {value:>14,.3f}  {change:>+7.1%}{"  REGRESSION" if is_regression else ""}')
+            if is_regression:
+                regressions.append(f'{name} {metric}: {baseline_value:,.3f} -> {value:,.3f} ({change:+.1%})')
+    return regressions
@@ -0,0 +1,83 @@
+# Cold start benchmark: how long the api process takes to import (w/ a `-X importtime` breakdown by package) and to serve its first 200 on /v1/member_ids
+# Run: python src/benchmarks/cold_start.py (inside the api container, w/ the cluster up for the first 200 check. --imports-only skips it)
+# Exits non-zero if either median is over its budget in cold_start_budget.json, so regressions get flagged (ex: a heavy import creeping back to module level)
+
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_PATH = os.path.join(BENCH_DIR, 'cold_start_budget.json')
+START_PATH = os.path.join(BENCH_DIR, '..', 'start.py')
+FIRST_200_PORT = 3100 # separate from the api the container is already serving on
+
+
+def _import_profile(module: str = 'api.api') -> tuple[float, dict[str, float]]:
+    '''
+    Imports a module in a fresh interpreter w/ -X importtime
+    Output: Returns a tuple of (total ms, self ms by top level package)
+    '''
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True, check=True)
+    total_ms, package_ms = None, {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix('import time:').split('|')
+        package = name.strip().split('.')[0]
+        package_ms[package] = package_ms.get(package, 0) + int(self_us) / 1000
+        if name.strip() == module:
+            total_ms = int(cumulative_us) / 1000
+    return total_ms, package_ms
+
+
+def _first_200(path: str = '/v1/member_ids?limit=1', timeout: float = 30) -> float:
+    '''Starts the api in a fresh process and polls until it answers w/ a 200. Output: Returns ms from spawn to that 200'''
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, START_PATH, 'api'],
+        env={ **os.environ, 'SERVICE_API_PORT': str(FIRST_200_PORT) },
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{FIRST_200_PORT}{path}', timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                pass
+            time.sleep(0.02)
+        raise TimeoutError(f'No 200 from {path} within {timeout}s')
+    finally:
+        # --- sanic forks workers, so stop the whole process group
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+def bench(repeat: int = 5, imports_only: bool = False) -> bool:
+    with open(BUDGET_PATH) as file:
+        budget = json.load(file)
+    # IMPORTS
+    profiles = [_import_profile() for _ in range(repeat)]
+    import_ms = statistics.median(total_ms for total_ms, _ in profiles)
+    package_ms = { package: statistics.median(profile[package] for _, profile in profiles) for package in profiles[0][1] }
+    print(f'import api.api, median of {repeat}: {import_ms:,.0f} ms (budget {budget["import_api_ms"]:,} ms)')
+    for package, ms in sorted(package_ms.items(), key=lambda item: -item[1])[:10]:
+        print(f'  {package:<24} {ms:>8,.1f} ms')
+    within_budget = import_ms <= budget['import_api_ms']
+    # FIRST 200
+    if not imports_only:
+        first_200_ms = statistics.median(_first_200() for _ in range(max(1, repeat // 2)))
+        print(f'time to first 200 on /v1/member_ids, median of {max(1, repeat // 2)}: {first_200_ms:,.0f} ms (budget {budget["first_200_ms"]:,} ms)')
+        within_budget = within_budget and first_200_ms <= budget['first_200_ms']
+    print('within budget' if within_budget else 'OVER BUDGET')
+    return within_budget
+
+
+if __name__ == "__main__":
+    sys.exit(0 if bench(imports_only='--imports-only' in sys.argv) else 1)
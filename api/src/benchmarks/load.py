@@ -0,0 +1,167 @@
+# Load harness: drives the whole sanic app in process through its ASGI interface, against a temp aiosqlite db + an in-process redis (fakeredis)
+# Run: python src/benchmarks/load.py (w/ PYTHONPATH=src). --out writes results (default benchmarks/baselines/load.json, not committed), --compare checks them against a baseline from the same machine
+# Reports p50/p99 latency + requests/s per endpoint. Exits non-zero when a request errors, or --compare finds a regression past --tolerance
+# Nothing leaves the process (no postgres, redis, aws or network), so numbers measure our code + sqlite, not infra. Compare runs from the same machine only
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_results import BASELINES_DIR, latency_summary, results_compare, results_write
+
+
+def _env_setup(directory: str):
+    '''Points the app at throwaway backends. Done before the app is imported/started, since env is read at startup'''
+    secrets_path = os.path.join(directory, 'secrets.json')
+    with open(secrets_path, 'w') as file:
+        file.write('{}')
+    os.environ['SECRETS_FILE'] = secrets_path # empty snapshot, so nothing is fetched from aws
+    os.environ.pop('DATABASE_APP_URL', None)
+    os.environ['DATABASE_APP_BACKEND'] = 'sqlite' # WAL file db, one writer connection + a read pool (see dbs/database_sqlite.py)
+    os.environ['DATABASE_APP_SQLITE_PATH'] = os.path.join(directory, 'load.db')
+    os.environ['SERVICE_CACHE_IN_PROCESS'] = 'true'
+    os.environ.setdefault('MEMBER_ID_SUFFIX_KEY', 'load-benchmark')
+    os.environ.setdefault('MEMBER_ID_FILTER_CAPACITY', '100000')
+
+
+class ASGIClient:
+    '''Minimal ASGI driver: runs the app's lifespan once (so listeners/pools are set up a single time, like a real worker), then sends http requests straight into it'''
+
+    def __init__(self, app):
+        self.app = app
+        self._lifespan_receive, self._lifespan_send = asyncio.Queue(), asyncio.Queue()
+        self._lifespan_task = None
+
+    async def _lifespan(self, message_type: str):
+        await self._lifespan_receive.put({ 'type': message_type })
+        message = await self._lifespan_send.get()
+        if not message['type'].endswith('.complete'):
+            raise RuntimeError(f'ASGI {message_type} failed: {message.get("message")}')
+
+    async def start(self):
+        self._lifespan_task = asyncio.create_task(self.app({ 'type': 'lifespan', 'asgi': { 'version': '3.0' } }, self._lifespan_receive.get, self._lifespan_send.put))
+        await self._lifespan('lifespan.startup')
+
+    async def stop(self):
+        await self._lifespan('lifespan.shutdown')
+        await self._lifespan_task
+
+    async def request(self, method: str, path: str, body=None) -> tuple[int, bytes]:
+        '''Output: Returns a tuple of (status, response body)'''
+        path, _, query_string = path.partition('?')
+        body = b'' if body == None else json.dumps(body).encode()
+        messages = [{ 'type': 'http.request', 'body': body, 'more_body': False }]
+        sent = []
+        async def receive():
+            return messages.pop(0) if len(messages) > 0 else { 'type': 'http.disconnect' }
+        async def send(message):
+            sent.append(message)
+        scope = {
+            'type': 'http', 'asgi': { 'version': '3.0' }, 'http_version': '1.1', 'scheme': 'http',
+            'method': method, 'path': path, 'raw_path': path.encode(), 'query_string': query_string.encode(),
+            'headers': [(b'host', b'load-benchmark'), (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+            'client': ('127.0.0.1', 0), 'server': ('load-benchmark', 80),
+        }
+        await self.app(scope, receive, send)
+        return sent[0]['status'], b''.join(message.get('body', b'') for message in sent if message['type'] == 'http.response.body')
+
+
+def _member(rng: random.Random, country_codes: list[str]) -> dict:
+    return {
+        'first_name': 'Jose',
+        'last_name': 'Vasconcelos',
+        'dob': f'{rng.randint(1, 12):02}/{rng.randint(1, 28):02}/{rng.randint(1930, 2010)}',
+        'country': rng.choice(country_codes),
+    }
+
+
+def _scenarios(rng: random.Random, country_codes: list[str], member_ids: list[str]) -> list[tuple]:
+    '''Output: Returns (name, request factory) per endpoint. Factories return (method, path, body) and are called per request, so bodies/args vary like real traffic'''
+    year = str(time.localtime().tm_year)[2:]
+    return [
+        ('POST /v1/member_id', lambda: ('POST', '/v1/member_id', _member(rng, country_codes))),
+        ('POST /v1/member_ids/bulk (100)', lambda: ('POST', '/v1/member_ids/bulk', { 'members': [_member(rng, country_codes) for _ in range(100)] })),
+        # --- same args every time, so after the first request this is the endpoint cache path
+        ('GET /v1/member_ids (cached)', lambda: ('GET', '/v1/member_ids?limit=100', None)),
+        # --- random keyset cursors, so (nearly) every request misses the cache + reads sqlite
+        ('GET /v1/member_ids (uncached)', lambda: ('GET', f'/v1/member_ids?limit=100&after={rng.randint(1, len(member_ids))}', None)),
+        ('GET /v1/member_ids (cohort)', lambda: ('GET', f'/v1/member_ids?year={year}&country={rng.choice(country_codes)}&limit=100', None)),
+        ('GET /v1/member_ids/stats', lambda: ('GET', '/v1/member_ids/stats', None)),
+        ('POST /v1/member_id/validate', lambda: ('POST', '/v1/member_id/validate', { 'member_id': rng.choice(member_ids) })),
+        ('POST /v1/member_ids/validate (100)', lambda: ('POST', '/v1/member_ids/validate', { 'member_ids': rng.sample(member_ids, 100) })),
+    ]
+
+
+async def _run_scenario(client: ASGIClient, request_factory, requests: int, concurrency: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await client.request(*request_factory())
+    latencies_ms, errors = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+    async def timed_request():
+        async with semaphore:
+            method, path, body = request_factory()
+            started = time.perf_counter()
+            status, response_body = await client.request(method, path, body)
+            latencies_ms.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                errors.append(f'{status} {method} {path}: {response_body[:200]}')
+    started = time.perf_counter()
+    await asyncio.gather(*[timed_request() for _ in range(requests)])
+    summary = latency_summary(latencies_ms, time.perf_counter() - started)
+    summary['concurrency'] = concurrency
+    summary['errors'] = len(errors)
+    for error in errors[:3]:
+        print(f'    {error}')
+    return summary
+
+
+async def bench(requests: int = 200, concurrency: int = 10, seed_members: int = 2000) -> dict[str, dict]:
+    with tempfile.TemporaryDirectory(prefix='asaphw-load-') as directory:
+        _env_setup(directory)
+        from api.api import app_api # imported after env is set up
+        from geo.country_codes import country_codes_and_names
+        client = ASGIClient(app_api)
+        await client.start()
+        try:
+            # SETUP (fresh tables + some members, so reads/validations have rows to hit)
+            status, response_body = await client.request('POST', '/database/init')
+            if status != 200:
+                raise RuntimeError(f'/database/init failed: {response_body}')
+            rng = random.Random(7)
+            country_codes = [code for code in country_codes_and_names if code != 'US']
+            member_ids = []
+            for offset in range(0, seed_members, 500):
+                _, response_body = await client.request('POST', '/v1/member_ids/bulk', { 'members': [_member(rng, country_codes) for _ in range(min(500, seed_members - offset))] })
+                member_ids += [result['member_id'] for result in json.loads(response_body)['data']['results'] if result['status'] == 'success']
+            # EXECUTE
+            print(f'load, in process ASGI (aiosqlite + fakeredis), {requests:,} requests per endpoint at concurrency {concurrency}, {len(member_ids):,} seeded members')
+            results = {}
+            for name, request_factory in _scenarios(rng, country_codes, member_ids):
+                results[name] = await _run_scenario(client, request_factory, requests, concurrency, warmup=min(20, requests))
+                print(f'  {name:<36} p50 {results[name]["p50_ms"]:>8.2f} ms  p99 {results[name]["p99_ms"]:>8.2f} ms  {results[name]["requests_per_second"]:>9,.1f} req/s  {results[name]["errors"]} errors')
+        finally:
+            await client.stop()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='End to end load harness (in process ASGI, aiosqlite + fakeredis)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--seed-members', type=int, default=2000)
+    parser.add_argument('--out', default=os.path.join(BASELINES_DIR, 'load.json'), help="where to write results ('-' to skip)")
+    parser.add_argument('--compare', help='baseline JSON recorded on this machine to compare against (ex: from running the base commit w/ --out)')
+    parser.add_argument('--allow-other-machine', action='store_true', help='compare even if the baseline was recorded on a different machine/python')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='how much worse a metric can get before it counts as a regression (0.2 = 20%%)')
+    args = parser.parse_args()
+    results = asyncio.run(bench(requests=args.requests, concurrency=args.concurrency, seed_members=args.seed_members))
+    regressions = results_compare(args.compare, results, tolerance=args.tolerance, allow_other_machine=args.allow_other_machine) if args.compare else []
+    if args.out != '-':
+        results_write(args.out, 'load', results)
+    has_errors = any(metrics['errors'] > 0 for metrics in results.values())
+    sys.exit(1 if has_errors or len(regressions) > 0 else 0)
@@ -0,0 +1,81 @@
+# Benchmark: member id lookups by text (value) vs the packed integer (value_int), in memory and in postgres
+# Run: python src/benchmarks/member_id_lookup.py (inside the api container w/ the cluster up. --no-db runs just the in-memory part)
+# The db part loads temp tables w/ the same ids, so it doesn't touch real member_id rows
+
+import asyncio
+import random
+import sys
+import time
+import timeit
+
+import sqlalchemy as sa
+
+from geo.country_codes import country_codes_and_names
+from member_id.member_id_codec import member_id_encode
+
+
+def _sample_member_ids(count: int) -> list[str]:
+    rng = random.Random(7)
+    country_codes = [code for code in country_codes_and_names if code != 'US']
+    return list({f'{rng.randint(0, 99):02}-{rng.choice(country_codes)}-{rng.randint(0, 99):02}-{rng.randint(1, 12):02}-{rng.getrandbits(16):04X}' for _ in range(count)})
+
+
+def bench_memory(member_ids: list[str], repeat: int = 5):
+    member_id_ints = [member_id_encode(member_id) for member_id in member_ids]
+    text_set, int_set = set(member_ids), set(member_id_ints)
+    probes, probe_ints = member_ids[::10], member_id_ints[::10]
+    # --- set + element sizes (what an in-process cache/filter holding these would cost)
+    text_bytes = sys.getsizeof(text_set) + sum(sys.getsizeof(member_id) for member_id in member_ids)
+    int_bytes = sys.getsizeof(int_set) + sum(sys.getsizeof(member_id_int) for member_id_int in member_id_ints)
+    text_seconds = min(timeit.repeat(lambda: [probe in text_set for probe in probes], number=10, repeat=repeat))
+    int_seconds = min(timeit.repeat(lambda: [probe in int_set for probe in probe_ints], number=10, repeat=repeat))
+    encode_seconds = min(timeit.repeat(lambda: [member_id_encode(probe) for probe in probes], number=1, repeat=repeat))
+    print(f'in memory, {len(member_ids):,} ids, best of {repeat}')
+    print(f'  set[str] {text_bytes / 1024 / 1024:>8.1f} MB  {len(probes) * 10 / text_seconds:>14,.0f} lookups/s')
+    print(f'  set[int] {int_bytes / 1024 / 1024:>8.1f} MB  {len(probes) * 10 / int_seconds:>14,.0f} lookups/s')
+    print(f'  member_id_encode {len(probes) / encode_seconds:>14,.0f} ids/s')
+
+
+async def bench_db(member_ids: list[str], lookups: int = 200, batch_size: int = 100):
+    from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_engine_connect, sqlalchemy_engine_dispose
+    sqlalchemy_engine_connect()
+    rng = random.Random(11)
+    try:
+        async with create_sqlalchemy_session() as session:
+            async with session.begin():
+                # SETUP (temp tables shaped like member_id's two lookup paths)
+                await session.execute(sa.text('CREATE TEMP TABLE bench_member_id_text (value TEXT NOT NULL UNIQUE) ON COMMIT DROP'))
+                await session.execute(sa.text('CREATE TEMP TABLE bench_member_id_int (value_int BIGINT NOT NULL UNIQUE) ON COMMIT DROP'))
+                for chunk_start in range(0, len(member_ids), 10000):
+                    chunk = member_ids[chunk_start:chunk_start + 10000]
+                    await session.execute(sa.text('INSERT INTO bench_member_id_text (value) SELECT unnest(CAST(:values AS TEXT[]))'), { 'values': chunk })
+                    await session.execute(sa.text('INSERT INTO bench_member_id_int (value_int) SELECT unnest(CAST(:values AS BIGINT[]))'), { 'values': [member_id_encode(member_id) for member_id in chunk] })
+                await session.execute(sa.text('ANALYZE bench_member_id_text'))
+                await session.execute(sa.text('ANALYZE bench_member_id_int'))
+                index_sizes = (await session.execute(sa.text('''
+                    SELECT pg_relation_size(indexrelid) FROM pg_index WHERE indrelid = CAST('bench_member_id_text' AS regclass)
+                    UNION ALL
+                    SELECT pg_relation_size(indexrelid) FROM pg_index WHERE indrelid = CAST('bench_member_id_int' AS regclass)
+                '''))).scalars().all()
+                # LOOKUPS (batched IN queries, half hits + half misses, same as validation traffic)
+                batches = [rng.sample(member_ids, batch_size // 2) + _sample_member_ids(batch_size // 2) for _ in range(lookups)]
+                started = time.perf_counter()
+                for batch in batches:
+                    await session.execute(sa.text('SELECT value FROM bench_member_id_text WHERE value = ANY(:values)'), { 'values': batch })
+                text_seconds = time.perf_counter() - started
+                started = time.perf_counter()
+                for batch in batches:
+                    await session.execute(sa.text('SELECT value_int FROM bench_member_id_int WHERE value_int = ANY(:values)'), { 'values': [member_id_encode(member_id) for member_id in batch] })
+                int_seconds = time.perf_counter() - started
+    finally:
+        await sqlalchemy_engine_dispose()
+    print(f'postgres, {len(member_ids):,} rows, {lookups} lookups of {batch_size} ids')
+    print(f'  value (text)      index {index_sizes[0] / 1024 / 1024:>6.1f} MB  {lookups * batch_size / text_seconds:>10,.0f} ids/s')
+    print(f'  value_int (bigint) index {index_sizes[1] / 1024 / 1024:>6.1f} MB  {lookups * batch_size / int_seconds:>10,.0f} ids/s')
+
+
+if __name__ == "__main__":
+    member_ids = _sample_member_ids(500_000)
+    bench_memory(member_ids)
+    if '--no-db' not in sys.argv:
+        asyncio.run(bench_db(member_ids))
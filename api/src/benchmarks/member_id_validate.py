@@ -0,0 +1,68 @@
+# Micro-benchmark: member id validation, single + bulk, against the pre-compiled-pattern implementation
+# Run: python src/benchmarks/member_id_validate.py (w/ PYTHONPATH=src, which the api container already sets)
+
+import random
+import re
+import timeit
+
+from geo.country_codes import country_codes_and_names
+from member_id.member_id_utils import is_member_id_valid, validate_many
+
+
+def _is_member_id_valid_legacy(member_id_str) -> tuple[bool, str]:
+    '''Original implementation (re.compile per call), kept here as the baseline'''
+    splits = member_id_str.split('-')
+    if len(splits) != 5 or len(member_id_str) != 16:
+        return False, 'Member ID is an incorrect length or number of segments.'
+    year_pattern = re.compile(r'^\d{2}$')
+    if year_pattern.match(splits[0]) is None:
+        return False, 'Incorrect year'
+    if splits[1].upper() not in country_codes_and_names.keys():
+        return False, f'Incorrect country code. Got {splits[1]}'
+    if splits[1].upper() == 'US':
+        return False, f'Disallowed country code. Got {splits[1]}'
+    birth_year_pattern = re.compile(r'^\d{2}$')
+    if birth_year_pattern.match(splits[2]) is None:
+        return False, f'Expecting 2 digit birth year. Got {splits[2]}'
+    birth_year_pattern = re.compile(r'^\d{2}$')
+    if birth_year_pattern.match(splits[3]) is None:
+        return False, f'Expecting 2 digit birth month. Got {splits[3]}'
+    if int(splits[3]) < 1 or int(splits[3]) > 12:
+        return False, f'Expecting birth month between 1-12. Got {splits[3]}'
+    rand_pattern = re.compile(r'^[a-zA-Z0-9]{4}$')
+    if rand_pattern.match(splits[4]) is None:
+        return False, f'Expected 4 alphanumeric characters. Got {splits[4]}'
+    return True, None
+
+
+def _sample_member_ids(count: int, invalid_ratio: float = 0.2) -> list[str]:
+    rng = random.Random(7)
+    country_codes = [code for code in country_codes_and_names if code != 'US']
+    invalid_samples = ['23-US-61-01-2F0D', '23-OP-61-01-2F0D', '23-MX-aa-01-2F0D', '23-MX-61-13-2F0D', '23-MX-61-01-!!!!', 'XYZ123']
+    member_ids = []
+    for _ in range(count):
+        if rng.random() < invalid_ratio:
+            member_ids.append(rng.choice(invalid_samples))
+        else:
+            member_ids.append(f'{rng.randint(0, 99):02}-{rng.choice(country_codes)}-{rng.randint(0, 99):02}-{rng.randint(1, 12):02}-{rng.getrandbits(16):04X}')
+    return member_ids
+
+
+def bench(count: int = 100_000, repeat: int = 5):
+    member_ids = _sample_member_ids(count)
+    # --- same answers (incl. error messages) before we compare speed
+    assert validate_many(member_ids) == [_is_member_id_valid_legacy(member_id) for member_id in member_ids], 'Validator drifted from baseline'
+    timings = {
+        'legacy (per id)': min(timeit.repeat(lambda: [_is_member_id_valid_legacy(member_id) for member_id in member_ids], number=1, repeat=repeat)),
+        'is_member_id_valid (per id)': min(timeit.repeat(lambda: [is_member_id_valid(member_id) for member_id in member_ids], number=1, repeat=repeat)),
+        'validate_many (bulk)': min(timeit.repeat(lambda: validate_many(member_ids), number=1, repeat=repeat)),
+    }
+    baseline = timings['legacy (per id)']
+    print(f'member id validation, {count:,} ids (20% invalid), best of {repeat}')
+    for name, seconds in timings.items():
+        print(f'  {name:<30} {count / seconds:>12,.0f} ids/s  {baseline / seconds:>5.1f}x')
+    return timings
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,98 @@
+# Benchmark: CPU per 10k rows for the GET /v1/member_ids read path, ORM instances + serialize() + stdlib json (before) vs column tuples + member_ids_serialize + orjson (after)
+# Run: python src/benchmarks/member_ids_read.py (w/ PYTHONPATH=src). Runs against a temp aiosqlite db, so no cluster needed
+# CPU is process time (not wall), split by phase: fetch (query + building rows/instances), format (to API dicts), encode (to response bytes)
+
+import asyncio
+from datetime import date, datetime
+import functools
+import json as json_lib
+import os
+import tempfile
+import time
+
+import orjson
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from dbs.database_sqlite import setup_sqlite_db_tables
+from member_id.member_id_codec import member_id_encode
+from member_id.member_id_models import MemberID
+from member_id.member_id_queries import member_ids_page_query, member_ids_serialize
+from user.user_models import User
+
+ROWS = 10_000
+_stdlib_dumps = functools.partial(json_lib.dumps, separators=(',', ':')) # sanic's default encoder
+
+
+async def _seed(session, rows: int):
+    now = datetime.now()
+    async with session.begin():
+        await setup_sqlite_db_tables(session)
+        await session.execute(sa.insert(User), [{ 'first_name': 'Jose', 'last_name': 'Vasconcelos', 'date_of_birth': date(1961, 1, 1), 'origin_country_code': 'MX', 'created_at': now } for _ in range(rows)])
+        member_id_values = [f'23-MX-61-01-{index:04X}' for index in range(rows)]
+        await session.execute(sa.insert(MemberID), [{ 'value': value, 'value_int': member_id_encode(value), 'user_id': index + 1, 'created_at': now } for index, value in enumerate(member_id_values)])
+
+
+async def _read_orm(session, rows: int) -> tuple[dict, bytes]:
+    '''Before: ORM instances, serialize() per instance, stdlib json'''
+    timings = {}
+    started = time.process_time()
+    async with session.begin():
+        member_ids = (await session.execute(sa.select(MemberID).order_by(sa.desc(MemberID.id)).limit(rows))).scalars().all()
+    timings['fetch'] = time.process_time() - started
+    started = time.process_time()
+    payload = { 'status': 'success', 'data': { 'member_ids': [mid.serialize() for mid in member_ids], 'next_after': None } }
+    timings['format'] = time.process_time() - started
+    started = time.process_time()
+    body = _stdlib_dumps(payload).encode()
+    timings['encode'] = time.process_time() - started
+    return timings, body
+
+
+async def _read_core(session, rows: int) -> tuple[dict, bytes]:
+    '''After: column tuples, one formatting pass, orjson'''
+    timings = {}
+    started = time.process_time()
+    async with session.begin():
+        member_ids = (await session.execute(member_ids_page_query(limit=rows))).all()
+    timings['fetch'] = time.process_time() - started
+    started = time.process_time()
+    payload = { 'status': 'success', 'data': { 'member_ids': member_ids_serialize(member_ids), 'next_after': None } }
+    timings['format'] = time.process_time() - started
+    started = time.process_time()
+    body = orjson.dumps(payload)
+    timings['encode'] = time.process_time() - started
+    return timings, body
+
+
+async def bench(rows: int = ROWS, repeat: int = 7):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f'sqlite+aiosqlite:///{os.path.join(directory, "read.db")}')
+        try:
+            async with AsyncSession(engine) as session:
+                await _seed(session, rows)
+            results = {}
+            for name, read in [('orm + serialize() + json', _read_orm), ('core tuples + orjson', _read_core)]:
+                runs = []
+                for _ in range(repeat):
+                    # --- fresh session per run, like a request (so the orm path can't reuse an identity map)
+                    async with AsyncSession(engine, expire_on_commit=False) as session:
+                        timings, body = await read(session, rows)
+                    runs.append(timings)
+                results[name] = { phase: min(run[phase] for run in runs) for phase in ('fetch', 'format', 'encode') }
+                results[name]['body'] = body
+        finally:
+            await engine.dispose()
+    # --- both paths have to produce the same payload before we compare speed
+    assert json_lib.loads(results['orm + serialize() + json']['body']) == json_lib.loads(results['core tuples + orjson']['body']), 'Read paths returned different payloads'
+    baseline = sum(results['orm + serialize() + json'][phase] for phase in ('fetch', 'format', 'encode'))
+    print(f'GET /v1/member_ids read path, CPU ms per {rows:,} rows (aiosqlite), best of {repeat}')
+    print(f'  {"":<26} {"fetch":>8} {"format":>8} {"encode":>8} {"total":>8}')
+    for name, timings in results.items():
+        total = timings['fetch'] + timings['format'] + timings['encode']
+        print(f'  {name:<26} {timings["fetch"] * 1000:>8.1f} {timings["format"] * 1000:>8.1f} {timings["encode"] * 1000:>8.1f} {total * 1000:>8.1f}  {baseline / total:>5.1f}x')
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(bench())
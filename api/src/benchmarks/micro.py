@@ -0,0 +1,102 @@
+# Micro-benchmark suite: the hot pure functions (member id generation/validation, to_date, validators, request schemas), w/ results as a JSON baseline
+# Run: python src/benchmarks/micro.py (w/ PYTHONPATH=src). --out writes results (default benchmarks/baselines/micro.json, not committed), --compare checks them against a baseline from the same machine
+# Exits non-zero when --compare finds a regression past --tolerance. No db/redis needed
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import timeit
+
+from benchmarks.bench_results import BASELINES_DIR, results_compare, results_write
+from geo.country_codes import country_codes_and_names
+from member_id.member_id_codec import member_id_encode
+from member_id.member_id_schemas import member_create_try_parse
+from member_id.member_id_utils import is_member_id_valid, member_id_generate, validate_many
+from utils.to_date import _string_to_date, to_date
+from utils.validators import is_valid_country_code, is_valid_date, is_valid_nonempty_str
+
+
+def _samples(count: int, invalid_ratio: float = 0.2) -> dict[str, list]:
+    '''Same seeded inputs every run, w/ ~20% invalid so the error paths are measured too'''
+    rng = random.Random(7)
+    country_codes = [code for code in country_codes_and_names if code != 'US']
+    member_ids, dates, records = [], [], []
+    for _ in range(count):
+        is_invalid = rng.random() < invalid_ratio
+        member_ids.append(rng.choice(['23-US-61-01-2F0D', '23-OP-61-01-2F0D', '23-MX-61-13-2F0D', 'XYZ123']) if is_invalid
+            else f'{rng.randint(0, 99):02}-{rng.choice(country_codes)}-{rng.randint(0, 99):02}-{rng.randint(1, 12):02}-{rng.getrandbits(16):04X}')
+        dates.append(rng.choice(['13/45/1990', 'yesterday']) if is_invalid
+            else f'{rng.randint(1, 12):02}/{rng.randint(1, 28):02}/{rng.randint(1930, 2010)}')
+        records.append({
+            'first_name': '' if is_invalid else 'Jose',
+            'last_name': 'Vasconcelos',
+            'dob': dates[-1],
+            'country': rng.choice(country_codes),
+        })
+    return {
+        'member_ids': member_ids,
+        'dates': dates,
+        'records': records,
+        'birth_dates': [datetime.date(rng.randint(1930, 2010), rng.randint(1, 12), rng.randint(1, 28)) for _ in range(count)],
+        'country_codes': [rng.choice(country_codes + ['OP', 'USA']) for _ in range(count)],
+    }
+
+
+def _ops_per_second(fn, count: int, repeat: int, setup=None) -> dict:
+    '''Best of `repeat` runs of fn (which does `count` ops per call). setup runs untimed before each run'''
+    timings = []
+    for _ in range(repeat):
+        if setup != None:
+            setup()
+        timings.append(timeit.timeit(fn, number=1))
+    return { 'ops_per_second': round(count / min(timings), 1) }
+
+
+def _try(fn, value):
+    try:
+        return fn(value)
+    except Exception:
+        return None
+
+
+def bench(count: int = 20_000, repeat: int = 5) -> dict[str, dict]:
+    samples = _samples(count)
+    member_ids, dates, records, birth_dates, country_codes = samples['member_ids'], samples['dates'], samples['records'], samples['birth_dates'], samples['country_codes']
+    valid_country_codes = [code for code in country_codes if code in country_codes_and_names]
+    results = {
+        # --- member ids
+        'member_id_generate': _ops_per_second(lambda: [member_id_generate(2023, country_code, birth_date, suffix) for suffix, (country_code, birth_date) in enumerate(zip(valid_country_codes, birth_dates))], len(valid_country_codes), repeat),
+        'is_member_id_valid': _ops_per_second(lambda: [is_member_id_valid(member_id) for member_id in member_ids], count, repeat),
+        'validate_many': _ops_per_second(lambda: validate_many(member_ids), count, repeat),
+        'member_id_encode': _ops_per_second(lambda: [member_id_encode(member_id) for member_id in member_ids], count, repeat),
+        # --- dates (cold clears the parse memo first, warm is every call after)
+        'to_date (cold)': _ops_per_second(lambda: [_try(to_date, date_string) for date_string in dates], count, repeat, setup=_string_to_date.cache_clear),
+        'to_date (warm)': _ops_per_second(lambda: [_try(to_date, date_string) for date_string in dates], count, repeat),
+        # --- validators + request schemas
+        'is_valid_nonempty_str': _ops_per_second(lambda: [is_valid_nonempty_str(record['first_name'], raise_if_fail=False) for record in records], count, repeat),
+        'is_valid_date': _ops_per_second(lambda: [is_valid_date(date_string, raise_if_fail=False) for date_string in dates], count, repeat),
+        'is_valid_country_code': _ops_per_second(lambda: [is_valid_country_code(country_code, raise_if_fail=False) for country_code in country_codes], count, repeat),
+        'member_create_try_parse': _ops_per_second(lambda: [member_create_try_parse(record) for record in records], count, repeat),
+    }
+    print(f'micro-benchmarks, {count:,} inputs (20% invalid), best of {repeat}')
+    for name, metrics in results.items():
+        print(f'  {name:<36} {metrics["ops_per_second"]:>14,.0f} ops/s')
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the hot pure functions')
+    parser.add_argument('--count', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', default=os.path.join(BASELINES_DIR, 'micro.json'), help="where to write results ('-' to skip)")
+    parser.add_argument('--compare', help='baseline JSON recorded on this machine to compare against (ex: from running the base commit w/ --out)')
+    parser.add_argument('--allow-other-machine', action='store_true', help='compare even if the baseline was recorded on a different machine/python')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='how much slower a metric can get before it counts as a regression (0.2 = 20%%)')
+    args = parser.parse_args()
+    results = bench(count=args.count, repeat=args.repeat)
+    regressions = results_compare(args.compare, results, tolerance=args.tolerance, allow_other_machine=args.allow_other_machine) if args.compare else []
+    if args.out != '-':
+        results_write(args.out, 'micro', results)
+    sys.exit(1 if len(regressions) > 0 else 0)
@@ -0,0 +1,48 @@
+# Micro-benchmark: to_date (strict fast paths + memo) against the dateutil-only implementation
+# Run: python src/benchmarks/to_date.py (w/ PYTHONPATH=src, which the api container already sets)
+
+import datetime
+import random
+import timeit
+
+from dateutil import parser
+
+from utils.to_date import _string_to_date, to_date
+
+
+def _to_date_legacy(date_string):
+    '''Original implementation (dateutil for everything), kept here as the baseline'''
+    return parser.parse(str(date_string)).date()
+
+
+def _sample_dates(count: int, iso_ratio: float = 0.2) -> list[str]:
+    rng = random.Random(7)
+    dates = []
+    for _ in range(count):
+        date = datetime.date(1920, 1, 1) + datetime.timedelta(days=rng.randint(0, 365 * 90))
+        dates.append(date.isoformat() if rng.random() < iso_ratio else f'{date.month:02}/{date.day:02}/{date.year}')
+    return dates
+
+
+def bench(count: int = 20_000, repeat: int = 5):
+    dates = _sample_dates(count)
+    # --- same answers before we compare speed
+    assert [to_date(date) for date in dates] == [_to_date_legacy(date) for date in dates], 'to_date drifted from baseline'
+    def to_date_uncached():
+        _string_to_date.cache_clear()
+        return [to_date(date) for date in dates]
+    timings = {
+        'legacy (dateutil)': min(timeit.repeat(lambda: [_to_date_legacy(date) for date in dates], number=1, repeat=repeat)),
+        'to_date (cold memo)': min(timeit.repeat(to_date_uncached, number=1, repeat=repeat)),
+        # a create request parses its dob ~4x, so after the first parse it's all memo hits
+        'to_date (warm memo)': min(timeit.repeat(lambda: [to_date(date) for date in dates[:1000] for _ in range(count // 1000)], number=1, repeat=repeat)),
+    }
+    baseline = timings['legacy (dateutil)']
+    print(f'to_date, {count:,} dates (80% MM/DD/YYYY, 20% ISO), best of {repeat}')
+    for name, seconds in timings.items():
+        print(f'  {name:<30} {count / seconds:>12,.0f} dates/s  {baseline / seconds:>6.1f}x')
+    return timings
+
+
+if __name__ == "__main__":
+    bench()
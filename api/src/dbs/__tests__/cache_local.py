@@ -0,0 +1,34 @@
+import time
+from dbs.cache_local import LocalCache
+
+
+def test_local_cache_lru():
+    cache = LocalCache(maxsize=2)
+    expires_at = time.time() + 60
+    cache.set('a', 1, expires_at)
+    cache.set('b', 2, expires_at)
+    # --- tests: touching 'a' makes 'b' the least recently used
+    assert cache.get('a') == 1, 'Should have been a hit'
+    cache.set('c', 3, expires_at)
+    assert cache.get('b') == None, 'Least recently used entry should have been evicted'
+    assert cache.get('a') == 1 and cache.get('c') == 3, 'Recent entries should remain'
+    assert cache.stats()['evictions'] == 1, 'Eviction not counted'
+
+
+def test_local_cache_expiry():
+    cache = LocalCache()
+    cache.set('a', 1, time.time() - 1)
+    # --- tests: expired entries are misses and get dropped
+    assert cache.get('a') == None, 'Expired entry should not be served'
+    assert len(cache) == 0, 'Expired entry should be dropped'
+    assert cache.stats()['misses'] == 1, 'Miss not counted'
+
+
+def test_local_cache_delete_prefix():
+    cache = LocalCache()
+    expires_at = time.time() + 60
+    cache.set('endpoint_cache:::a:::1', 1, expires_at)
+    cache.set('endpoint_cache:::b:::1', 2, expires_at)
+    cache.delete_prefix('endpoint_cache:::a:::')
+    assert cache.get('endpoint_cache:::a:::1') == None, 'Prefix not deleted'
+    assert cache.get('endpoint_cache:::b:::1') == 2, 'Other prefixes should remain'
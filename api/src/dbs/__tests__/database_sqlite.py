@@ -0,0 +1,99 @@
+import asyncio
+from datetime import date
+import os
+import tempfile
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from dbs.database_sqlite import setup_sqlite_db_tables
+from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_engine_connect, sqlalchemy_engine_dispose, sqlalchemy_pool_stats, sqlalchemy_session_writer
+import env
+from member_id.member_id_bulk import member_rows_insert
+from member_id.member_id_codec import member_id_encode
+from member_id.member_id_schemas import MemberCreate
+from member_id.member_id_stats import member_id_stats_reconcile
+from user.user_models import User # so the MemberID -> User relationship resolves
+
+
+def test_setup_sqlite_db_tables():
+    async def run(directory: str):
+        engine = create_async_engine(f'sqlite+aiosqlite:///{os.path.join(directory, "test.db")}')
+        try:
+            async with AsyncSession(engine) as session:
+                async with session.begin():
+                    await setup_sqlite_db_tables(session)
+                # --- tests: same core insert path as postgres, minus RETURNING (each user id is read back per row)
+                async with session.begin():
+                    await member_rows_insert(session, [
+                        { 'member': MemberCreate('Jose', 'Vasconcelos', 'MX', date(1961, 1, 1)), 'member_id_value': '23-MX-61-01-0001' },
+                        { 'member': MemberCreate('Ana', 'Ruiz', 'CA', date(1970, 2, 3)), 'member_id_value': '23-CA-70-02-0002' },
+                    ])
+                async with session.begin():
+                    rows = (await session.execute(sa.text('SELECT m.value, m.value_int, u.first_name FROM "member_id" m JOIN "user" u ON u.id = m.user_id ORDER BY m.value_int'))).all()
+                assert [tuple(row) for row in rows] == [
+                    ('23-CA-70-02-0002', member_id_encode('23-CA-70-02-0002'), 'Ana'),
+                    ('23-MX-61-01-0001', member_id_encode('23-MX-61-01-0001'), 'Jose'),
+                ], 'Member ids not linked to their users'
+                # --- tests: value_int is unique, like postgres
+                try:
+                    async with session.begin():
+                        await member_rows_insert(session, [{ 'member': MemberCreate('Jose', 'V', 'MX', date(1961, 1, 1)), 'member_id_value': '23-MX-61-01-0001' }])
+                    assert False, 'Expected a unique violation'
+                except sa.exc.IntegrityError:
+                    pass
+                # --- tests: stats counters were bumped in the same transaction
+                reconciled = await member_id_stats_reconcile(session)
+                assert reconciled['drift'] == [] and reconciled['stats']['total'] == 2, 'Stats drifted'
+        finally:
+            await engine.dispose()
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(directory))
+
+
+def test_sqlite_backend_routing(tmp_path, monkeypatch):
+    monkeypatch.delenv('DATABASE_APP_URL', raising=False)
+    monkeypatch.setenv('DATABASE_APP_BACKEND', 'sqlite')
+    monkeypatch.setenv('DATABASE_APP_SQLITE_PATH', str(tmp_path / 'app.db'))
+    async def run():
+        sqlalchemy_engine_connect()
+        try:
+            async with create_sqlalchemy_session() as session:
+                async with session.begin():
+                    await setup_sqlite_db_tables(session)
+            # --- tests: plain reads go to the read pool (query_only connections), in WAL mode
+            async with create_sqlalchemy_session() as session:
+                async with session.begin():
+                    assert (await session.execute(sa.text('SELECT 1 FROM pragma_query_only() WHERE query_only = 1'))).scalar() == 1, 'Read should use a query_only connection'
+                    assert (await session.execute(sa.text('SELECT journal_mode FROM pragma_journal_mode()'))).scalar() == 'wal', 'Expected WAL'
+            # --- tests: writes go to the writer, and the session then reads its own uncommitted write from it
+            async with create_sqlalchemy_session() as session:
+                async with session.begin():
+                    await session.execute(sa.insert(User).values(first_name='Ana'))
+                    assert (await session.execute(sa.select(User.first_name))).scalars().all() == ['Ana'], 'Session should read its own writes'
+                    assert (await session.execute(sa.text('SELECT 1 FROM pragma_query_only() WHERE query_only = 0'))).scalar() == 1, 'Reads after a write should stay on the writer'
+            # --- tests: a read then write in one transaction would span two connections (two snapshots), so it raises unless pinned to the writer
+            async with create_sqlalchemy_session() as session:
+                try:
+                    async with session.begin():
+                        await session.execute(sa.select(sa.func.count()).select_from(User))
+                        await session.execute(sa.insert(User).values(first_name='Bo'))
+                    assert False, 'Expected a write after a read-pool read to raise'
+                except sa.exc.InvalidRequestError:
+                    pass
+            async with create_sqlalchemy_session() as session:
+                async with sqlalchemy_session_writer(session).begin():
+                    assert (await session.execute(sa.text('SELECT 1 FROM pragma_query_only() WHERE query_only = 0'))).scalar() == 1, 'Pinned read should use the writer'
+                    await session.execute(sa.insert(User).values(first_name='Bo'))
+                    await session.execute(sa.delete(User).where(User.first_name == 'Bo'))
+            # --- tests: a fresh session sees the committed write from the read pool
+            async with create_sqlalchemy_session() as session:
+                async with session.begin():
+                    assert (await session.execute(sa.select(sa.func.count()).select_from(User))).scalar() == 1, 'Committed write not visible to readers'
+            # --- tests: pool stats report configured overflow, and never a negative overflow before the pool fills
+            pool_stats = sqlalchemy_pool_stats()
+            assert pool_stats['max_overflow'] == 0 and pool_stats['overflow'] == 0, 'Unexpected writer pool stats'
+            assert pool_stats['read_pool']['overflow'] == 0 and pool_stats['read_pool']['max_overflow'] == env.env_get_database_app_pool_max_overflow(), 'Unexpected read pool stats'
+        finally:
+            await sqlalchemy_engine_dispose()
+    asyncio.run(run())
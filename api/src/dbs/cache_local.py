@@ -0,0 +1,45 @@
+from collections import OrderedDict
+import time
+
+
+class LocalCache:
+    '''In-process LRU w/ per entry expiry. Not shared across workers, so it's only as coherent as whoever invalidates it'''
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict() # key -> (value, expires_at)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        item = self._entries.get(key)
+        if item == None or item[1] <= time.time():
+            if item != None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def set(self, key: str, value, expires_at: float):
+        '''expires_at: unix timestamp the entry stops being served'''
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete_prefix(self, prefix: str):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return { 'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions }
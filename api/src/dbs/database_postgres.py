@@ -6,6 +6,8 @@ async def setup_postgres_db_tables(session):
     # --- drop existing table to clear data/schema
     await session.execute('''DROP TABLE IF EXISTS "member_id";''')
     await session.execute('''DROP TABLE IF EXISTS "user";''')
+    await session.execute('''DROP TABLE IF EXISTS "member_id_suffix_counter";''')
+    await session.execute('''DROP TABLE IF EXISTS "member_id_stats";''')
 
     # --- create/re-create table
     await session.execute('''
@@ -21,9 +23,29 @@ async def setup_postgres_db_tables(session):
     await session.execute('''
         CREATE TABLE IF NOT EXISTS "member_id" (
             id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
-            value TEXT NOT NULL UNIQUE,
+            value TEXT NOT NULL,
+            value_int BIGINT NOT NULL,
             user_id INTEGER NOT NULL,
             created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES "user" (id)
         );
     ''')
+    # --- value_int is unique + covers what listings read, so cohort queries (contiguous value_int ranges) are index only range scans
+    await session.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS "member_id_value_int_idx" ON "member_id" (value_int) INCLUDE (value, created_at);
+    ''')
+    await session.execute('''
+        CREATE TABLE IF NOT EXISTS "member_id_suffix_counter" (
+            prefix TEXT PRIMARY KEY,
+            next_value INT NOT NULL DEFAULT 0
+        );
+    ''')
+    await session.execute('''
+        CREATE TABLE IF NOT EXISTS "member_id_stats" (
+            dimension TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            shard SMALLINT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, bucket, shard)
+        );
+    ''')
@@ -1,16 +1,47 @@
-import redis
+import redis.asyncio as redis
 import env
 
-redis_client = redis.Redis(
-    host=env.env_get_service_cache_host(),
-    port=env.env_get_service_cache_port(),
-    db=0,
-    decode_responses=True,
-)
+
+# CLIENT (built per worker at server start, since connections can't be shared across forked processes)
+async def redis_client_connect(max_connections: int = None, socket_timeout: float = None):
+    '''
+    Creates this worker's bounded connection pool + client. Call from a 'before_server_start' listener
+    max_connections/socket_timeout: override env settings (ex: job workers, which hold connections in blocking pops)
+    '''
+    if env.env_get_service_cache_in_process():
+        Cacher.client = _redis_in_process_client()
+        return Cacher.client
+    Cacher.client = redis.Redis(connection_pool=redis.BlockingConnectionPool(
+        host=env.env_get_service_cache_host(),
+        port=env.env_get_service_cache_port(),
+        db=0,
+        decode_responses=False, # cached responses are stored as the bytes we sent, so leave decoding to callers
+        max_connections=max_connections or env.env_get_service_cache_pool_size(),
+        timeout=env.env_get_service_cache_pool_timeout(), # seconds to wait for a free connection before erroring
+        socket_timeout=socket_timeout or env.env_get_service_cache_socket_timeout(),
+        socket_connect_timeout=env.env_get_service_cache_socket_timeout(),
+    ))
+    return Cacher.client
+
+_redis_in_process_server = None
+
+def _redis_in_process_client():
+    '''Fakeredis client on one server per process, so every client (api, jobs, listeners) sees the same keys'''
+    from fakeredis import FakeServer, aioredis # lazy, since it's only a dev/benchmark dependency
+    global _redis_in_process_server
+    if _redis_in_process_server == None:
+        _redis_in_process_server = FakeServer()
+    return aioredis.FakeRedis(server=_redis_in_process_server, decode_responses=False)
+
+async def redis_client_close():
+    if Cacher.client != None:
+        await Cacher.client.close(close_connection_pool=True)
+        Cacher.client = None
+
 
 class Cacher:
     '''Redis client wrapper with convenience methods to namespace get/set keys'''
-    client = redis_client
+    client = None
 
     def namespace_key(self, key_tree: list[str or int]) -> str:
         '''Join together a string of strings/ints so multiple publishers to redis don't collide'''
@@ -18,11 +49,40 @@ class Cacher:
             raise ValueError('Not enough specificity for redis key. Collisions can occur')
         return ':::'.join(key_tree)
 
-    def get(self, key_tree):
-        return self.client.get(self.namespace_key(key_tree))
+    async def get(self, key_tree):
+        return await self.client.get(self.namespace_key(key_tree))
+
+    async def set(self, key_tree: list[str or int], value: str or bytes, ex=None):
+        return await self.client.set(self.namespace_key(key_tree), value, ex=ex)
+
+    async def get_hash(self, key_tree) -> dict[bytes, bytes] or None:
+        return (await self.client.hgetall(self.namespace_key(key_tree))) or None
+
+    async def set_hash(self, key_tree: list[str or int], mapping: dict, ex=None):
+        '''Replaces every field + expiry in one round trip (MULTI/EXEC)'''
+        key = self.namespace_key(key_tree)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            if ex != None:
+                pipe.expire(key, ex)
+            return await pipe.execute()
+
+    async def incr(self, key_tree: list[str or int]) -> int:
+        return await self.client.incr(self.namespace_key(key_tree))
 
-    def set(self, key_tree: list[str or int], value: str, ex=None):
-        return self.client.set(self.namespace_key(key_tree), value, ex=ex)
+    async def publish(self, channel_tree: list[str or int], message: str or bytes):
+        return await self.client.publish(self.namespace_key(channel_tree), message)
 
+    def pubsub(self):
+        return self.client.pubsub()
 
+    async def lock_acquire(self, key_tree: list[str or int], token: str, ex_ms: int) -> bool:
+        '''Best effort mutex (SET NX w/ expiry). Returns True if we got it'''
+        return bool(await self.client.set(self.namespace_key(key_tree), token, nx=True, px=ex_ms))
 
+    async def lock_release(self, key_tree: list[str or int], token: str):
+        '''Releases the lock if we still hold it (it may have expired + been taken by someone else)'''
+        key = self.namespace_key(key_tree)
+        if await self.client.get(key) == token.encode():
+            await self.client.delete(key)
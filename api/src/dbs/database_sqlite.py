@@ -1,18 +1,82 @@
+# SQLite Backend Thoughts:
+# - for single node deployments (DATABASE_APP_BACKEND=sqlite). one file, no server, same tables as postgres
+# - WAL lets readers keep reading while a write commits, so reads get their own pool of connections while every write goes through
+#   one writer connection (see dbs/sa_sessions.py). writes are serialized by the writer pool instead of by sqlite lock retries
+# - synchronous=NORMAL is durable against app crashes in WAL mode (an OS crash/power loss can drop the last commits), and skips an fsync per commit
+# - sqlite only allows one writer per file, so run one api process against it (start_api drops to a single worker)
+
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000, # ms to wait on another process' lock (ex: a cli command) before erroring. first, so the pragmas below wait too
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'foreign_keys': 'ON',
+    'cache_size': -32000, # KiB of page cache per connection (negative = size, not pages)
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456, # bytes of the file read through mmap instead of read() calls
+}
+
+
+def sqlite_pragmas_apply(dbapi_connection, query_only: bool = False):
+    '''Sets SQLITE_PRAGMAS on a new connection. Use as an engine 'connect' listener. query_only: make the connection refuse writes (read pool)'''
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value};')
+        if query_only:
+            cursor.execute('PRAGMA query_only = ON;')
+    finally:
+        cursor.close()
+
+
 # HACK: this should be done w/ alembic outside this service, but for simplicity doing it here
 
-async def setup_in_memory_sqlite_db(session):
+async def setup_sqlite_db_tables(session):
     '''
-    Sets up the SQLite in memory db. Doing this as a function instead of using alembic for simplicity.
+    Sets up the SQLite db w/ the same tables as setup_postgres_db_tables (DATABASE_APP_BACKEND=sqlite + benchmarks). Doing this as a function instead of using alembic for simplicity.
     '''
     # --- drop existing table to clear data/schema
-    await session.execute('''
-        DROP TABLE IF EXISTS member_id;
-    ''')
+    await session.execute('''DROP TABLE IF EXISTS "member_id";''')
+    await session.execute('''DROP TABLE IF EXISTS "user";''')
+    await session.execute('''DROP TABLE IF EXISTS "member_id_suffix_counter";''')
+    await session.execute('''DROP TABLE IF EXISTS "member_id_stats";''')
+
     # --- create/re-create table
     await session.execute('''
-        CREATE TABLE IF NOT EXISTS member_id (
+        CREATE TABLE IF NOT EXISTS "user" (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            value TEXT NOT NULL UNIQUE,
+            first_name TEXT,
+            last_name TEXT,
+            date_of_birth DATE,
+            origin_country_code TEXT,
             created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
         );
     ''')
+    await session.execute('''
+        CREATE TABLE IF NOT EXISTS "member_id" (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            value TEXT NOT NULL,
+            value_int BIGINT NOT NULL,
+            user_id INTEGER NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES "user" (id)
+        );
+    ''')
+    # --- sqlite has no INCLUDE columns, so cohort range scans here read the table rows too
+    await session.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS "member_id_value_int_idx" ON "member_id" (value_int);
+    ''')
+    await session.execute('''
+        CREATE TABLE IF NOT EXISTS "member_id_suffix_counter" (
+            prefix TEXT PRIMARY KEY,
+            next_value INT NOT NULL DEFAULT 0
+        );
+    ''')
+    await session.execute('''
+        CREATE TABLE IF NOT EXISTS "member_id_stats" (
+            dimension TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            shard SMALLINT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, bucket, shard)
+        );
+    ''')
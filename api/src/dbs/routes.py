@@ -1,7 +1,12 @@
 from sanic.response import json
 from sanic import Blueprint
 
+from api.middleware import endpoint_cache_stats
 from dbs.database_postgres import setup_postgres_db_tables
+from dbs.database_sqlite import setup_sqlite_db_tables
+from dbs.sa_sessions import sqlalchemy_pool_stats, sqlalchemy_session_stats, sqlalchemy_session_writer
+from member_id.member_id_filter import member_id_filter_rebuild
+from member_id.member_id_suffix import member_id_suffix_allocator
 
 
 # ROUTE FORK (aka 'blueprints')
@@ -13,11 +18,52 @@ blueprint_database = Blueprint("blueprint_database")
 async def app_rotute_setup(request):
     """
     Endpoint: /database/init
-    Description: Sets up tables on either Postgres/SQLite(in memory)
-    Method: GET
+    Description: Sets up tables on either Postgres/SQLite (whichever DATABASE_APP_URL points at)
+    Method: POST
     Example Response: { "status": "success" }
     """
-    session = request.ctx.session
+    session = sqlalchemy_session_writer(request.ctx.session)
     async with session.begin():
-        await setup_postgres_db_tables(session)
+        if (await session.connection()).dialect.name == 'sqlite':
+            await setup_sqlite_db_tables(session)
+        else:
+            await setup_postgres_db_tables(session)
+    # --- counters were re-created, so blocks this worker reserved before are no longer valid
+    member_id_suffix_allocator.reset()
+    # --- start the registered filter over from the (now empty) table
+    await member_id_filter_rebuild(session)
     return json({ 'status': 'success' })
+
+
+@blueprint_database.route('/database/stats', methods = ['GET'])
+async def app_route_database_stats(request):
+    """
+    Endpoint: /database/stats
+    Description: Connection pool gauges, and how many requests actually created a db session / checked out a connection. Per worker
+    Method: GET
+    Example Response: {
+        "status": "success",
+        "data": {
+            "pool": { "size": 5, "checked_out": 1, "checked_in": 4, "overflow": 0, "max_overflow": 10, "checkouts": 42, "checkout_timeouts": 0, "checkout_wait_ms_avg": 0.08, "checkout_wait_ms_max": 3.1 },
+            "sessions": { "requests": 120, "sessions_created": 31, "requests_with_connection": 30, "connections_used": 34 }
+        }
+    }
+    """
+    return json({ 'status': 'success', 'data': { 'pool': sqlalchemy_pool_stats(), 'sessions': dict(sqlalchemy_session_stats) } })
+
+
+@blueprint_database.route('/cache/stats', methods = ['GET'])
+async def app_route_cache_stats(request):
+    """
+    Endpoint: /cache/stats
+    Description: Endpoint cache hit/miss/eviction counters per tier (L1 = this worker's memory, L2 = redis). Counters are per worker
+    Method: GET
+    Example Response: {
+        "status": "success",
+        "data": {
+            "l1": { "size": 12, "maxsize": 1024, "hits": 530, "misses": 41, "evictions": 0 },
+            "l2": { "hits": 30, "stale_hits": 2, "misses": 11, "errors": 0 }
+        }
+    }
+    """
+    return json({ 'status': 'success', 'data': endpoint_cache_stats() })
@@ -1,18 +1,244 @@
+import time
 import sqlalchemy as sa
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from dbs.database_sqlite import sqlite_pragmas_apply
 import env
+from metrics.metrics_registry import metrics_collector_register, metrics_counter_inc, metrics_histogram_observe, metrics_labels
 
-# ENGINE/BiND
-_sqlalchemy_engine = create_async_engine(env.env_get_database_app_url())
 
-# SESSION MAKER
+# POOL (async queue pool that also keeps track of how long checkouts wait)
+class MeteredAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_wait_seconds_total = 0.0
+        self.checkout_wait_seconds_max = 0.0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except sa.exc.TimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.checkout_wait_seconds_total += waited
+            self.checkout_wait_seconds_max = max(self.checkout_wait_seconds_max, waited)
+
+
+# ENGINE/BiND (built per worker at server start, since pooled connections can't be shared across forked processes)
+_sqlalchemy_engine = None
+_sqlalchemy_read_engine = None # sqlite only: a pool of query_only connections next to the single writer connection in _sqlalchemy_engine
+
+def sqlalchemy_engine_connect():
+    '''Creates this worker's engine + pool w/ settings from env. Call from a 'before_server_start' listener'''
+    global _sqlalchemy_engine
+    database_url = env.env_get_database_app_url()
+    if database_url.startswith('sqlite'):
+        return _sqlalchemy_sqlite_engines_connect(database_url)
+    engine_kwargs = {}
+    if database_url.startswith('postgresql+asyncpg'):
+        # --- asyncpg caches prepared statements per connection (set 0 if running behind pgbouncer in transaction mode)
+        statement_cache_size = env.env_get_database_app_statement_cache_size()
+        engine_kwargs['connect_args'] = { 'prepared_statement_cache_size': statement_cache_size, 'statement_cache_size': statement_cache_size }
+    _sqlalchemy_engine = create_async_engine(
+        database_url,
+        poolclass=MeteredAsyncAdaptedQueuePool,
+        pool_size=env.env_get_database_app_pool_size(),
+        max_overflow=env.env_get_database_app_pool_max_overflow(),
+        pool_timeout=env.env_get_database_app_pool_timeout(),
+        pool_recycle=env.env_get_database_app_pool_recycle(),
+        pool_pre_ping=env.env_get_database_app_pool_pre_ping(),
+        **engine_kwargs)
+    _sqlalchemy_engine_instrument(_sqlalchemy_engine)
+    _sqlalchemy_sessionmaker.configure(bind=_sqlalchemy_engine, sync_session_class=Session)
+    return _sqlalchemy_engine
+
+def _sqlalchemy_sqlite_engines_connect(database_url: str):
+    '''SQLite: one writer connection (so writes queue on the pool, not on sqlite's lock) + a pool of read connections. Sessions route between them (see SQLiteRoutingSession)'''
+    global _sqlalchemy_engine, _sqlalchemy_read_engine
+    _sqlalchemy_engine = create_async_engine(
+        database_url,
+        poolclass=MeteredAsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=env.env_get_database_app_pool_timeout())
+    _sqlalchemy_read_engine = create_async_engine(
+        database_url,
+        poolclass=MeteredAsyncAdaptedQueuePool,
+        pool_size=env.env_get_database_app_pool_size(),
+        max_overflow=env.env_get_database_app_pool_max_overflow(),
+        pool_timeout=env.env_get_database_app_pool_timeout())
+    sa.event.listen(_sqlalchemy_engine.sync_engine, 'connect', lambda dbapi_connection, connection_record: sqlite_pragmas_apply(dbapi_connection))
+    sa.event.listen(_sqlalchemy_read_engine.sync_engine, 'connect', lambda dbapi_connection, connection_record: sqlite_pragmas_apply(dbapi_connection, query_only=True))
+    _sqlalchemy_engine_instrument(_sqlalchemy_engine)
+    _sqlalchemy_engine_instrument(_sqlalchemy_read_engine)
+    _sqlalchemy_sessionmaker.configure(bind=None, sync_session_class=SQLiteRoutingSession)
+    return _sqlalchemy_engine
+
+class SQLiteRoutingSession(Session):
+    '''
+    Routes plain reads to the read pool, everything else (writes, DDL, session.connection()) to the writer connection.
+    Reads and the writer are separate connections w/ separate snapshots, so a transaction that reads then writes has to be pinned to the
+    writer before it starts (sqlalchemy_session_writer), otherwise it raises instead of silently running a non-atomic read-check-then-write.
+    Once a session touches the writer it stays there, so it also reads its own uncommitted writes
+    '''
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        is_read = clause != None and (getattr(clause, 'is_select', False) or (isinstance(clause, sa.sql.elements.TextClause) and clause.text.lstrip().upper().startswith('SELECT')))
+        if self.info.get('is_writer', False) or self._flushing or not is_read:
+            if self.info.get('is_reading', False) and not self.info.get('is_writer', False):
+                raise sa.exc.InvalidRequestError('Write after a read in the same transaction, which ran on a read connection. Pin the session w/ sqlalchemy_session_writer() before it begins')
+            self.info['is_writer'] = True
+            return _sqlalchemy_engine.sync_engine
+        self.info['is_reading'] = True
+        return _sqlalchemy_read_engine.sync_engine
+
+@sa.event.listens_for(SQLiteRoutingSession, 'after_transaction_end')
+def _sqlite_routing_transaction_end(session, transaction):
+    if transaction.parent == None:
+        session.info.pop('is_reading', None)
+
+def sqlalchemy_session_writer(session):
+    '''Pins a session to the writer connection (sqlite) before its transaction begins, so everything in it (reads incl.) shares one snapshot. A no-op on postgres'''
+    session.info['is_writer'] = True
+    return session
+
+# --- statement counts + durations (cursor level, so core + orm statements are both counted)
+_SQL_OPERATIONS = frozenset(['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'BEGIN', 'COMMIT', 'ROLLBACK', 'CREATE', 'DROP', 'LOCK'])
+
+def _sql_operation_labels(statement: str) -> str:
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    return metrics_labels(operation=operation if operation in _SQL_OPERATIONS else 'OTHER')
+
+def _sqlalchemy_engine_instrument(engine):
+    @sa.event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started_at', []).append(time.perf_counter())
+
+    @sa.event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        labels = _sql_operation_labels(statement)
+        metrics_counter_inc('sql_statements_total', labels)
+        metrics_histogram_observe('sql_statement_duration_seconds', labels, time.perf_counter() - conn.info['statement_started_at'].pop())
+
+    @sa.event.listens_for(engine.sync_engine, 'handle_error')
+    def handle_error(exception_context):
+        if exception_context.connection != None and exception_context.connection.info.get('statement_started_at'):
+            exception_context.connection.info['statement_started_at'].pop()
+        metrics_counter_inc('sql_statement_errors_total', _sql_operation_labels(exception_context.statement or ''))
+
+async def sqlalchemy_engine_dispose():
+    global _sqlalchemy_engine, _sqlalchemy_read_engine
+    for engine in (_sqlalchemy_engine, _sqlalchemy_read_engine):
+        if engine != None:
+            await engine.dispose()
+    _sqlalchemy_engine, _sqlalchemy_read_engine = None, None
+
+def _sqlalchemy_engine_pool_stats(engine, max_overflow: int) -> dict:
+    '''max_overflow: what the pool was configured w/ (env), rather than reading the pool's private attribute'''
+    pool = engine.pool
+    checkouts = getattr(pool, 'checkouts', 0)
+    return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': max(0, pool.overflow()), # negative until the pool has opened pool_size connections
+        'max_overflow': max_overflow,
+        'checkouts': checkouts,
+        'checkout_timeouts': getattr(pool, 'checkout_timeouts', 0),
+        'checkout_wait_ms_avg': round(1000 * pool.checkout_wait_seconds_total / checkouts, 3) if checkouts > 0 else 0,
+        'checkout_wait_ms_max': round(1000 * getattr(pool, 'checkout_wait_seconds_max', 0), 3),
+    }
+
+def sqlalchemy_pool_stats() -> dict:
+    '''Live pool gauges for this worker (on sqlite, the writer pool + the read pool under 'read_pool')'''
+    if _sqlalchemy_engine == None:
+        return {}
+    if _sqlalchemy_read_engine == None:
+        return _sqlalchemy_engine_pool_stats(_sqlalchemy_engine, env.env_get_database_app_pool_max_overflow())
+    stats = _sqlalchemy_engine_pool_stats(_sqlalchemy_engine, 0) # the single writer connection never overflows
+    stats['read_pool'] = _sqlalchemy_engine_pool_stats(_sqlalchemy_read_engine, env.env_get_database_app_pool_max_overflow())
+    return stats
+
+
+# SESSION MAKER (bound once the engine is built)
 _sqlalchemy_sessionmaker = sessionmaker(
-    _sqlalchemy_engine,
-    AsyncSession,
+    class_=AsyncSession,
     expire_on_commit=False,
     future=True,
 )
 
 def create_sqlalchemy_session():
-    return _sqlalchemy_sessionmaker()
\ No newline at end of file
+    if _sqlalchemy_engine == None:
+        raise RuntimeError('Database engine not built yet. Call sqlalchemy_engine_connect() first')
+    return _sqlalchemy_sessionmaker()
+
+
+# LAZY SESSION (for request middleware, so requests that never query don't pay for a session)
+@sa.event.listens_for(Session, 'after_begin')
+def _count_session_connection(session, transaction, connection):
+    session.info['connections_used'] = session.info.get('connections_used', 0) + 1
+
+class LazySQLAlchemySession:
+    '''Stands in for an AsyncSession, creating the real one on first attribute access (ex: session.begin())'''
+    __slots__ = ('_session',)
+
+    def __init__(self):
+        self._session = None
+
+    def __getattr__(self, name):
+        if self._session == None:
+            self._session = create_sqlalchemy_session()
+        return getattr(self._session, name)
+
+    @property
+    def is_created(self) -> bool:
+        return self._session != None
+
+    @property
+    def connections_used(self) -> int:
+        '''Transactions begun on a pooled connection (0 means no connection was ever checked out)'''
+        return self._session.sync_session.info.get('connections_used', 0) if self._session != None else 0
+
+    async def close(self):
+        if self._session != None:
+            await self._session.close()
+
+
+# --- per worker accounting of what requests actually used
+sqlalchemy_session_stats = { 'requests': 0, 'sessions_created': 0, 'requests_with_connection': 0, 'connections_used': 0 }
+
+def sqlalchemy_session_stats_record(session: LazySQLAlchemySession):
+    sqlalchemy_session_stats['requests'] += 1
+    sqlalchemy_session_stats['sessions_created'] += int(session.is_created)
+    sqlalchemy_session_stats['requests_with_connection'] += int(session.connections_used > 0)
+    sqlalchemy_session_stats['connections_used'] += session.connections_used
+
+def _sqlalchemy_metrics() -> list[tuple[str, str, float]]:
+    '''Session + pool stats for /metrics (read at snapshot time, see metrics/metrics_registry.py)'''
+    samples = [
+        ('db_session_requests_total', '', sqlalchemy_session_stats['requests']),
+        ('db_sessions_created_total', '', sqlalchemy_session_stats['sessions_created']),
+        ('db_session_requests_with_connection_total', '', sqlalchemy_session_stats['requests_with_connection']),
+        ('db_session_connections_used_total', '', sqlalchemy_session_stats['connections_used']),
+    ]
+    for pool_name, engine in (('primary', _sqlalchemy_engine), ('read', _sqlalchemy_read_engine)):
+        if engine == None:
+            continue
+        pool, labels = engine.pool, metrics_labels(pool=pool_name)
+        samples += [
+            ('db_pool_size', labels, pool.size()),
+            ('db_pool_checked_out', labels, pool.checkedout()),
+            ('db_pool_overflow', labels, max(0, pool.overflow())),
+            ('db_pool_checkouts_total', labels, getattr(pool, 'checkouts', 0)),
+            ('db_pool_checkout_timeouts_total', labels, getattr(pool, 'checkout_timeouts', 0)),
+            ('db_pool_checkout_wait_seconds_total', labels, getattr(pool, 'checkout_wait_seconds_total', 0.0)),
+        ]
+    return samples
+
+metrics_collector_register(_sqlalchemy_metrics)
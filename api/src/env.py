@@ -1,13 +1,27 @@
-import boto3
 import json
 import os
+import threading
+import time
+from types import MappingProxyType
 
 # ====================
 # INIT
 # ====================
 
-# --- setter (aka fetch & set secrets from AWS Secrets Manager, enabling multiple target env deployments)
-def _set_secrets_on_env():
+# Secrets Thoughts:
+# - secrets are fetched once into an immutable snapshot (at boot, or on the first get), so no lookup ever pays for a network call
+# - os.environ wins over the snapshot, so anything set on the container/shell overrides what's in secrets manager
+# - keys missing from both are just missing (None), which is remembered by the snapshot rather than triggering a refetch
+# - SECRETS_FILE (a .json or .env file) replaces secrets manager for offline runs. w/o it or TARGET_ENV, only os.environ is used
+# - SECRETS_REFRESH_SECONDS > 0 swaps in a fresh snapshot from a daemon thread (ex: for rotated passwords). a failed refresh keeps the old one
+
+_secrets_snapshot = None
+_secrets_lock = threading.Lock()
+_secrets_refresh_thread = None
+
+# --- providers (aka fetch secrets from AWS Secrets Manager, enabling multiple target env deployments, or from a local file)
+def _secrets_fetch_aws_secrets_manager() -> dict:
+    import boto3 # deferred, it's ~100ms of import that only processes w/o a SECRETS_FILE ever need (once, at boot)
     session = boto3.session.Session(
         aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
         aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
@@ -16,19 +30,63 @@ def _set_secrets_on_env():
     try:
         get_secret_value_response = client.get_secret_value(SecretId=os.environ.get('TARGET_ENV'))
         # Decrypts secret using the associated KMS key.
-        secret = json.loads(get_secret_value_response['SecretString'])
-        for key in dict(secret).keys():
-            os.environ[key] = secret[key]
+        return dict(json.loads(get_secret_value_response['SecretString']))
     except Exception as err:
         # For a list of exceptions thrown, see https://docs.aws.amazon.com/secretsmanager/latest/apireference/API_GetSecretValue.html
         raise err
 
+def _secrets_fetch_file(path: str) -> dict:
+    '''Reads secrets from a .json file (flat object) or a .env file (KEY=VALUE lines, # comments)'''
+    with open(path) as file:
+        if path.endswith('.json'):
+            return { key: str(value) for key, value in json.load(file).items() }
+        secrets = {}
+        for line in file:
+            line = line.strip()
+            if line == '' or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            secrets[key.strip().removeprefix('export ')] = value.strip().strip('"\'')
+        return secrets
+
+def _secrets_fetch() -> dict:
+    if os.environ.get('SECRETS_FILE'):
+        return _secrets_fetch_file(os.environ.get('SECRETS_FILE'))
+    if os.environ.get('TARGET_ENV'):
+        return _secrets_fetch_aws_secrets_manager()
+    return {}
+
+# --- refresh
+def _secrets_refresh_loop(interval_seconds: float):
+    global _secrets_snapshot
+    while True:
+        time.sleep(interval_seconds)
+        try:
+            _secrets_snapshot = MappingProxyType(_secrets_fetch())
+        except Exception as err:
+            print(f'[env] secrets refresh failed, keeping previous snapshot: {err}')
+
+# --- loader
+def secrets_load(force: bool = False):
+    '''Fetches the secrets snapshot (once per process, unless forced). Call at boot so the fetch happens before serving'''
+    global _secrets_snapshot, _secrets_refresh_thread
+    with _secrets_lock:
+        if _secrets_snapshot != None and force == False:
+            return
+        _secrets_snapshot = MappingProxyType(_secrets_fetch())
+        refresh_seconds = float(os.environ.get('SECRETS_REFRESH_SECONDS') or 0)
+        if refresh_seconds > 0 and _secrets_refresh_thread == None:
+            _secrets_refresh_thread = threading.Thread(target=_secrets_refresh_loop, args=(refresh_seconds,), name='secrets_refresh', daemon=True)
+            _secrets_refresh_thread.start()
+
 # --- getter
 def _env_getter(secret_key):
-    # If no secrets seen, fetch and set (will just run on first get)
-    if (os.environ.get(secret_key) == None):
-        _set_secrets_on_env()
-    return os.environ.get(secret_key)
+    value = os.environ.get(secret_key)
+    if value != None:
+        return value
+    if _secrets_snapshot == None:
+        secrets_load()
+    return _secrets_snapshot.get(secret_key)
 
 
 # ====================
@@ -46,14 +104,36 @@ def env_get_database_app_host():
     return _env_getter('DATABASE_APP_HOST')
 def env_get_database_app_port():
     return _env_getter('DATABASE_APP_PORT')
+def env_get_database_app_backend() -> str:
+    # --- 'postgres' (default), or 'sqlite' for single node deployments w/o a postgres server (see dbs/database_sqlite.py)
+    return (_env_getter('DATABASE_APP_BACKEND') or 'postgres').lower()
+def env_get_database_app_sqlite_path() -> str:
+    return _env_getter('DATABASE_APP_SQLITE_PATH') or 'asaphw.db'
+def env_is_database_app_sqlite() -> bool:
+    return env_get_database_app_url().startswith('sqlite')
 def env_get_database_app_url(driver="asyncpg"):
-    # # V1 - In-Memory SQLite
-    # # In-memory sql database for SQLAlchemy. Can replace this with external databases + create other env getters.
-    # # https://docs.sqlalchemy.org/en/20/core/engines.html#sqlite
-    # return 'sqlite+aiosqlite://'
-    # V2 - Postgres
+    # --- explicit url wins (ex: 'sqlite+aiosqlite:////tmp/asaphw.db')
+    # https://docs.sqlalchemy.org/en/14/core/engines.html#sqlite
+    if _env_getter('DATABASE_APP_URL'):
+        return _env_getter('DATABASE_APP_URL')
+    if env_get_database_app_backend() == 'sqlite':
+        return f'sqlite+aiosqlite:///{env_get_database_app_sqlite_path()}'
     return f"postgresql+{driver}://{env_get_database_app_user_name()}:{env_get_database_app_user_password()}@{env_get_database_app_host()}:{env_get_database_app_port()}/{env_get_database_app_name()}"
 
+# DATABASE - POOL (per worker, so the connection budget per node is workers * (pool_size + max_overflow))
+def env_get_database_app_pool_size() -> int:
+    return int(_env_getter('DATABASE_APP_POOL_SIZE') or 5)
+def env_get_database_app_pool_max_overflow() -> int:
+    return int(_env_getter('DATABASE_APP_POOL_MAX_OVERFLOW') or 10)
+def env_get_database_app_pool_timeout() -> float:
+    return float(_env_getter('DATABASE_APP_POOL_TIMEOUT') or 30)
+def env_get_database_app_pool_recycle() -> int:
+    return int(_env_getter('DATABASE_APP_POOL_RECYCLE') or 1800)
+def env_get_database_app_pool_pre_ping() -> bool:
+    return (_env_getter('DATABASE_APP_POOL_PRE_PING') or 'false').lower() == 'true'
+def env_get_database_app_statement_cache_size() -> int:
+    return int(_env_getter('DATABASE_APP_STATEMENT_CACHE_SIZE') or 100)
+
 # ENV
 def env_is_local() -> bool:
     return _env_getter('TARGET_ENV') == 'asap/local'
@@ -73,7 +153,35 @@ def env_get_service_cache_host():
     return _env_getter('SERVICE_CACHE_HOST')
 def env_get_service_cache_port():
     return _env_getter('SERVICE_CACHE_PORT')
+def env_get_service_cache_pool_size() -> int:
+    return int(_env_getter('SERVICE_CACHE_POOL_SIZE') or 20)
+def env_get_service_cache_pool_timeout() -> float:
+    return float(_env_getter('SERVICE_CACHE_POOL_TIMEOUT') or 1)
+def env_get_service_cache_socket_timeout() -> float:
+    return float(_env_getter('SERVICE_CACHE_SOCKET_TIMEOUT') or 0.5)
+def env_get_service_cache_in_process() -> bool:
+    # --- swaps redis for fakeredis in this process (benchmarks/local runs w/o a redis server). never for production
+    return (_env_getter('SERVICE_CACHE_IN_PROCESS') or 'false').lower() == 'true'
+
+# METRICS
+def env_get_metrics_snapshot_seconds() -> int:
+    return int(_env_getter('METRICS_SNAPSHOT_SECONDS') or 5)
+
+# MEMBER ID
+def env_get_member_id_suffix_key() -> str:
+    return _env_getter('MEMBER_ID_SUFFIX_KEY')
+def env_get_member_id_suffix_block_size() -> int:
+    return int(_env_getter('MEMBER_ID_SUFFIX_BLOCK_SIZE') or 16)
+def env_get_member_id_filter_capacity() -> int:
+    return int(_env_getter('MEMBER_ID_FILTER_CAPACITY') or 1000000)
+def env_get_member_id_filter_fp_rate() -> float:
+    return float(_env_getter('MEMBER_ID_FILTER_FP_RATE') or 0.01)
+def env_get_member_import_errors_dir() -> str:
+    return _env_getter('MEMBER_IMPORT_ERRORS_DIR') or '/tmp/member_imports'
 
+# WORKER
+def env_get_worker_concurrency() -> int:
+    return int(_env_getter('WORKER_CONCURRENCY') or 4)
 
 # SERVICE -- WWW
 def env_get_service_www_host() -> str:
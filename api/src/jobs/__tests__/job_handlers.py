@@ -0,0 +1,57 @@
+import asyncio
+
+import sqlalchemy as sa
+from redis.exceptions import RedisError
+
+from dbs.database_redis import Cacher, redis_client_close, redis_client_connect
+from dbs.database_sqlite import setup_sqlite_db_tables
+from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_engine_connect, sqlalchemy_engine_dispose
+import jobs.job_handlers
+from jobs.job_handlers import job_member_ids_bulk_create
+from jobs.job_queue import job_enqueue, job_get, job_update
+from member_id.member_id_suffix import member_id_suffix_allocator
+from user.user_models import User
+
+
+def test_job_member_ids_bulk_create_resume(tmp_path, monkeypatch):
+    monkeypatch.delenv('DATABASE_APP_URL', raising=False)
+    monkeypatch.setenv('DATABASE_APP_BACKEND', 'sqlite')
+    monkeypatch.setenv('DATABASE_APP_SQLITE_PATH', str(tmp_path / 'app.db'))
+    monkeypatch.setenv('SERVICE_CACHE_IN_PROCESS', 'true')
+    monkeypatch.setenv('MEMBER_ID_SUFFIX_KEY', 'test-key')
+    members = [{ 'first_name': 'Ana', 'last_name': 'Ruiz', 'dob': '02/03/1970', 'country': 'CA' }] * 3 + [{ 'first_name': 'Jose' }]
+    async def run():
+        sqlalchemy_engine_connect()
+        await redis_client_connect()
+        member_id_suffix_allocator.reset()
+        try:
+            async with create_sqlalchemy_session() as session:
+                async with session.begin():
+                    await setup_sqlite_db_tables(session)
+            job_id = await job_enqueue('member_ids_bulk_create', { 'members': members })
+            # --- tests: the first attempt dies right after its chunk commits, before it could record that
+            async def job_update_dies_after_commit(job_id: str, **fields):
+                if fields['progress']['pending'] == {}:
+                    raise RedisError('connection lost')
+                await job_update(job_id, **fields)
+            monkeypatch.setattr(jobs.job_handlers, 'job_update', job_update_dies_after_commit)
+            async with create_sqlalchemy_session() as session:
+                try:
+                    await job_member_ids_bulk_create(session, await job_get(job_id, include_payload=True))
+                    assert False, 'Expected the first attempt to fail'
+                except RedisError:
+                    pass
+            monkeypatch.setattr(jobs.job_handlers, 'job_update', job_update)
+            # --- tests: the retry finds the chunk already committed, so it reports those members instead of creating them again
+            async with create_sqlalchemy_session() as session:
+                result = await job_member_ids_bulk_create(session, await job_get(job_id, include_payload=True))
+            assert result['created'] == 3 and result['failed'] == 1, 'Unexpected retry result'
+            assert result['results'][3]['status'] == 'failure', 'Invalid member should stay failed'
+            async with create_sqlalchemy_session() as session:
+                async with session.begin():
+                    assert (await session.execute(sa.select(sa.func.count()).select_from(User))).scalar() == 3, 'Retry created duplicate members'
+        finally:
+            await Cacher().client.flushall()
+            await redis_client_close()
+            await sqlalchemy_engine_dispose()
+    asyncio.run(run())
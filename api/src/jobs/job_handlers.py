@@ -0,0 +1,53 @@
+from jobs.job_queue import job_update
+from member_id.member_id_bulk import member_ids_bulk_create, member_ids_bulk_resume
+from member_id.member_id_filter import member_id_filter_rebuild
+from member_id.member_id_import import member_import_errors_path, member_import_errors_url, member_import_file_chunks, member_import_stream
+from member_id.member_id_schemas import members_parse
+from member_id.routes import member_ids_cache_invalidate
+
+
+# HANDLERS (each takes a session + the job w/ its payload and saved progress, and returns a json serializable result)
+# --- a job can run again after a partial attempt (retry, or requeued from a dead worker), so handlers w/ side effects resume instead of redoing them
+async def job_member_ids_bulk_create(session, job: dict) -> dict:
+    members = members_parse(job['payload'])
+    # --- resume: members an earlier attempt finished (incl. any in the chunk it was committing when it died) aren't created again
+    progress = job['progress'] or { 'results': {}, 'pending': {} }
+    finished = { int(index): result for index, result in progress['results'].items() }
+    finished.update(await member_ids_bulk_resume(session, { int(index): value for index, value in progress['pending'].items() }))
+    remaining = [index for index in range(len(members)) if index not in finished]
+    async def checkpoint(chunk_results: dict, pending: dict):
+        await job_update(job['id'], progress={
+            'results': { **finished, **{ remaining[index]: result for index, result in chunk_results.items() } },
+            'pending': { remaining[index]: value for index, value in pending.items() },
+        })
+    finished.update(zip(remaining, await member_ids_bulk_create(session, [members[index] for index in remaining], checkpoint=checkpoint)))
+    results = [finished[index] for index in range(len(members))]
+    created = sum(1 for result in results if result['status'] == 'success')
+    if created > 0:
+        await member_ids_cache_invalidate()
+    return { 'results': results, 'created': created, 'failed': len(results) - created }
+
+async def job_member_ids_import(session, job: dict) -> dict:
+    # --- retries resume from the import's own checkpoint (by import id), see member_id/member_id_import.py
+    payload = job['payload']
+    import_summary = await member_import_stream(
+        session,
+        member_import_file_chunks(payload['file']),
+        format=payload['format'],
+        import_id=payload['import_id'],
+        chunk_size=payload['chunk_size'],
+        errors_path=payload['errors_path'] or member_import_errors_path(payload['import_id']))
+    if import_summary['rows_this_run'] > 0:
+        await member_ids_cache_invalidate()
+    # --- a custom --errors path isn't under MEMBER_IMPORT_ERRORS_DIR, so it can't be downloaded
+    return { **import_summary, 'errors_url': member_import_errors_url(payload['import_id']) if payload['errors_path'] == None else None }
+
+async def job_member_id_filter_rebuild(session, job: dict) -> dict:
+    return await member_id_filter_rebuild(session)
+
+
+JOB_HANDLERS = {
+    'member_ids_bulk_create': job_member_ids_bulk_create,
+    'member_ids_import': job_member_ids_import,
+    'member_id_filter_rebuild': job_member_id_filter_rebuild,
+}
@@ -0,0 +1,83 @@
+from datetime import datetime
+import json as json_lib
+import uuid
+
+from dbs.database_redis import Cacher
+
+
+# Job Queue Thoughts:
+# - heavy work (bulk creates, imports, filter rebuilds) runs in worker processes (`python src/start.py worker`), off the request path
+# - pending job ids sit in a redis list. a worker atomically moves an id into its own processing list while it runs,
+#   so if a worker dies its jobs can be put back on the queue by whoever notices its heartbeat is gone
+# - job state lives in a hash per job, so the api can report status w/o talking to workers
+# - a job can run more than once (retries, requeues from dead workers), so handlers save progress on the job as they go and pick up from it
+
+JOBS_QUEUE_KEY = ['jobs', 'queue']
+JOB_TTL_SECONDS = 60 * 60 * 24 * 7 # finished jobs are kept around this long for status lookups
+
+def _job_key(job_id: str) -> list[str]:
+    return ['jobs', 'job', job_id]
+
+
+async def job_enqueue(job_type: str, payload: dict, max_attempts: int = 3) -> str:
+    '''
+    Input: Takes a job type (see jobs/job_handlers.py), a json serializable payload, and how many times to try it
+    Output: Returns the new job's id
+    '''
+    cacher = Cacher()
+    job_id = uuid.uuid4().hex
+    now = datetime.now().isoformat()
+    async with cacher.client.pipeline(transaction=True) as pipe:
+        pipe.hset(cacher.namespace_key(_job_key(job_id)), mapping={
+            'id': job_id,
+            'type': job_type,
+            'status': 'queued',
+            'payload': json_lib.dumps(payload),
+            'attempts': 0,
+            'max_attempts': max_attempts,
+            'created_at': now,
+            'updated_at': now,
+        })
+        pipe.expire(cacher.namespace_key(_job_key(job_id)), JOB_TTL_SECONDS)
+        pipe.lpush(cacher.namespace_key(JOBS_QUEUE_KEY), job_id)
+        await pipe.execute()
+    return job_id
+
+
+def _job_fields(fields: dict) -> dict:
+    fields['updated_at'] = datetime.now().isoformat()
+    return { key: json_lib.dumps(value) if key in ('result', 'payload', 'progress') else value for key, value in fields.items() }
+
+
+async def job_update(job_id: str, **fields):
+    cacher = Cacher()
+    await cacher.client.hset(cacher.namespace_key(_job_key(job_id)), mapping=_job_fields(fields))
+
+
+async def job_requeue(job_id: str, processing_key: str, **fields):
+    '''Updates a job + moves it from a worker's processing list (namespaced key) back onto the queue in one MULTI/EXEC, so it's never on both'''
+    cacher = Cacher()
+    async with cacher.client.pipeline(transaction=True) as pipe:
+        pipe.hset(cacher.namespace_key(_job_key(job_id)), mapping=_job_fields(fields))
+        pipe.lrem(processing_key, 1, job_id)
+        pipe.lpush(cacher.namespace_key(JOBS_QUEUE_KEY), job_id)
+        await pipe.execute()
+
+
+async def job_get(job_id: str, include_payload: bool = False) -> dict or None:
+    '''Job state for status lookups. Returns None if it doesn't exist (or expired). include_payload: also the payload + saved progress (for running it)'''
+    job_hash = await Cacher().get_hash(_job_key(job_id))
+    if job_hash == None:
+        return None
+    job = { key.decode(): value.decode() for key, value in job_hash.items() }
+    job['attempts'] = int(job['attempts'])
+    job['max_attempts'] = int(job['max_attempts'])
+    job['result'] = json_lib.loads(job['result']) if 'result' in job else None
+    job['error'] = job.get('error')
+    if include_payload:
+        job['payload'] = json_lib.loads(job['payload'])
+        job['progress'] = json_lib.loads(job['progress']) if 'progress' in job else None
+    else:
+        del job['payload']
+        job.pop('progress', None)
+    return job
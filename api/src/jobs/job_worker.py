@@ -0,0 +1,132 @@
+import asyncio
+import os
+import socket
+from redis.exceptions import RedisError
+
+from dbs.database_redis import Cacher, redis_client_close, redis_client_connect
+from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_engine_connect, sqlalchemy_engine_dispose
+import env
+from jobs.job_handlers import JOB_HANDLERS
+from jobs.job_queue import JOBS_QUEUE_KEY, job_get, job_requeue, job_update
+from member_id.member_id_suffix import member_id_suffix_key
+
+WORKER_POLL_SECONDS = 1 # how long a blocking pop waits before checking back in
+WORKER_HEARTBEAT_SECONDS = 10
+WORKER_HEARTBEAT_TTL_SECONDS = 30 # a worker that misses this is considered dead, and its jobs are requeued
+
+
+def _processing_key(worker_id: str) -> list[str]:
+    return ['jobs', 'processing', worker_id]
+
+def _heartbeat_key(worker_id: str) -> list[str]:
+    return ['jobs', 'worker', worker_id]
+
+
+async def _job_run(worker_id: str, job_id: str):
+    '''Runs one job, recording its status. Failed jobs are requeued until they run out of attempts. Redis errors while recording are raised (see _jobs_requeue_stranded)'''
+    cacher = Cacher()
+    job = await job_get(job_id, include_payload=True)
+    # --- gone, or already finished (ex: requeued after it succeeded, but before it left our processing list)
+    if job == None or job['status'] in ('succeeded', 'failed'):
+        return
+    handler = JOB_HANDLERS.get(job['type'])
+    attempts = job['attempts'] + 1
+    try:
+        await job_update(job_id, status='running', attempts=attempts, worker=worker_id)
+        if handler == None:
+            raise ValueError(f'Unknown job type: {job["type"]}')
+        async with create_sqlalchemy_session() as session:
+            result = await handler(session, job)
+        await job_update(job_id, status='succeeded', result=result, error='')
+        print(f'[worker {worker_id}] job {job_id} ({job["type"]}) succeeded')
+    except Exception as err:
+        if handler != None and attempts < job['max_attempts']:
+            # --- handlers resume from the progress they saved, so a retry doesn't redo finished work
+            await job_requeue(job_id, cacher.namespace_key(_processing_key(worker_id)), status='queued', error=str(err))
+        else:
+            await job_update(job_id, status='failed', error=str(err))
+        print(f'[worker {worker_id}] job {job_id} ({job["type"]}) attempt {attempts} failed: {err}')
+
+
+async def _job_consumer(worker_id: str, running: set):
+    cacher = Cacher()
+    queue_key, processing_key = cacher.namespace_key(JOBS_QUEUE_KEY), cacher.namespace_key(_processing_key(worker_id))
+    while True:
+        try:
+            # --- atomically claim the next job (it stays in our processing list until it's done)
+            job_id = await cacher.client.brpoplpush(queue_key, processing_key, timeout=WORKER_POLL_SECONDS)
+            if job_id == None:
+                continue
+            running.add(job_id)
+            try:
+                await _job_run(worker_id, job_id.decode())
+            finally:
+                running.discard(job_id)
+            await cacher.client.lrem(processing_key, 1, job_id)
+        except RedisError as err:
+            print(f'[worker {worker_id}] queue unavailable: {err}')
+            await asyncio.sleep(WORKER_POLL_SECONDS)
+
+
+async def _jobs_requeue_orphaned():
+    '''Puts jobs claimed by dead workers (no heartbeat) back on the queue'''
+    cacher = Cacher()
+    queue_key = cacher.namespace_key(JOBS_QUEUE_KEY)
+    async for processing_key in cacher.client.scan_iter(match=cacher.namespace_key(_processing_key('*'))):
+        worker_id = processing_key.decode().rsplit(':::', 1)[1]
+        if await cacher.client.exists(cacher.namespace_key(_heartbeat_key(worker_id))):
+            continue
+        while await cacher.client.rpoplpush(processing_key, queue_key) != None:
+            pass
+
+async def _jobs_requeue_stranded(worker_id: str, running: set, suspects: set) -> set:
+    '''
+    Puts back jobs left in our own processing list that no consumer is running (ex: redis failed while a job's status was being
+    recorded, so it was never removed). Our heartbeat is alive, so _jobs_requeue_orphaned never would.
+    A job only counts once it's seen idle on two sweeps in a row, since a consumer may have claimed it a moment ago.
+    Output: Returns this sweep's idle jobs, to pass back in as suspects next time
+    '''
+    cacher = Cacher()
+    processing_key = cacher.namespace_key(_processing_key(worker_id))
+    idle = set(await cacher.client.lrange(processing_key, 0, -1)) - running
+    for job_id in idle & suspects:
+        async with cacher.client.pipeline(transaction=True) as pipe:
+            pipe.lrem(processing_key, 1, job_id)
+            pipe.lpush(cacher.namespace_key(JOBS_QUEUE_KEY), job_id)
+            await pipe.execute()
+    return idle - suspects
+
+async def _worker_heartbeat(worker_id: str, running: set):
+    cacher = Cacher()
+    suspects = set()
+    while True:
+        try:
+            await cacher.client.set(cacher.namespace_key(_heartbeat_key(worker_id)), 1, ex=WORKER_HEARTBEAT_TTL_SECONDS)
+            await _jobs_requeue_orphaned()
+            suspects = await _jobs_requeue_stranded(worker_id, running, suspects)
+        except RedisError as err:
+            print(f'[worker {worker_id}] heartbeat failed: {err}')
+        await asyncio.sleep(WORKER_HEARTBEAT_SECONDS)
+
+
+async def run_worker(concurrency: int):
+    worker_id = f'{socket.gethostname()}-{os.getpid()}'
+    member_id_suffix_key() # bulk jobs allocate suffixes, so fail at boot if the key is missing
+    sqlalchemy_engine_connect()
+    # --- each consumer holds a connection in its blocking pop, so size the pool (+ socket timeout) around that
+    await redis_client_connect(
+        max_connections=concurrency * 2 + 2,
+        socket_timeout=WORKER_POLL_SECONDS + env.env_get_service_cache_socket_timeout())
+    print(f'[worker {worker_id}] consuming jobs w/ concurrency {concurrency}')
+    running = set() # job ids our consumers are running right now
+    try:
+        await asyncio.gather(
+            _worker_heartbeat(worker_id, running),
+            *[_job_consumer(worker_id, running) for _ in range(concurrency)])
+    finally:
+        await redis_client_close()
+        await sqlalchemy_engine_dispose()
+
+
+def start_worker():
+    asyncio.run(run_worker(concurrency=env.env_get_worker_concurrency()))
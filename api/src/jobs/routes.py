@@ -0,0 +1,31 @@
+from sanic.response import json
+from sanic import Blueprint
+
+from jobs.job_queue import job_get
+
+
+# ROUTE FORK (aka 'blueprints')
+blueprint_jobs = Blueprint("blueprint_jobs")
+
+
+# ROUTES
+@blueprint_jobs.route('/v1/jobs/<job_id:str>', methods = ['GET'])
+async def app_route_job_get(request, job_id: str):
+    """
+    Endpoint: /v1/jobs/<job_id>
+    Description: Gets the status of a background job (queued/running/succeeded/failed), and its result once done
+    Method: GET
+    Example Response: {
+        "status": "success"
+        "data": {
+            "job": { "id": "...", "type": "member_ids_bulk_create", "status": "succeeded", "attempts": 1, "max_attempts": 3, "result": {...}, "error": "", ... }
+        }
+    }
+    """
+    job = await job_get(job_id)
+    if job == None:
+        raise ValueError(f'Job not found: {job_id}')
+    return json({
+        'status': 'success',
+        'data': { 'job': job },
+    })
@@ -0,0 +1,44 @@
+import random
+
+from geo.country_codes import country_codes_and_names
+from member_id.member_id_codec import MEMBER_ID_COUNTRY_CODES_INDEXED, member_id_cohort_range, member_id_decode, member_id_encode
+
+
+def test_member_id_codec_round_trip():
+    rng = random.Random(7)
+    country_codes = sorted(country_codes_and_names)
+    member_ids = [f'{rng.randint(0, 99):02}-{rng.choice(country_codes)}-{rng.randint(0, 99):02}-{rng.randint(1, 12):02}-{rng.getrandbits(16):04X}' for _ in range(5000)]
+    member_id_ints = [member_id_encode(member_id) for member_id in member_ids]
+    # --- tests: reversible, fits a BIGINT
+    assert [member_id_decode(member_id_int) for member_id_int in member_id_ints] == member_ids, 'Decode does not invert encode'
+    assert max(member_id_ints) < 1 << 42, 'Packed id wider than expected'
+    # --- tests: integer order matches text order (so cohorts are ranges)
+    assert sorted(member_ids) == [member_id_decode(member_id_int) for member_id_int in sorted(member_id_ints)], 'Integer order drifted from text order'
+    # --- tests: case insensitive, same as cleaned ids
+    assert member_id_encode('23-mx-61-01-2f0d') == member_id_encode('23-MX-61-01-2F0D'), 'Encoding should ignore case'
+
+
+def test_member_id_codec_unencodable():
+    for member_id in ['XYZ123', '23-MX-61-13-2F0D', '23-ZZ-61-01-2F0D', '23-MX-61-01-ZZZZ', '']:
+        assert member_id_encode(member_id) == None, f'Expected {member_id!r} to be unencodable'
+
+
+def test_member_id_country_codes_frozen():
+    # --- tests: every known country has an index, and the index fits its 8 bits
+    assert set(MEMBER_ID_COUNTRY_CODES_INDEXED) == set(country_codes_and_names), 'Country index out of sync w/ country codes (append new codes, never reorder)'
+    assert len(MEMBER_ID_COUNTRY_CODES_INDEXED) <= 256, 'Country index overflows its bits'
+
+
+def test_member_id_cohort_range():
+    start, end = member_id_cohort_range(23, 'MX', 61)
+    # --- tests: range holds exactly the cohort's ids
+    assert start <= member_id_encode('23-MX-61-01-0000'), 'Range starts after the cohort'
+    assert member_id_encode('23-MX-61-12-FFFF') < end, 'Range ends before the cohort'
+    assert member_id_encode('23-MX-62-01-0000') >= end, 'Range runs into the next cohort'
+    assert member_id_encode('23-MX-60-12-FFFF') < start, 'Range starts in the previous cohort'
+    # --- tests: filters must form a prefix
+    try:
+        member_id_cohort_range(23, None, 61)
+        assert False, 'Expected a failure for a gap in filters'
+    except ValueError:
+        pass
@@ -0,0 +1,27 @@
+import csv
+from datetime import date
+import gzip
+import io
+import json
+
+from member_id.member_id_export import MEMBER_EXPORT_COLUMNS, MemberExportEncoder
+
+_ROWS = [('23-MX-61-01-2F0D', '2023-05-01 12:00:00', 'Jose', 'Vasconcelos, Jr.', date(1961, 1, 1), 'MX', '2023-05-01 12:00:00')]
+
+
+def test_member_export_encoder_csv():
+    encoder = MemberExportEncoder(format='csv', gzip=True)
+    data = encoder.encode(_ROWS) + encoder.encode(_ROWS) + encoder.finish()
+    rows = list(csv.reader(io.StringIO(gzip.decompress(data).decode())))
+    # --- tests: one header across chunks, fields w/ commas are quoted
+    assert rows[0] == list(MEMBER_EXPORT_COLUMNS), 'Expected a header row'
+    assert rows[1] == rows[2] == ['23-MX-61-01-2F0D', '2023-05-01 12:00:00', 'Jose', 'Vasconcelos, Jr.', '1961-01-01', 'MX', '2023-05-01 12:00:00'], 'Unexpected csv row'
+    # --- tests: an empty export is still a valid csv
+    assert MemberExportEncoder(format='csv').finish().decode().strip() == ','.join(MEMBER_EXPORT_COLUMNS), 'Empty export should have a header'
+
+
+def test_member_export_encoder_ndjson():
+    encoder = MemberExportEncoder(format='ndjson')
+    lines = (encoder.encode(_ROWS) + encoder.finish()).decode().splitlines()
+    assert json.loads(lines[0]) == { 'member_id': '23-MX-61-01-2F0D', 'member_id_created_at': '2023-05-01 12:00:00', 'first_name': 'Jose',
+        'last_name': 'Vasconcelos, Jr.', 'date_of_birth': '1961-01-01', 'country': 'MX', 'user_created_at': '2023-05-01 12:00:00' }, 'Unexpected ndjson row'
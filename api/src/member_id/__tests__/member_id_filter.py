@@ -0,0 +1,102 @@
+import asyncio
+from datetime import date
+import os
+import tempfile
+
+import redis.asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from dbs.database_redis import Cacher, redis_client_close, redis_client_connect
+from dbs.database_sqlite import setup_sqlite_db_tables
+import env
+from member_id.member_id_bulk import member_rows_insert
+from member_id.member_id_filter import MEMBER_ID_FILTER_META_KEY, _filter_bits_get, _filter_bits_set, member_id_filter_add, member_id_filter_fp_rate, member_id_filter_might_contain, member_id_filter_positions, member_id_filter_rebuild, member_id_filter_size
+from member_id.member_id_schemas import MemberCreate
+from user.user_models import User # so the MemberID -> User relationship resolves
+
+
+def test_member_id_filter_size():
+    # --- tests: ~9.6 bits + 7 hashes per item for a 1% filter
+    bits, hash_count = member_id_filter_size(capacity=1000000, fp_rate=0.01)
+    assert 9500000 < bits < 9700000, 'Unexpected bit count'
+    assert hash_count == 7, 'Unexpected hash count'
+    # --- tests: filled to capacity, expected rate lands on target
+    assert abs(member_id_filter_fp_rate(1000000, bits, hash_count) - 0.01) < 0.001, 'Sizing misses target rate'
+
+
+def test_member_id_filter_positions():
+    bits, hash_count = member_id_filter_size(capacity=1000, fp_rate=0.01)
+    positions = member_id_filter_positions('23-MX-61-01-2F0D', bits, hash_count)
+    assert len(positions) == hash_count, 'Incorrect number of positions'
+    assert all(0 <= position < bits for position in positions), 'Position out of range'
+    # --- tests: stable across calls/processes (workers must agree on bits)
+    assert positions == member_id_filter_positions('23-MX-61-01-2F0D', bits, hash_count), 'Positions not deterministic'
+    assert positions != member_id_filter_positions('23-MX-61-01-2F0E', bits, hash_count), 'Different ids share positions'
+
+
+def test_member_id_filter_false_positives():
+    # --- tests: observed rate on a filled filter is in line w/ the target
+    bits, hash_count = member_id_filter_size(capacity=5000, fp_rate=0.01)
+    bit_array = bytearray((bits + 7) // 8)
+    for index in range(5000):
+        for position in member_id_filter_positions(f'23-MX-61-01-{index:04X}', bits, hash_count):
+            bit_array[position >> 3] |= 0x80 >> (position & 7)
+    false_positives = sum(
+        all(bit_array[position >> 3] & (0x80 >> (position & 7)) for position in member_id_filter_positions(f'24-CA-71-02-{index:04X}', bits, hash_count))
+        for index in range(5000))
+    assert false_positives / 5000 < 0.02, 'False positive rate well over target'
+
+
+def test_member_id_filter_bitfield_commands(monkeypatch):
+    # --- tests: a lookup/add is one BITFIELD per key, not a command per bit (nothing is sent, we just read the queued commands)
+    monkeypatch.setenv('SERVICE_CACHE_IN_PROCESS', 'false')
+    pipe = redis.asyncio.Redis().pipeline(transaction=False)
+    _filter_bits_get(pipe, 'bits', [3, 17])
+    _filter_bits_set(pipe, 'bits', [3, 17])
+    assert [command[0] for command in pipe.command_stack] == [
+        ('BITFIELD', 'bits', 'GET', 'u1', 3, 'GET', 'u1', 17),
+        ('BITFIELD', 'bits', 'SET', 'u1', 3, 1, 'SET', 'u1', 17, 1),
+    ], 'Unexpected commands'
+
+
+def test_member_id_filter_add_might_contain(monkeypatch):
+    monkeypatch.setenv('SERVICE_CACHE_IN_PROCESS', 'true')
+    async def run():
+        await redis_client_connect()
+        try:
+            cacher = Cacher()
+            # --- tests: not built yet, so it can't rule anything out
+            await member_id_filter_add(['23-MX-61-01-2F0D'])
+            assert await member_id_filter_might_contain(['23-MX-61-01-2F0D']) == [None], 'Unbuilt filter answered'
+            bits, _ = member_id_filter_size(env.env_get_member_id_filter_capacity(), env.env_get_member_id_filter_fp_rate())
+            await cacher.client.hset(cacher.namespace_key(MEMBER_ID_FILTER_META_KEY), 'bits', bits)
+            # --- tests: added ids are maybe registered, others definitely not
+            assert await member_id_filter_might_contain(['23-MX-61-01-2F0D', '24-CA-71-02-0001']) == [True, False], 'Unexpected lookups'
+        finally:
+            await Cacher().client.flushall()
+            await redis_client_close()
+    asyncio.run(run())
+
+
+def test_member_id_filter_rebuild_late_commit(monkeypatch):
+    monkeypatch.setenv('SERVICE_CACHE_IN_PROCESS', 'true')
+    async def run(directory: str):
+        await redis_client_connect()
+        engine = create_async_engine(f'sqlite+aiosqlite:///{os.path.join(directory, "test.db")}')
+        try:
+            async with AsyncSession(engine) as session:
+                async with session.begin():
+                    await setup_sqlite_db_tables(session)
+                await member_id_filter_rebuild(session)
+                # --- tests: an id added before a rebuild resets 'building', but committed after its scan, stays registered
+                await member_id_filter_add(['23-MX-61-01-0001'])
+                await member_id_filter_rebuild(session)
+                async with session.begin():
+                    await member_rows_insert(session, [{ 'member': MemberCreate('Jose', 'Vasconcelos', 'MX', date(1961, 1, 1)), 'member_id_value': '23-MX-61-01-0001' }])
+                assert await member_id_filter_might_contain(['23-MX-61-01-0001']) == [True], 'Rebuild dropped a registered id'
+        finally:
+            await engine.dispose()
+            await Cacher().client.flushall()
+            await redis_client_close()
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(directory))
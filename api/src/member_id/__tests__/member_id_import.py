@@ -0,0 +1,44 @@
+import asyncio
+
+from member_id.member_id_import import member_import_records
+
+
+def _records(chunks: list[bytes], format: str) -> list[tuple]:
+    async def source():
+        for chunk in chunks:
+            yield chunk
+    async def collect():
+        return [record async for record in member_import_records(source(), format=format)]
+    return asyncio.run(collect())
+
+
+def test_member_import_records_csv():
+    body = '﻿first_name,last_name,dob,country\r\n"Vasconcelos, Jose",V,01/01/1961,MX\r\n\r\nAna,R,1970-02-03,CA'.encode()
+    # --- tests: same records regardless of where chunks split (incl. mid line + mid quoted field)
+    for split_at in [1, 7, 40, 52, len(body)]:
+        records = _records([body[:split_at], body[split_at:]], format='csv')
+        assert [(line_number, record) for line_number, record, _ in records] == [
+            (2, { 'first_name': 'Vasconcelos, Jose', 'last_name': 'V', 'dob': '01/01/1961', 'country': 'MX' }),
+            (4, { 'first_name': 'Ana', 'last_name': 'R', 'dob': '1970-02-03', 'country': 'CA' }),
+        ], f'Unexpected records when split at {split_at}'
+    # --- tests: a header w/o the member columns fails the import
+    try:
+        _records([b'a,b\n1,2\n'], format='csv')
+        assert False, 'Expected a failure for a bad header'
+    except ValueError:
+        pass
+
+
+def test_member_import_records_ndjson():
+    records = _records([b'{"first_name": "Ana"}\n{bad\n'], format='ndjson')
+    assert [(line_number, record) for line_number, record, _ in records] == [(1, { 'first_name': 'Ana' }), (2, 'Invalid JSON')], 'Unexpected records'
+
+
+def test_member_import_records_invalid_utf8():
+    # --- tests: an undecodable line is one row error, the rows around it still come through
+    records = _records([b'first_name,last_name,dob,country\nAna,R,1970-02-03,CA\nJos\xe9,V,01/01/1961,MX\nBo,K,1980-01-01,CA\n'], format='csv')
+    assert [(line_number, record if isinstance(record, str) else record['first_name']) for line_number, record, _ in records] == [
+        (2, 'Ana'), (3, 'Invalid UTF-8'), (4, 'Bo')], 'Unexpected records'
+    assert records[1][2] == 'Jos�,V,01/01/1961,MX', 'Raw row should be kept (w/ replacement chars) for the error report'
+    records = _records([b'{"first_name": "\xff"}\n{"first_name": "Ana"}'], format='ndjson')
+    assert [(line_number, record) for line_number, record, _ in records] == [(1, 'Invalid UTF-8'), (2, { 'first_name': 'Ana' })], 'Unexpected records'
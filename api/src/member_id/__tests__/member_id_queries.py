@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timezone
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_engine_connect, sqlalchemy_engine_dispose
+from member_id.member_id_codec import member_id_cohort_range
+from member_id.member_id_queries import member_ids_cohort_query, member_ids_page_query, member_ids_serialize
+from user.user_models import User # MemberID relates to it, so it has to be mapped too
+
+
+async def _explain(query_builder) -> str:
+    '''
+    EXPLAINs a query against the app database, w/ seq + bitmap scans priced out so the planner picks between an index scan and an
+    index only scan. Skips only if there's no postgres to reach. Anything else (ex: tables not initialized) fails the test
+    '''
+    compiled_query = query_builder.compile(dialect=postgresql.dialect(), compile_kwargs={ 'literal_binds': True })
+    try:
+        sqlalchemy_engine_connect()
+    except ValueError as err:
+        pytest.skip(f'App database not configured: {err}')
+    try:
+        async with create_sqlalchemy_session() as session:
+            async with session.begin():
+                try:
+                    connection = await session.connection()
+                except (OSError, sa.exc.DBAPIError) as err:
+                    pytest.skip(f'App database unavailable (run w/ the cluster up + tables initialized): {err}')
+                if connection.dialect.name != 'postgresql':
+                    pytest.skip(f'App database is {connection.dialect.name}, not postgres')
+                await session.execute(sa.text('SET LOCAL enable_seqscan = off'))
+                await session.execute(sa.text('SET LOCAL enable_bitmapscan = off'))
+                query_plan = await session.execute(sa.text(f'EXPLAIN {compiled_query}'))
+                return '\n'.join(query_plan.scalars().all())
+    finally:
+        await sqlalchemy_engine_dispose()
+
+
+def test_member_ids_cohort_query_plan():
+    for cohort_range in [member_id_cohort_range(23), member_id_cohort_range(23, 'MX', 61), member_id_cohort_range(23, 'MX', 61, 1)]:
+        query_plan = asyncio.run(_explain(member_ids_cohort_query(cohort_range, after=cohort_range[0] + 10, limit=101)))
+        # --- tests: answered from the covering value_int index alone (w/o INCLUDE (value, created_at) this is a plain Index Scan)
+        assert 'Index Only Scan using member_id_value_int_idx' in query_plan, f'Cohort query is not an index only scan on value_int:\n{query_plan}'
+
+
+def test_member_ids_serialize():
+    created_at = datetime(2023, 5, 1, 12, 0, tzinfo=timezone.utc)
+    # --- tests: same shape as MemberID.serialize, whatever the cursor column is (id for pages, value_int for cohorts)
+    assert member_ids_serialize([(4021, '23-MX-61-01-2F0D', created_at)]) == [{ 'value': '23-MX-61-01-2F0D', 'created_at': '2023-05-01 12:00:00+00:00' }], 'Unexpected shape'
+    # --- tests: pages select plain columns (no MemberID entities), newest first
+    query_builder = member_ids_page_query(after=4021, limit=101)
+    assert [column['name'] for column in query_builder.column_descriptions] == ['id', 'value', 'created_at'], 'Unexpected columns'
+    assert 'ORDER BY member_id.id DESC' in str(query_builder), 'Expected newest first'
@@ -0,0 +1,47 @@
+from datetime import date
+
+from member_id.member_id_schemas import MemberCreate, member_create_parse, member_ids_validate_parse, members_parse
+
+
+def test_member_create_parse():
+    member = member_create_parse({ 'first_name': 'Jose', 'last_name': 'Vasconcelos', 'dob': '01/01/1961', 'country': 'MX' })
+    assert isinstance(member, MemberCreate), 'Expected a MemberCreate'
+    assert (member.first_name, member.last_name, member.country, member.date_of_birth) == ('Jose', 'Vasconcelos', 'MX', date(1961, 1, 1)), 'Fields not parsed'
+    assert not hasattr(member, '__dict__'), 'Expected a slots object'
+    # --- tests: invalid bodies raise w/ the endpoint's messages
+    for body, err_msg in [
+        ([], 'Expected a JSON object body'),
+        ({ 'last_name': 'V', 'dob': '01/01/1961', 'country': 'MX' }, "'first_name' is required"),
+        ({ 'first_name': 'J', 'last_name': 7, 'dob': '01/01/1961', 'country': 'MX' }, "'last_name' is required"),
+        ({ 'first_name': 'J', 'last_name': 'V', 'dob': '01/01/1961', 'country': 'ZZ' }, "'country' is required"),
+        ({ 'first_name': 'J', 'last_name': 'V', 'dob': 'whenever', 'country': 'MX' }, "'dob' is required (date of birth)"),
+    ]:
+        try:
+            member_create_parse(body)
+            assert False, f'Expected a failure for {body}'
+        except ValueError as err:
+            assert str(err) == err_msg, f'Unexpected error message: {err}'
+
+
+def test_members_parse():
+    members = members_parse({ 'members': [
+        { 'first_name': 'Jose', 'last_name': 'Vasconcelos', 'dob': '01/01/1961', 'country': 'MX' },
+        { 'first_name': '', 'last_name': 'Vasconcelos', 'dob': '01/01/1961', 'country': 'MX' },
+        'not a member',
+    ] })
+    # --- tests: per record results, invalid records don't fail the batch
+    assert isinstance(members[0], MemberCreate), 'Expected a MemberCreate'
+    assert members[1:] == ["'first_name' is required", 'Expected a member object'], 'Expected per record errors'
+    # --- tests: envelope errors raise
+    for body in [{}, { 'members': [] }, { 'members': [{}] * 3 }]:
+        try:
+            members_parse(body, max_records=2)
+            assert False, f'Expected a failure for {body}'
+        except ValueError:
+            pass
+
+
+def test_member_ids_validate_parse():
+    member_ids, clean_member_ids = member_ids_validate_parse({ 'member_ids': [' 23-mx-61-01-2f0d ', 7] })
+    assert member_ids == [' 23-mx-61-01-2f0d ', 7], 'Expected ids as sent'
+    assert clean_member_ids == ['23-MX-61-01-2F0D', ''], 'Expected cleaned ids'
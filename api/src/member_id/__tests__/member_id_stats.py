@@ -0,0 +1,13 @@
+from datetime import date, datetime, timedelta, timezone
+
+from member_id.member_id_stats import MEMBER_ID_STATS_DIMENSIONS, member_id_stats_buckets
+
+
+def test_member_id_stats_buckets():
+    buckets = member_id_stats_buckets('MX', date(1961, 1, 1), datetime(2023, 6, 1, 12, 0, tzinfo=timezone.utc))
+    assert buckets == [('country', 'MX'), ('registration_year', '2023'), ('birth_decade', '1960s')], 'Unexpected buckets'
+    # --- tests: one bucket per dimension, so every dimension sums to the member count
+    assert [dimension for dimension, _ in buckets] == list(MEMBER_ID_STATS_DIMENSIONS), 'Expected one bucket per dimension'
+    assert member_id_stats_buckets('MX', date(2000, 12, 31), datetime(2023, 1, 1, tzinfo=timezone.utc))[2] == ('birth_decade', '2000s'), 'Decade boundary off'
+    # --- tests: registration year is the UTC year (what the reconcile scan extracts), not the local one
+    assert member_id_stats_buckets('MX', date(1961, 1, 1), datetime(2023, 12, 31, 23, 30, tzinfo=timezone(timedelta(hours=-6))))[1] == ('registration_year', '2024'), 'Registration year should be UTC'
@@ -0,0 +1,38 @@
+import asyncio
+from datetime import date
+
+from dbs.database_sqlite import setup_sqlite_db_tables
+from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_engine_connect, sqlalchemy_engine_dispose
+from member_id.member_id_bulk import member_rows_insert
+from member_id.member_id_schemas import MemberCreate
+from member_id.member_id_suffix import MemberIDSuffixAllocator
+from member_id.member_id_utils import member_id_suffix_permute
+from user.user_models import User # so the MemberID -> User relationship resolves
+
+
+def test_member_id_suffix_allocator_skips_taken(tmp_path, monkeypatch):
+    monkeypatch.delenv('DATABASE_APP_URL', raising=False)
+    monkeypatch.setenv('DATABASE_APP_BACKEND', 'sqlite')
+    monkeypatch.setenv('DATABASE_APP_SQLITE_PATH', str(tmp_path / 'app.db'))
+    monkeypatch.setenv('MEMBER_ID_SUFFIX_KEY', 'test-key')
+    monkeypatch.setenv('MEMBER_ID_SUFFIX_BLOCK_SIZE', '4')
+    prefix = '23-CA-70-02'
+    suffixes_expected = [member_id_suffix_permute(counter, b'test-key', tweak=prefix) for counter in range(8)]
+    async def run():
+        sqlalchemy_engine_connect()
+        try:
+            async with create_sqlalchemy_session() as session:
+                async with session.begin():
+                    await setup_sqlite_db_tables(session)
+                # --- ids minted before the allocator, sitting on the suffixes of counters 1, 2 and 5 (the 2nd block)
+                async with session.begin():
+                    await member_rows_insert(session, [
+                        { 'member': MemberCreate('Ana', 'Ruiz', 'CA', date(1970, 2, 3)), 'member_id_value': f'{prefix}-{suffixes_expected[counter]:04X}' }
+                        for counter in (1, 2, 5)])
+            # --- tests: taken suffixes are skipped, across blocks, and nothing is handed out twice
+            allocator = MemberIDSuffixAllocator()
+            suffixes = await allocator.allocate_many(prefix, 3) + [await allocator.allocate(prefix) for _ in range(2)]
+            assert suffixes == [suffixes_expected[counter] for counter in (0, 3, 4, 6, 7)], 'Allocated a taken suffix'
+        finally:
+            await sqlalchemy_engine_dispose()
+    asyncio.run(run())
@@ -1,5 +1,5 @@
 import pytest
-from member_id.member_id_utils import member_id_clean, member_id_generate, is_member_id_valid
+from member_id.member_id_utils import MEMBER_ID_SUFFIX_SPACE, member_id_clean, member_id_generate, member_id_suffix_permute, is_member_id_valid, validate_many
 from utils.to_date import to_date
 
 
@@ -15,6 +15,7 @@ def test_member_id_generate():
         year=2023,
         country_code='MX',
         birth_date=to_date('01/01/1961'),
+        suffix=0,
     )
     assert len(test_member_id) == 16, 'Incorrect length'
     assert len(test_member_id.split('-')) == 5, 'Incorrect segments'
@@ -24,10 +25,34 @@ def test_member_id_generate():
             year=2023,
             country_code='MX',
             birth_date=to_date('13/12/5001'), # <-- will cause err throw
+            suffix=0,
         )
     except Exception as e:
         print(e)
         assert "Birth year cannot be in the future" in str(e), 'Error not thrown for bad data'
+    # --- tests: allocated suffix
+    test_member_id = member_id_generate(
+        year=2023,
+        country_code='MX',
+        birth_date=to_date('01/01/1961'),
+        suffix=0x2F0D,
+    )
+    assert test_member_id == '23-MX-61-01-2F0D', 'Suffix not formatted as 4 hex chars'
+
+
+def test_member_id_suffix_permute():
+    # --- tests: every counter maps to a distinct suffix (no collisions across the whole space)
+    suffixes = [member_id_suffix_permute(counter, b'test-key', tweak='23-MX-61-01') for counter in range(MEMBER_ID_SUFFIX_SPACE)]
+    assert len(set(suffixes)) == MEMBER_ID_SUFFIX_SPACE, 'Permutation produced a collision'
+    assert suffixes[:4] != [0, 1, 2, 3], 'Suffixes look sequential'
+    # --- tests: prefixes get their own ordering
+    assert member_id_suffix_permute(0, b'test-key', tweak='23-MX-61-02') != suffixes[0] or member_id_suffix_permute(1, b'test-key', tweak='23-MX-61-02') != suffixes[1], 'Tweak ignored'
+    # --- tests: fails
+    try:
+        member_id_suffix_permute(MEMBER_ID_SUFFIX_SPACE, b'test-key')
+        assert False, 'Error not thrown for out of range counter'
+    except ValueError as e:
+        assert 'out of range' in str(e)
 
 
 def test_is_member_id_valid():
@@ -55,3 +80,12 @@ def test_is_member_id_valid():
     is_valid, reason = is_member_id_valid('23-MX-61-01-!!!!')
     assert is_valid == False and '!!!!' in reason, 'Should fail because of special characters in final part'
 
+
+def test_validate_many():
+    # --- tests: same answers as one by one, in order
+    member_ids = ['23-MX-61-01-2F0D', '23-US-61-01-2F0D', '23-mx-61-12-2f0d', '23-MX-61-13-2F0D', 'XYZ123']
+    assert validate_many(member_ids) == [is_member_id_valid(member_id) for member_id in member_ids], 'Batch results differ from single'
+    assert [is_valid for is_valid, _ in validate_many(member_ids)] == [True, False, True, False, False], 'Incorrect batch results'
+    # --- tests: month range keeps its message
+    is_valid, reason = validate_many(['23-MX-61-13-2F0D'])[0]
+    assert is_valid == False and 'between 1-12' in reason, 'Should fail because of month out of range'
@@ -0,0 +1,151 @@
+from collections import Counter
+from datetime import datetime, timezone
+import sqlalchemy as sa
+from redis.exceptions import RedisError
+
+from dbs.sa_sessions import sqlalchemy_session_writer
+from member_id.member_id_codec import member_id_encode
+from member_id.member_id_filter import member_id_filter_add
+from member_id.member_id_models import MemberID
+from member_id.member_id_schemas import MEMBERS_MAX_RECORDS, MemberCreate
+from member_id.member_id_stats import member_id_stats_buckets, member_id_stats_increment
+from member_id.member_id_suffix import member_id_suffix_allocator
+from member_id.member_id_utils import member_id_prefix
+from user.user_models import User
+
+
+# Bulk Creation Thoughts:
+# - one multi-row insert for users + one for member ids per chunk, so round trips scale w/ chunks not rows
+# - each chunk is its own transaction. if a chunk fails (ex: a collision w/ a legacy random suffix), we retry its rows one by one so a single bad row doesn't fail its neighbors
+# - core inserts skip the ORM @validates hooks, which is fine since every record is validated up front (see member_id_schemas.py)
+# - callers that retry (jobs, imports) pass a checkpoint, which gets the ids of each chunk right before it commits. after a crash,
+#   member_ids_bulk_resume tells which of those made it in, so a retry skips them instead of creating the same members again
+
+BULK_CHUNK_SIZE = 500
+
+
+def _member_rows_prepare(members: list[MemberCreate or str]) -> tuple[list[dict], dict[int, dict]]:
+    '''
+    Forms member id prefixes for parsed members in one pass.
+    Output: Returns a tuple of (prepared rows, failures by member index)
+    '''
+    year = datetime.now().year
+    prepared, failures = [], {}
+    for index, member in enumerate(members):
+        if isinstance(member, str):
+            failures[index] = { 'status': 'failure', 'error': member }
+            continue
+        try:
+            prefix = member_id_prefix(year=year, country_code=member.country, birth_date=member.date_of_birth)
+        except Exception as err:
+            failures[index] = { 'status': 'failure', 'error': str(err) }
+            continue
+        prepared.append({ 'index': index, 'member': member, 'member_id_prefix': prefix })
+    return prepared, failures
+
+
+async def _member_rows_assign_ids(rows: list[dict], failures: dict[int, dict]) -> list[dict]:
+    '''
+    Allocates suffixes for all rows sharing a prefix at once, so a batch reserves counters w/ one query per prefix.
+    Output: Returns the rows that got a member id (rows whose prefix is exhausted are added to failures)
+    '''
+    rows_by_prefix = {}
+    for row in rows:
+        rows_by_prefix.setdefault(row['member_id_prefix'], []).append(row)
+    for prefix, prefix_rows in rows_by_prefix.items():
+        try:
+            suffixes = await member_id_suffix_allocator.allocate_many(prefix, len(prefix_rows))
+        except Exception as err:
+            for row in prefix_rows:
+                failures[row['index']] = { 'status': 'failure', 'error': str(err) }
+            continue
+        for row, suffix in zip(prefix_rows, suffixes):
+            row['member_id_value'] = f'{prefix}-{suffix:04X}'
+    return [row for row in rows if row['index'] not in failures]
+
+
+async def member_rows_insert(session, rows: list[dict]) -> None:
+    '''
+    Input: Takes a session + rows of { "member": MemberCreate, "member_id_value": str }
+    Output: Inserts users and their member ids w/ one multi-row insert each, and bumps stats counters. Expects to be run inside a transaction
+    '''
+    now = datetime.now(timezone.utc) # aware, so stats buckets + the db agree on the registration year (see member_id_stats.py)
+    user_values = [{
+        'first_name': row['member'].first_name,
+        'last_name': row['member'].last_name,
+        'date_of_birth': row['member'].date_of_birth,
+        'origin_country_code': row['member'].country,
+        'created_at': now,
+    } for row in rows]
+    if (await session.connection()).dialect.full_returning:
+        query_user_ids = await session.execute(sa.insert(User).values(user_values).returning(User.id))
+        user_ids = query_user_ids.scalars().all()
+    else:
+        # --- sqlite (sqlalchemy 1.4) can't compile RETURNING, so insert one by one + read back each generated id
+        user_ids = [(await session.execute(sa.insert(User).values(values))).inserted_primary_key[0] for values in user_values]
+    await session.execute(
+        sa.insert(MemberID).values([{
+            'value': row['member_id_value'],
+            'value_int': member_id_encode(row['member_id_value']),
+            'user_id': user_id,
+            'created_at': now,
+        } for row, user_id in zip(rows, user_ids)]))
+    await member_id_stats_increment(session, Counter(
+        bucket for row in rows for bucket in member_id_stats_buckets(row['member'].country, row['member'].date_of_birth, now)))
+
+
+async def member_ids_bulk_create(session, members: list[MemberCreate or str], chunk_size: int = BULK_CHUNK_SIZE, checkpoint=None) -> list[dict]:
+    '''
+    Input: Takes a session and parsed members (see members_parse, a MemberCreate or error message per record). Optionally a checkpoint,
+        an async fn called w/ (results so far by member index, ids about to be committed by member index) before each chunk commits,
+        and once w/ nothing pending at the end
+    Output: Returns a result per member, in request order. Ex: { "status": "success", "member_id": "..." } or { "status": "failure", "error": "..." }
+    '''
+    if len(members) > MEMBERS_MAX_RECORDS:
+        raise ValueError(f'Too many member records. Max is {MEMBERS_MAX_RECORDS}')
+    prepared, results = _member_rows_prepare(members)
+    prepared = await _member_rows_assign_ids(prepared, results)
+    sqlalchemy_session_writer(session)
+    # INSERT (chunked transactions)
+    for chunk_start in range(0, len(prepared), chunk_size):
+        chunk = prepared[chunk_start:chunk_start + chunk_size]
+        # --- mark the chunk registered before committing it (see member_id_filter.py). if redis can't record it either way, don't commit it
+        try:
+            await member_id_filter_add([row['member_id_value'] for row in chunk])
+        except RedisError as err:
+            for row in chunk:
+                results[row['index']] = { 'status': 'failure', 'error': f'Registered filter unavailable: {err}' }
+            continue
+        if checkpoint != None:
+            await checkpoint(results, { row['index']: row['member_id_value'] for row in chunk })
+        try:
+            async with session.begin():
+                await member_rows_insert(session, chunk)
+        except Exception:
+            # --- fall back to row by row, so we can report exactly which records failed
+            for row in chunk:
+                try:
+                    async with session.begin():
+                        await member_rows_insert(session, [row])
+                except Exception as err:
+                    results[row['index']] = { 'status': 'failure', 'error': str(getattr(err, 'orig', None) or err) }
+        for row in chunk:
+            if row['index'] not in results:
+                results[row['index']] = { 'status': 'success', 'member_id': row['member_id_value'] }
+    if checkpoint != None:
+        await checkpoint(results, {})
+    return [results[index] for index in range(len(members))]
+
+
+async def member_ids_bulk_resume(session, pending: dict) -> dict:
+    '''
+    Input: Takes the ids a checkpointed bulk create was about to commit when it was interrupted (any keys, ex: member index or line number)
+    Output: Returns success results for the ones that committed, by the same keys. The rest never made it in, so they can be created again
+    '''
+    if len(pending) == 0:
+        return {}
+    async with session.begin():
+        query_member_ids = await session.execute(
+            sa.select(MemberID.value).where(MemberID.value_int.in_([member_id_encode(value) for value in pending.values()])))
+        committed_member_id_values = set(query_member_ids.scalars().all())
+    return { key: { 'status': 'success', 'member_id': value } for key, value in pending.items() if value in committed_member_id_values }
@@ -0,0 +1,89 @@
+import re
+
+# Member ID Codec Thoughts:
+# - the 'YY-CC-BY-BM-XXXX' format is fully structured, so it packs losslessly into an integer. lookups + uniqueness go through
+#   a BIGINT column (8 bytes vs a 17 byte text, cheaper comparisons), and text is kept for display
+# - layout, high to low bits: year (7) | country index (8) | birth year (7) | birth month (4) | suffix (16). 42 bits total, so it's a positive BIGINT
+# - fields are ordered like the text, so every cohort ('YY', 'YY-CC', ... 'YY-CC-BY-BM') is a contiguous integer range
+# - country indexes are positions in a frozen tuple of codes (sorted, so integer order matches text order).
+#   it can only ever be appended to, otherwise stored integers would decode to the wrong country
+# - only ids w/ a hex suffix can be encoded. every allocated id has one, so a non-hex suffix is valid looking but can't be registered
+
+MEMBER_ID_SUFFIX_BITS = 16
+MEMBER_ID_BIRTH_MONTH_SHIFT = 16
+MEMBER_ID_BIRTH_YEAR_SHIFT = 20
+MEMBER_ID_COUNTRY_SHIFT = 27
+MEMBER_ID_YEAR_SHIFT = 35
+
+MEMBER_ID_COUNTRY_CODES_INDEXED = (
+    'AD', 'AE', 'AF', 'AG', 'AI', 'AL', 'AM', 'AN', 'AO', 'AQ', 'AR', 'AS', 'AT', 'AU', 'AW', 'AZ',
+    'BA', 'BB', 'BD', 'BE', 'BF', 'BG', 'BH', 'BI', 'BJ', 'BM', 'BN', 'BO', 'BR', 'BS', 'BT', 'BV',
+    'BW', 'BY', 'BZ', 'CA', 'CC', 'CD', 'CF', 'CG', 'CH', 'CI', 'CK', 'CL', 'CM', 'CN', 'CO', 'CR',
+    'CU', 'CV', 'CX', 'CY', 'CZ', 'DE', 'DJ', 'DK', 'DM', 'DO', 'DZ', 'EC', 'EE', 'EG', 'EH', 'ER',
+    'ES', 'ET', 'FI', 'FJ', 'FK', 'FM', 'FO', 'FR', 'GA', 'GB', 'GD', 'GE', 'GF', 'GH', 'GI', 'GL',
+    'GM', 'GN', 'GP', 'GQ', 'GR', 'GS', 'GT', 'GU', 'GW', 'GY', 'HK', 'HM', 'HN', 'HR', 'HT', 'HU',
+    'ID', 'IE', 'IL', 'IN', 'IO', 'IQ', 'IR', 'IS', 'IT', 'JM', 'JO', 'JP', 'KE', 'KG', 'KH', 'KI',
+    'KM', 'KN', 'KP', 'KR', 'KV', 'KW', 'KY', 'KZ', 'LA', 'LB', 'LC', 'LI', 'LK', 'LR', 'LS', 'LT',
+    'LU', 'LV', 'LY', 'MA', 'MC', 'MD', 'ME', 'MG', 'MH', 'MK', 'ML', 'MM', 'MN', 'MO', 'MP', 'MQ',
+    'MR', 'MS', 'MT', 'MU', 'MV', 'MW', 'MX', 'MY', 'MZ', 'NA', 'NC', 'NE', 'NF', 'NG', 'NI', 'NL',
+    'NO', 'NP', 'NR', 'NU', 'NZ', 'OM', 'PA', 'PE', 'PF', 'PG', 'PH', 'PK', 'PL', 'PM', 'PN', 'PR',
+    'PS', 'PT', 'PW', 'PY', 'QA', 'RE', 'RO', 'RS', 'RU', 'RW', 'SA', 'SB', 'SC', 'SD', 'SE', 'SG',
+    'SH', 'SI', 'SJ', 'SK', 'SL', 'SM', 'SN', 'SO', 'SR', 'ST', 'SV', 'SY', 'SZ', 'TC', 'TD', 'TF',
+    'TG', 'TH', 'TJ', 'TK', 'TM', 'TN', 'TO', 'TP', 'TR', 'TT', 'TV', 'TW', 'TZ', 'UA', 'UG', 'UM',
+    'US', 'UY', 'UZ', 'VA', 'VC', 'VE', 'VG', 'VI', 'VN', 'VU', 'WF', 'WS', 'YE', 'YT', 'ZA', 'ZM',
+    'ZW',
+)
+
+_MEMBER_ID_COUNTRY_INDEXES = { country_code: index for index, country_code in enumerate(MEMBER_ID_COUNTRY_CODES_INDEXED) }
+_MEMBER_ID_CODEC_PATTERN = re.compile(r'(\d{2})-([A-Za-z]{2})-(\d{2})-(0[1-9]|1[0-2])-([0-9A-Fa-f]{4})')
+
+
+def member_id_encode(member_id_str: str) -> int or None:
+    '''
+    Input: Takes a member id string. Ex: '23-MX-61-01-2F0D'
+    Output: Returns its packed integer, or None if it can't be encoded (invalid, or a non-hex suffix, so never registered)
+    '''
+    match = _MEMBER_ID_CODEC_PATTERN.fullmatch(member_id_str)
+    if match is None:
+        return None
+    country_index = _MEMBER_ID_COUNTRY_INDEXES.get(match.group(2).upper())
+    if country_index is None:
+        return None
+    return (
+        int(match.group(1)) << MEMBER_ID_YEAR_SHIFT
+        | country_index << MEMBER_ID_COUNTRY_SHIFT
+        | int(match.group(3)) << MEMBER_ID_BIRTH_YEAR_SHIFT
+        | int(match.group(4)) << MEMBER_ID_BIRTH_MONTH_SHIFT
+        | int(match.group(5), 16))
+
+
+def member_id_decode(member_id_int: int) -> str:
+    '''
+    Input: Takes a packed member id integer
+    Output: Returns the member id string (in its cleaned, upper case form)
+    '''
+    return '{:02}-{}-{:02}-{:02}-{:04X}'.format(
+        member_id_int >> MEMBER_ID_YEAR_SHIFT,
+        MEMBER_ID_COUNTRY_CODES_INDEXED[(member_id_int >> MEMBER_ID_COUNTRY_SHIFT) & 0xFF],
+        (member_id_int >> MEMBER_ID_BIRTH_YEAR_SHIFT) & 0x7F,
+        (member_id_int >> MEMBER_ID_BIRTH_MONTH_SHIFT) & 0xF,
+        member_id_int & 0xFFFF)
+
+
+def member_id_cohort_range(year: int, country_code: str = None, birth_year: int = None, birth_month: int = None) -> tuple[int, int]:
+    '''
+    Input: Takes the leading fields of a member id. They must form a prefix (year -> country -> birth year -> birth month)
+    Output: Returns the [start, end) range of packed ids in that cohort. Ex: 23 + 'MX' covers every '23-MX-..-..-....'
+    '''
+    fields = [(year, 'year'), (country_code, 'country'), (birth_year, 'birth_year'), (birth_month, 'birth_month')]
+    for (value, name), (next_value, next_name) in zip(fields, fields[1:]):
+        if value == None and next_value != None:
+            raise ValueError(f"'{next_name}' requires '{name}' (cohort filters go year -> country -> birth_year -> birth_month)")
+    start, shift = year << MEMBER_ID_YEAR_SHIFT, MEMBER_ID_YEAR_SHIFT
+    if country_code != None:
+        start, shift = start | _MEMBER_ID_COUNTRY_INDEXES[country_code] << MEMBER_ID_COUNTRY_SHIFT, MEMBER_ID_COUNTRY_SHIFT
+    if birth_year != None:
+        start, shift = start | birth_year << MEMBER_ID_BIRTH_YEAR_SHIFT, MEMBER_ID_BIRTH_YEAR_SHIFT
+    if birth_month != None:
+        start, shift = start | birth_month << MEMBER_ID_BIRTH_MONTH_SHIFT, MEMBER_ID_BIRTH_MONTH_SHIFT
+    return start, start + (1 << shift)
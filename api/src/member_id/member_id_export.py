@@ -0,0 +1,88 @@
+import csv
+import io
+import json as json_lib
+import time
+import zlib
+import sqlalchemy as sa
+
+from member_id.member_id_models import MemberID
+from user.user_models import User
+
+
+# Export Thoughts:
+# - audits want every member id joined w/ its user. rows come off a server-side cursor in chunks and are encoded + written per chunk,
+#   so memory stays flat no matter how big the table gets
+# - gzip is done on the fly w/ one compressobj per export (wbits=31 writes a gzip header/trailer, so output opens w/ any gunzip)
+# - the same stream feeds the http endpoint + the `start.py export` command, just w/ a different write()
+
+MEMBER_EXPORT_CHUNK_SIZE = 1000 # rows pulled off the cursor + encoded per write
+MEMBER_EXPORT_FORMATS = ('csv', 'ndjson')
+MEMBER_EXPORT_COLUMNS = ('member_id', 'member_id_created_at', 'first_name', 'last_name', 'date_of_birth', 'country', 'user_created_at')
+
+
+class MemberExportEncoder:
+    '''Encodes chunks of export rows as CSV or NDJSON bytes, optionally gzipped'''
+
+    def __init__(self, format: str = 'csv', gzip: bool = False):
+        if format not in MEMBER_EXPORT_FORMATS:
+            raise ValueError(f"'format' must be one of {', '.join(MEMBER_EXPORT_FORMATS)}")
+        self.format = format
+        self._compressor = zlib.compressobj(wbits=31) if gzip else None
+        self._wrote_header = False
+
+    def _encode_text(self, rows) -> str:
+        if self.format == 'ndjson':
+            return ''.join(json_lib.dumps(dict(zip(MEMBER_EXPORT_COLUMNS, row)), default=str) + '\n' for row in rows)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not self._wrote_header:
+            writer.writerow(MEMBER_EXPORT_COLUMNS)
+            self._wrote_header = True
+        writer.writerows(rows)
+        return buffer.getvalue()
+
+    def encode(self, rows) -> bytes:
+        data = self._encode_text(rows).encode()
+        return self._compressor.compress(data) if self._compressor != None else data
+
+    def finish(self) -> bytes:
+        '''Output: Returns whatever is left to write (the header for an empty csv, the gzip trailer)'''
+        data = self._encode_text([]).encode() if self.format == 'csv' and not self._wrote_header else b''
+        if self._compressor != None:
+            return self._compressor.compress(data) + self._compressor.flush()
+        return data
+
+
+def member_export_query():
+    '''Member ids joined w/ their users, as plain column tuples in MEMBER_EXPORT_COLUMNS order'''
+    return (sa.select(MemberID.value, MemberID.created_at, User.first_name, User.last_name, User.date_of_birth, User.origin_country_code, User.created_at)
+        .join(User, User.id == MemberID.user_id)
+        .order_by(MemberID.id))
+
+
+async def member_export_stream(session, write, format: str = 'csv', gzip: bool = False, chunk_size: int = MEMBER_EXPORT_CHUNK_SIZE) -> dict:
+    '''
+    Input: Takes a session (not in a transaction), an async write(bytes) callback, the format, and whether to gzip
+    Output: Streams every member through write() chunk by chunk, and returns throughput. Ex: { "rows": 120000, "bytes": ..., "seconds": 1.9, "rows_per_second": 63157 }
+    '''
+    encoder = MemberExportEncoder(format=format, gzip=gzip)
+    started = time.perf_counter()
+    row_count, byte_count = 0, 0
+    async with session.begin():
+        query_rows = await session.stream(member_export_query().execution_options(yield_per=chunk_size))
+        async for rows in query_rows.partitions():
+            data = encoder.encode(rows)
+            row_count, byte_count = row_count + len(rows), byte_count + len(data)
+            if len(data) > 0:
+                await write(data)
+    data = encoder.finish()
+    byte_count += len(data)
+    if len(data) > 0:
+        await write(data)
+    seconds = time.perf_counter() - started
+    return {
+        'rows': row_count,
+        'bytes': byte_count,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(row_count / seconds) if seconds > 0 else None,
+    }
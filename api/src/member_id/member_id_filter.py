@@ -0,0 +1,192 @@
+import hashlib
+import math
+import time
+import sqlalchemy as sa
+from redis.exceptions import RedisError
+
+from dbs.database_redis import Cacher
+import env
+from member_id.member_id_models import MemberID
+
+
+# Registered Filter Thoughts:
+# - most validations are for ids that were never registered, so a bloom filter over every member_id.value lets us skip the db on definite negatives
+# - the bit array lives in redis (one bitmap shared by every worker + node), so a create on any worker is seen by all
+# - a rebuild scans the table into memory, while creates also mark a 'building' bitmap. the two are OR'd together before swapping in,
+#   so ids created mid-rebuild aren't lost
+# - the live bitmap is OR'd in too. an id added just before the rebuild resets 'building' but committed after its scan snapshot is
+#   in neither the scan nor 'building', only in the live bits. adds only ever set bits, so the OR costs at most stale false positives
+# - if the filter isn't built (or redis is unhappy) we just say 'unknown' and callers hit the db like before. never a false negative
+# - creates add their ids *before* committing. a rolled back id only costs a false positive, while adding after commit leaves a window
+#   (forever, if the process dies in it) where a registered id reads as a definite negative
+# - bits are read/written w/ one BITFIELD per key per call, not a command per bit (the in-process fakeredis has no BITFIELD, so it gets per-bit commands)
+
+MEMBER_ID_FILTER_BITS_KEY = ['member_id_filter', 'bits']
+MEMBER_ID_FILTER_BUILDING_KEY = ['member_id_filter', 'building']
+MEMBER_ID_FILTER_META_KEY = ['member_id_filter', 'meta']
+MEMBER_ID_FILTER_SCAN_CHUNK_SIZE = 10000
+
+# --- per worker counters, for the observed false positive rate
+_filter_stats = { 'negatives': 0, 'positives': 0, 'false_positives': 0, 'unknowns': 0 }
+
+
+def member_id_filter_size(capacity: int, fp_rate: float) -> tuple[int, int]:
+    '''
+    Input: Takes the expected number of member ids and the target false positive rate
+    Output: Returns a tuple of (bits, hash count) for the filter
+    '''
+    bits = math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))
+    return bits, max(1, round(bits / capacity * math.log(2)))
+
+def member_id_filter_positions(member_id_value: str, bits: int, hash_count: int) -> list[int]:
+    '''Bit positions for a value (double hashing off one blake2b digest, so it's stable across processes)'''
+    digest = hashlib.blake2b(member_id_value.encode(), digest_size=16).digest()
+    h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(hash_count)]
+
+def member_id_filter_fp_rate(count: int, bits: int, hash_count: int) -> float:
+    '''Expected false positive rate once `count` values have been added'''
+    return (1 - math.exp(-hash_count * count / bits)) ** hash_count
+
+def _member_id_filter_params() -> tuple[int, int]:
+    return member_id_filter_size(env.env_get_member_id_filter_capacity(), env.env_get_member_id_filter_fp_rate())
+
+def _filter_bits_get(pipe, key: str, positions: list[int]):
+    '''Queues reads of every position. Results: one list from BITFIELD, or one int per position from GETBITs'''
+    if env.env_get_service_cache_in_process():
+        for position in positions:
+            pipe.getbit(key, position)
+        return
+    bitfield = pipe.bitfield(key)
+    for position in positions:
+        bitfield.get('u1', position)
+    bitfield.execute()
+
+def _filter_bits_set(pipe, key: str, positions: list[int]):
+    '''Queues setting every position to 1, as one BITFIELD (or per-bit SETBITs)'''
+    if env.env_get_service_cache_in_process():
+        for position in positions:
+            pipe.setbit(key, position, 1)
+        return
+    bitfield = pipe.bitfield(key)
+    for position in positions:
+        bitfield.set('u1', position, 1)
+    bitfield.execute()
+
+
+async def member_id_filter_might_contain(member_id_values: list[str]) -> list[bool or None]:
+    '''
+    Input: Takes a list of (cleaned, valid) member id values
+    Output: Returns per value: False if definitely not registered, True if maybe registered, None if the filter can't say
+    '''
+    if len(member_id_values) == 0:
+        return []
+    bits, hash_count = _member_id_filter_params()
+    positions = [position for member_id_value in member_id_values for position in member_id_filter_positions(member_id_value, bits, hash_count)]
+    cacher = Cacher()
+    try:
+        async with cacher.client.pipeline(transaction=False) as pipe:
+            pipe.hget(cacher.namespace_key(MEMBER_ID_FILTER_META_KEY), 'bits')
+            pipe.exists(cacher.namespace_key(MEMBER_ID_FILTER_BITS_KEY))
+            _filter_bits_get(pipe, cacher.namespace_key(MEMBER_ID_FILTER_BITS_KEY), positions)
+            built_bits, bits_exist, *bit_values = await pipe.execute()
+        if len(bit_values) == 1 and isinstance(bit_values[0], list):
+            bit_values = bit_values[0]
+    except RedisError:
+        built_bits, bits_exist = None, 0
+    # --- not built (or built w/ different sizing), can't rule anything out
+    if built_bits == None or int(built_bits) != bits or bits_exist == 0:
+        _filter_stats['unknowns'] += len(member_id_values)
+        return [None] * len(member_id_values)
+    results = [all(bit_values[index * hash_count:(index + 1) * hash_count]) for index in range(len(member_id_values))]
+    _filter_stats['positives'] += sum(results)
+    _filter_stats['negatives'] += len(results) - sum(results)
+    return results
+
+def member_id_filter_record_false_positives(count: int):
+    '''Callers report filter positives the db said weren't registered'''
+    _filter_stats['false_positives'] += count
+
+
+async def member_id_filter_add(member_id_values: list[str]):
+    '''
+    Marks member ids about to be created (live bitmap + the one a rebuild may be assembling). Call *before* committing them.
+    If the add fails the filter is taken offline (unbuilt) instead. Raises only if neither worked, so the caller doesn't commit ids the filter would deny
+    '''
+    if len(member_id_values) == 0:
+        return
+    bits, hash_count = _member_id_filter_params()
+    positions = [position for member_id_value in member_id_values for position in member_id_filter_positions(member_id_value, bits, hash_count)]
+    cacher = Cacher()
+    try:
+        async with cacher.client.pipeline(transaction=False) as pipe:
+            _filter_bits_set(pipe, cacher.namespace_key(MEMBER_ID_FILTER_BITS_KEY), positions)
+            _filter_bits_set(pipe, cacher.namespace_key(MEMBER_ID_FILTER_BUILDING_KEY), positions)
+            pipe.hincrby(cacher.namespace_key(MEMBER_ID_FILTER_META_KEY), 'count', len(member_id_values))
+            await pipe.execute()
+    except RedisError:
+        # --- a missed add would be a false negative, so take the filter offline until it's rebuilt
+        await cacher.client.delete(cacher.namespace_key(MEMBER_ID_FILTER_META_KEY))
+
+
+async def member_id_filter_rebuild(session) -> dict:
+    '''
+    Input: Takes a session
+    Output: Rebuilds the filter from a streaming scan of member_id.value, swaps it in, and returns its stats
+    '''
+    bits, hash_count = _member_id_filter_params()
+    cacher = Cacher()
+    bits_key, building_key = cacher.namespace_key(MEMBER_ID_FILTER_BITS_KEY), cacher.namespace_key(MEMBER_ID_FILTER_BUILDING_KEY)
+    staged_key = cacher.namespace_key(['member_id_filter', 'staged'])
+    started_at = time.time()
+    # --- creates from here on also land in the building bitmap (pre-sized, so the OR below always lines up)
+    async with cacher.client.pipeline(transaction=True) as pipe:
+        pipe.delete(building_key)
+        pipe.setbit(building_key, bits - 1, 0)
+        await pipe.execute()
+    bit_array = bytearray((bits + 7) // 8)
+    count = 0
+    async with session.begin():
+        query_member_id_values = await session.stream(
+            sa.select(MemberID.value).execution_options(yield_per=MEMBER_ID_FILTER_SCAN_CHUNK_SIZE))
+        async for member_id_values in query_member_id_values.scalars().partitions():
+            for member_id_value in member_id_values:
+                for position in member_id_filter_positions(member_id_value, bits, hash_count):
+                    bit_array[position >> 3] |= 0x80 >> (position & 7) # redis bitmaps are big-endian per byte
+            count += len(member_id_values)
+    # --- swap in (w/ anything created while we were scanning, or added before it but committed after the scan's snapshot)
+    await cacher.client.set(staged_key, bytes(bit_array))
+    async with cacher.client.pipeline(transaction=True) as pipe:
+        pipe.bitop('OR', staged_key, staged_key, building_key, bits_key)
+        pipe.rename(staged_key, bits_key)
+        pipe.delete(cacher.namespace_key(MEMBER_ID_FILTER_META_KEY))
+        pipe.hset(cacher.namespace_key(MEMBER_ID_FILTER_META_KEY), mapping={
+            'bits': bits,
+            'hash_count': hash_count,
+            'count': count,
+            'built_at': started_at,
+            'build_seconds': time.time() - started_at,
+        })
+        await pipe.execute()
+    return await member_id_filter_stats()
+
+
+async def member_id_filter_stats() -> dict:
+    '''Filter sizing, expected false positive rate for its current fill, and this worker's observed rate'''
+    cacher = Cacher()
+    meta = await cacher.get_hash(MEMBER_ID_FILTER_META_KEY) or {}
+    bits, hash_count = _member_id_filter_params()
+    count = int(meta.get(b'count', 0))
+    is_built = meta.get(b'bits') != None and int(meta[b'bits']) == bits
+    non_members_seen = _filter_stats['negatives'] + _filter_stats['false_positives']
+    return {
+        'is_built': is_built,
+        'built_at': float(meta[b'built_at']) if b'built_at' in meta else None,
+        'bits': bits,
+        'hash_count': hash_count,
+        'count': count,
+        'capacity': env.env_get_member_id_filter_capacity(),
+        'expected_fp_rate': member_id_filter_fp_rate(count, bits, hash_count),
+        'observed_fp_rate': _filter_stats['false_positives'] / non_members_seen if non_members_seen > 0 else None,
+        'lookups': dict(_filter_stats),
+    }
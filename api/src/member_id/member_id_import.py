@@ -0,0 +1,206 @@
+import csv
+import gzip
+import hashlib
+import json as json_lib
+import os
+import re
+import time
+import uuid
+
+from dbs.database_redis import Cacher
+import env
+from member_id.member_id_bulk import member_ids_bulk_create, member_ids_bulk_resume
+from member_id.member_id_schemas import MEMBERS_MAX_RECORDS, member_create_try_parse
+
+
+# Import Thoughts:
+# - legacy rosters are hundreds of thousands of rows, so the body is parsed line by line as it streams in and committed in chunks.
+#   the next bytes aren't read until the current chunk is committed (backpressure), so the file is never fully in memory
+# - rows go through the same parsing + bulk insert as POST /v1/member_ids/bulk (validation, suffix allocation, stats, filter)
+# - after each chunk commits, the last committed line is checkpointed in redis under the import id. re-sending the same file w/ the
+#   same import id skips what's already in. right before a chunk commits, its ids are checkpointed too, so a resume after a crash
+#   mid-commit skips the rows of that chunk that made it in rather than inserting them again
+# - rows that fail are appended to an error report (csv of line, error, raw row), which also survives resumes. it's downloaded by import id
+#   (see member_import_errors_url), never by its path on the host. a line that isn't valid UTF-8 is one failed row, not a failed import
+# - csv needs a header w/ first_name,last_name,dob,country and one row per line (no newlines inside quoted fields). ndjson is one object per line
+
+MEMBER_IMPORT_CHUNK_SIZE = 500
+MEMBER_IMPORT_FORMATS = ('csv', 'ndjson')
+MEMBER_IMPORT_CSV_COLUMNS = ('first_name', 'last_name', 'dob', 'country')
+MEMBER_IMPORT_CHECKPOINT_TTL_SECONDS = 60 * 60 * 24 * 7
+
+_IMPORT_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+def _checkpoint_key(import_id: str) -> list[str]:
+    return ['member_import', import_id]
+
+
+def member_import_id_parse(import_id: str or None) -> str:
+    '''Output: Returns the import id to checkpoint under (a new one if none was given). Ids end up in file names, so they're kept to [A-Za-z0-9_-]'''
+    if import_id == None or import_id == '':
+        return uuid.uuid4().hex
+    if _IMPORT_ID_PATTERN.fullmatch(import_id) == None:
+        raise ValueError("'import_id' must be 1-64 letters, numbers, dashes, or underscores")
+    return import_id
+
+
+def member_import_errors_path(import_id: str) -> str:
+    '''Where an import's per row error report goes (see MEMBER_IMPORT_ERRORS_DIR)'''
+    errors_dir = env.env_get_member_import_errors_dir()
+    os.makedirs(errors_dir, exist_ok=True)
+    return os.path.join(errors_dir, f'{import_id}.errors.csv')
+
+
+def member_import_errors_url(import_id: str) -> str:
+    '''Where clients download an import's error report (served from the api host's MEMBER_IMPORT_ERRORS_DIR)'''
+    return f'/v1/member_ids/import/{import_id}/errors'
+
+
+async def member_import_checkpoint_get(import_id: str) -> dict:
+    '''
+    Output: Returns where an import left off, and the ids of a chunk that was mid-commit by line (if it was interrupted then)
+        Ex: { "line": 1501, "rows": 1500, "created": 1497, "failed": 3, "pending": { 1502: "23-MX-61-01-2F0D", ... } } (zeros if it never ran)
+    '''
+    checkpoint_hash = await Cacher().get_hash(_checkpoint_key(import_id))
+    if checkpoint_hash == None:
+        return { 'line': 0, 'rows': 0, 'created': 0, 'failed': 0, 'pending': {} }
+    checkpoint = { key.decode(): int(value) for key, value in checkpoint_hash.items() if key != b'pending' }
+    checkpoint['pending'] = { int(line): value for line, value in json_lib.loads(checkpoint_hash.get(b'pending', b'{}')).items() }
+    return checkpoint
+
+
+def member_import_file_format(file_path: str) -> str:
+    '''Output: Returns the format a roster file's name implies ('csv' if it has .csv in it, otherwise 'ndjson')'''
+    return 'csv' if '.csv' in os.path.basename(file_path) else 'ndjson'
+
+
+def member_import_file_id(file_path: str) -> str:
+    '''Output: Returns an import id derived from a file's path/size/mtime, so re-running the same file resumes its checkpoint'''
+    return hashlib.blake2b(f'{file_path}:{os.path.getsize(file_path)}:{os.path.getmtime(file_path)}'.encode(), digest_size=8).hexdigest()
+
+
+async def member_import_file_chunks(file_path: str):
+    '''Yields a roster file's bytes in 64KiB chunks (decompressed if it ends in .gz)'''
+    with (gzip.open if file_path.endswith('.gz') else open)(file_path, 'rb') as file:
+        while chunk := file.read(64 * 1024):
+            yield chunk
+
+
+def _member_import_line_decode(line: bytes, line_number: int) -> tuple[str, bool]:
+    '''Output: Returns (text, is valid UTF-8). Invalid bytes are replaced, so the row can still go in the error report'''
+    encoding = 'utf-8-sig' if line_number == 1 else 'utf-8'
+    try:
+        return line.decode(encoding).rstrip('\r'), True
+    except UnicodeDecodeError:
+        return line.decode(encoding, errors='replace').rstrip('\r'), False
+
+
+async def _member_import_lines(chunks):
+    '''Splits a stream of byte chunks into (line number, text, is valid UTF-8) tuples, only holding onto a partial last line between chunks'''
+    pending, line_number = b'', 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            line_number += 1
+            yield line_number, *_member_import_line_decode(line, line_number)
+    if pending.strip() != b'':
+        yield line_number + 1, *_member_import_line_decode(pending, line_number + 1)
+
+
+async def member_import_records(chunks, format: str = 'csv'):
+    '''
+    Input: Takes an async iterable of byte chunks and the format ('csv' or 'ndjson')
+    Output: Yields (line number, record dict or error message, raw line) per non-empty row. Raises a ValueError if a csv header is missing columns
+    '''
+    if format not in MEMBER_IMPORT_FORMATS:
+        raise ValueError(f"'format' must be one of {', '.join(MEMBER_IMPORT_FORMATS)}")
+    header = None
+    async for line_number, line, is_valid_utf8 in _member_import_lines(chunks):
+        if line.strip() == '':
+            continue
+        if not is_valid_utf8 and (format == 'ndjson' or header != None):
+            yield line_number, 'Invalid UTF-8', line
+            continue
+        if format == 'ndjson':
+            try:
+                yield line_number, json_lib.loads(line), line
+            except ValueError:
+                yield line_number, 'Invalid JSON', line
+            continue
+        values = next(csv.reader([line]))
+        if header == None:
+            header = [column.strip() for column in values]
+            missing_columns = [column for column in MEMBER_IMPORT_CSV_COLUMNS if column not in header]
+            if len(missing_columns) > 0:
+                raise ValueError(f'CSV header is missing columns: {", ".join(missing_columns)}')
+            continue
+        yield line_number, dict(zip(header, values)), line
+
+
+async def member_import_stream(session, chunks, format: str = 'csv', import_id: str = None, chunk_size: int = MEMBER_IMPORT_CHUNK_SIZE, errors_path: str = None) -> dict:
+    '''
+    Input: Takes a session (not in a transaction), an async iterable of byte chunks, the format, an import id to checkpoint under
+        (resumes from its checkpoint if it has one), rows per commit, and a file to append per row errors to
+    Output: Returns a summary. Ex: { "import_id": "...", "resumed_from_line": 0, "rows": 1500, "created": 1497, "failed": 3, "rows_per_second": 2210, ... }
+    '''
+    if chunk_size < 1 or chunk_size > MEMBERS_MAX_RECORDS:
+        raise ValueError(f"'chunk_size' must be between 1-{MEMBERS_MAX_RECORDS}")
+    checkpoint = await member_import_checkpoint_get(import_id) if import_id != None else { 'line': 0, 'rows': 0, 'created': 0, 'failed': 0, 'pending': {} }
+    resumed_from_line = checkpoint['line']
+    # --- a chunk was mid-commit when the last run died: its rows that made it in are skipped (and counted) below, the rest are redone
+    committed_lines = set(await member_ids_bulk_resume(session, checkpoint.pop('pending')))
+    started, rows_this_run = time.perf_counter(), 0
+    errors_file = open(errors_path, 'a', newline='') if errors_path != None else None
+    errors_writer = csv.writer(errors_file) if errors_file != None else None
+    batch = []
+
+    async def checkpoint_pending(results: dict, pending: dict):
+        if import_id != None and len(pending) > 0:
+            await Cacher().set_hash(_checkpoint_key(import_id), {
+                **checkpoint,
+                'pending': json_lib.dumps({ batch[index][0]: member_id_value for index, member_id_value in pending.items() }),
+            }, ex=MEMBER_IMPORT_CHECKPOINT_TTL_SECONDS)
+
+    async def commit_batch():
+        # --- same path as bulk creates, w/ one transaction for the whole batch (falls back to row by row if it fails)
+        results = await member_ids_bulk_create(session, [member for _, member, _ in batch], chunk_size=len(batch), checkpoint=checkpoint_pending)
+        for (line_number, _, raw_line), result in zip(batch, results):
+            if result['status'] == 'success':
+                checkpoint['created'] += 1
+            else:
+                checkpoint['failed'] += 1
+                if errors_writer != None:
+                    errors_writer.writerow([line_number, result['error'], raw_line])
+        if errors_file != None:
+            errors_file.flush()
+        checkpoint['line'], checkpoint['rows'] = batch[-1][0], checkpoint['rows'] + len(batch)
+        if import_id != None:
+            await Cacher().set_hash(_checkpoint_key(import_id), checkpoint, ex=MEMBER_IMPORT_CHECKPOINT_TTL_SECONDS)
+        batch.clear()
+
+    try:
+        async for line_number, record, raw_line in member_import_records(chunks, format=format):
+            if line_number <= resumed_from_line:
+                continue
+            if line_number in committed_lines:
+                checkpoint['rows'], checkpoint['created'] = checkpoint['rows'] + 1, checkpoint['created'] + 1
+                continue
+            batch.append((line_number, record if isinstance(record, str) else member_create_try_parse(record), raw_line))
+            rows_this_run += 1
+            if len(batch) >= chunk_size:
+                await commit_batch()
+        if len(batch) > 0:
+            await commit_batch()
+    finally:
+        if errors_file != None:
+            errors_file.close()
+    seconds = time.perf_counter() - started
+    return {
+        'import_id': import_id,
+        'resumed_from_line': resumed_from_line,
+        **checkpoint,
+        'rows_this_run': rows_this_run,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows_this_run / seconds) if seconds > 0 else None,
+    }
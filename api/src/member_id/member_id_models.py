@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, Text
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, Text
 from sqlalchemy.orm import relationship
 from dbs.sa_models import BaseModel
 
@@ -6,6 +6,7 @@ from dbs.sa_models import BaseModel
 # - thought about making a separate 'Identification Number' table, but it'll be convenient to do look up here for now
 # - make unique check required to throw err
 # - this is likely over kill, but creating a whole member, so it can throw an error if the member id is already taken
+# - uniqueness + lookups go through value_int (the packed id, see member_id_codec.py). value is kept for display
 
 
 class MemberID(BaseModel):
@@ -13,7 +14,8 @@ class MemberID(BaseModel):
 
     # --- fields
     id = Column(Integer(), primary_key=True)
-    value = Column(Text(), unique=True)
+    value = Column(Text())
+    value_int = Column(BigInteger(), unique=True)
     created_at = Column(DateTime(timezone=True))
 
     # --- relations
@@ -0,0 +1,72 @@
+import sqlalchemy as sa
+
+from member_id.member_id_codec import member_id_encode
+from member_id.member_id_filter import member_id_filter_might_contain, member_id_filter_record_false_positives
+from member_id.member_id_models import MemberID
+
+
+async def member_ids_find_registered(session, member_id_values: list[str]) -> set[str]:
+    '''
+    Input: Takes a session and a list of (cleaned) member id values
+    Output: Returns the subset of values that are registered. Values that can't be encoded + definite negatives from the
+        registered filter skip the db, everything else is resolved w/ a single IN query on the packed value_int index
+    '''
+    member_id_ints = { value: member_id_encode(value) for value in set(member_id_values) }
+    member_id_values = [value for value, value_int in member_id_ints.items() if value_int != None]
+    if len(member_id_values) == 0:
+        return set()
+    might_contain = await member_id_filter_might_contain(member_id_values)
+    maybe_member_id_values = [value for value, maybe in zip(member_id_values, might_contain) if maybe != False]
+    if len(maybe_member_id_values) == 0:
+        return set()
+    async with session.begin():
+        # --- only selects value_int, so it can be answered from the unique index alone
+        query_member_id_ints = await session.execute(
+            sa.select(MemberID.value_int).where(MemberID.value_int.in_([member_id_ints[value] for value in maybe_member_id_values])))
+        registered_member_id_ints = set(query_member_id_ints.scalars().all())
+    registered_member_id_values = { value for value in maybe_member_id_values if member_id_ints[value] in registered_member_id_ints }
+    member_id_filter_record_false_positives(sum(1 for value, maybe in zip(member_id_values, might_contain)
+        if maybe == True and value not in registered_member_id_values))
+    return registered_member_id_values
+
+
+# Read Path Thoughts:
+# - listings select plain column tuples, never MemberID instances, so there's no identity map/relationship bookkeeping per row
+# - every listing query returns (cursor, value, created_at) rows, so one formatter (member_ids_serialize) shapes them all in a single pass
+
+def member_ids_page_query(after: int = None, limit: int = None):
+    '''
+    Input: Takes optionally the last id seen + a limit
+    Output: Returns a query for (id, value, created_at) rows, newest first
+    '''
+    query_builder = sa.select(MemberID.id, MemberID.value, MemberID.created_at).order_by(sa.desc(MemberID.id))
+    if after != None:
+        query_builder = query_builder.where(MemberID.id < after)
+    if limit != None:
+        query_builder = query_builder.limit(limit)
+    return query_builder
+
+
+def member_ids_serialize(rows) -> list[dict]:
+    '''
+    Input: Takes (cursor, value, created_at) rows from a listing query
+    Output: Returns them in the API shape (same as MemberID.serialize). Ex: [{ "value": "23-MX-61-01-2F0D", "created_at": "2023-05-01 12:00:00+00:00" }]
+    '''
+    return [{ 'value': value, 'created_at': str(created_at) } for _, value, created_at in rows]
+
+
+def member_ids_cohort_query(cohort_range: tuple[int, int], after: int = None, limit: int = None):
+    '''
+    Input: Takes a cohort's [start, end) range of packed ids (see member_id_cohort_range), and optionally the last value_int seen + a limit
+    Output: Returns a query for that cohort's (value_int, value, created_at) rows in member id order. Those are exactly the columns
+        the covering value_int index holds, so it's an index only range scan
+    '''
+    cohort_start, cohort_end = cohort_range
+    query_builder = (sa.select(MemberID.value_int, MemberID.value, MemberID.created_at)
+        .where(MemberID.value_int >= cohort_start, MemberID.value_int < cohort_end)
+        .order_by(MemberID.value_int))
+    if after != None:
+        query_builder = query_builder.where(MemberID.value_int > after)
+    if limit != None:
+        query_builder = query_builder.limit(limit)
+    return query_builder
@@ -0,0 +1,130 @@
+from datetime import date
+
+from geo.country_codes import country_codes_and_names
+from member_id.member_id_codec import member_id_cohort_range
+from member_id.member_id_utils import member_id_clean
+from utils.to_date import to_date
+
+# Request Schema Thoughts:
+# - each body is decoded + validated exactly once, up front, into a typed object. handlers never touch request.json after that
+# - bad payloads are rejected before a db session (or the suffix allocator) is touched
+# - __slots__ keeps the per-item cost down on bulk bodies (no instance dict), and typos in attribute names fail loudly
+# - error messages match the ones endpoints have always returned
+
+MEMBERS_MAX_RECORDS = 10000
+MEMBER_IDS_VALIDATE_MAX = 5000 # keeps the IN query well under driver bind param limits
+
+_COUNTRY_CODES = frozenset(country_codes_and_names)
+
+
+class MemberCreate:
+    '''A validated member record (same shape as the POST /v1/member_id body)'''
+    __slots__ = ('first_name', 'last_name', 'country', 'date_of_birth')
+
+    def __init__(self, first_name: str, last_name: str, country: str, date_of_birth: date):
+        self.first_name = first_name
+        self.last_name = last_name
+        self.country = country
+        self.date_of_birth = date_of_birth
+
+
+def _body_object(body) -> dict:
+    if not isinstance(body, dict):
+        raise ValueError('Expected a JSON object body')
+    return body
+
+
+def member_create_try_parse(record) -> MemberCreate or str:
+    '''
+    Input: Takes a member record (ex: { "first_name": "Jose", "last_name": "Vasconcelos", "dob": "01/01/1961", "country": "MX" })
+    Output: Returns a MemberCreate, or an error message if the record is invalid
+    '''
+    if not isinstance(record, dict):
+        return 'Expected a member object'
+    first_name = record.get('first_name')
+    if not isinstance(first_name, str) or first_name == '':
+        return "'first_name' is required"
+    last_name = record.get('last_name')
+    if not isinstance(last_name, str) or last_name == '':
+        return "'last_name' is required"
+    country = record.get('country')
+    if not isinstance(country, str) or country not in _COUNTRY_CODES:
+        return "'country' is required"
+    try:
+        date_of_birth = to_date(record.get('dob'))
+    except (ValueError, OverflowError, TypeError):
+        return "'dob' is required (date of birth)"
+    return MemberCreate(first_name, last_name, country, date_of_birth)
+
+
+def member_create_parse(body) -> MemberCreate:
+    '''Parses a POST /v1/member_id body. Raises a ValueError if it's invalid'''
+    member = member_create_try_parse(_body_object(body))
+    if isinstance(member, str):
+        raise ValueError(member)
+    return member
+
+
+def members_parse(body, max_records: int = MEMBERS_MAX_RECORDS) -> list[MemberCreate or str]:
+    '''
+    Input: Takes a bulk body (ex: { "members": [...] }). Raises a ValueError if the envelope itself is invalid
+    Output: Returns a MemberCreate or an error message per record, in request order
+    '''
+    members = _body_object(body).get('members')
+    if not isinstance(members, list) or len(members) == 0:
+        raise ValueError("'members' is required (non-empty list)")
+    if len(members) > max_records:
+        raise ValueError(f'Too many member records. Max is {max_records}')
+    return [member_create_try_parse(record) for record in members]
+
+
+def member_id_validate_parse(body) -> str:
+    '''Parses a POST /v1/member_id/validate body. Output: Returns the cleaned member id'''
+    member_id = _body_object(body).get('member_id')
+    if not isinstance(member_id, str) or member_id == '':
+        raise ValueError("'member_id' is required")
+    return member_id_clean(member_id)
+
+
+def member_ids_validate_parse(body, max_member_ids: int = MEMBER_IDS_VALIDATE_MAX) -> tuple[list, list[str]]:
+    '''
+    Parses a POST /v1/member_ids/validate body
+    Output: Returns a tuple of (member ids as sent, cleaned member ids). Non-string ids clean to ''
+    '''
+    member_ids = _body_object(body).get('member_ids')
+    if not isinstance(member_ids, list) or len(member_ids) == 0:
+        raise ValueError("'member_ids' is required (non-empty list)")
+    if len(member_ids) > max_member_ids:
+        raise ValueError(f"Too many 'member_ids'. Max is {max_member_ids}")
+    return member_ids, [member_id_clean(member_id) if isinstance(member_id, str) else '' for member_id in member_ids]
+
+
+def _cohort_year_arg(args, name: str) -> int or None:
+    value = args.get(name)
+    if value == None or value == '':
+        return None
+    if not value.isdigit() or len(value) not in (2, 4):
+        raise ValueError(f"'{name}' must be a 2 or 4 digit year")
+    return int(value) % 100
+
+
+def member_id_cohort_parse(args) -> tuple[int, int] or None:
+    '''
+    Parses cohort filters off GET /v1/member_ids args (ex: ?year=23&country=MX&birth_year=61)
+    Output: Returns the [start, end) range of packed member ids, or None if no filters were given
+    '''
+    year = _cohort_year_arg(args, 'year')
+    birth_year = _cohort_year_arg(args, 'birth_year')
+    birth_month = args.get('birth_month') or None
+    if birth_month != None:
+        if not birth_month.isdigit() or not (1 <= int(birth_month) <= 12):
+            raise ValueError("'birth_month' must be a month (1-12)")
+        birth_month = int(birth_month)
+    country_code = args.get('country') or None
+    if country_code != None:
+        country_code = country_code.upper()
+        if country_code not in _COUNTRY_CODES:
+            raise ValueError("'country' must be a country code")
+    if year == None and country_code == None and birth_year == None and birth_month == None:
+        return None
+    return member_id_cohort_range(year, country_code, birth_year, birth_month)
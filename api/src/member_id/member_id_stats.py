@@ -0,0 +1,109 @@
+from collections import Counter
+from datetime import date, datetime, timezone
+import random
+import sqlalchemy as sa
+
+from dbs.sa_sessions import sqlalchemy_session_writer
+from member_id.member_id_models import MemberID
+from user.user_models import User
+
+
+# Stats Thoughts:
+# - dashboards poll counts per country, registration year, and birth decade. a GROUP BY over member_id + user per poll won't scale,
+#   so counters in "member_id_stats" are bumped in the same transaction that inserts members (counts can't drift from rows on commit/rollback)
+# - every create would otherwise update the same hot rows (ex: this year's bucket), so each transaction picks one of a few shards
+#   and reads sum them. increments are applied in key order so concurrent transactions can't deadlock
+# - `python src/start.py stats-reconcile` recomputes everything w/ a full scan and reports (or w/ --repair, fixes) any drift
+# - registration years are UTC on both sides (increments + the reconcile scan), so a create around New Year can't land in different years
+
+MEMBER_ID_STATS_SHARDS = 8
+MEMBER_ID_STATS_DIMENSIONS = ('country', 'registration_year', 'birth_decade')
+
+
+def member_id_stats_buckets(country_code: str, date_of_birth: date, created_at: datetime) -> list[tuple[str, str]]:
+    '''
+    Input: Takes a member's country, birth date, and (timezone aware) created_at
+    Output: Returns the (dimension, bucket) pairs a member counts towards. Ex: [('country', 'MX'), ('registration_year', '2023'), ('birth_decade', '1960s')]
+    '''
+    return [
+        ('country', country_code),
+        ('registration_year', str(created_at.astimezone(timezone.utc).year)),
+        ('birth_decade', f'{date_of_birth.year // 10 * 10}s'),
+    ]
+
+
+async def member_id_stats_increment(session, bucket_counts: Counter):
+    '''
+    Input: Takes a session and a Counter of (dimension, bucket) -> count to add. Expects to be run inside the inserting transaction
+    '''
+    if len(bucket_counts) == 0:
+        return
+    shard = random.randrange(MEMBER_ID_STATS_SHARDS)
+    await session.execute(sa.text('''
+        INSERT INTO "member_id_stats" (dimension, bucket, shard, count) VALUES (:dimension, :bucket, :shard, :count)
+        ON CONFLICT (dimension, bucket, shard) DO UPDATE SET count = "member_id_stats".count + :count;
+    '''), [{ 'dimension': dimension, 'bucket': bucket, 'shard': shard, 'count': count } for (dimension, bucket), count in sorted(bucket_counts.items())])
+
+
+def _member_id_stats_shape(bucket_counts: dict) -> dict:
+    stats = { dimension: {} for dimension in MEMBER_ID_STATS_DIMENSIONS }
+    for (dimension, bucket), count in sorted(bucket_counts.items()):
+        if count != 0:
+            stats.setdefault(dimension, {})[bucket] = count
+    stats['total'] = sum(stats['country'].values())
+    return stats
+
+
+async def _member_id_stats_counted(session) -> Counter:
+    query_stats = await session.execute(sa.text('''
+        SELECT dimension, bucket, SUM(count) FROM "member_id_stats" GROUP BY dimension, bucket;
+    '''))
+    return Counter({ (dimension, bucket): int(count) for dimension, bucket, count in query_stats.all() })
+
+
+async def _member_id_stats_recomputed(session) -> Counter:
+    '''Full scan (GROUP BY over member_id + user), what the counters should add up to'''
+    # --- UTC year like member_id_stats_buckets. postgres extracts in the session's time zone otherwise, sqlite stores the UTC wall time as is
+    if (await session.connection()).dialect.name == 'postgresql':
+        registration_year = sa.extract('year', sa.func.timezone('UTC', MemberID.created_at))
+    else:
+        registration_year = sa.extract('year', MemberID.created_at)
+    query_groups = await session.execute(
+        sa.select(User.origin_country_code, registration_year, sa.extract('year', User.date_of_birth), sa.func.count())
+            .select_from(MemberID)
+            .join(User, User.id == MemberID.user_id)
+            .group_by(User.origin_country_code, registration_year, sa.extract('year', User.date_of_birth)))
+    bucket_counts = Counter()
+    for country_code, registration_year, birth_year, count in query_groups.all():
+        bucket_counts[('country', country_code)] += count
+        bucket_counts[('registration_year', str(int(registration_year)))] += count
+        bucket_counts[('birth_decade', f'{int(birth_year) // 10 * 10}s')] += count
+    return bucket_counts
+
+
+async def member_id_stats_get(session) -> dict:
+    '''Output: Returns counts per dimension. Ex: { "country": { "MX": 12 }, "registration_year": { "2023": 12 }, "birth_decade": { "1960s": 12 }, "total": 12 }'''
+    return _member_id_stats_shape(await _member_id_stats_counted(session))
+
+
+async def member_id_stats_reconcile(session, repair: bool = False) -> dict:
+    '''
+    Input: Takes a session (not in a transaction), and whether to overwrite the counters w/ the recomputed counts
+    Output: Returns the buckets that drifted ({ "dimension": ..., "bucket": ..., "counted": ..., "recomputed": ... }) + if they were repaired
+    '''
+    # --- reads the counters then rewrites them, so the whole transaction runs on the writer (sqlite)
+    async with sqlalchemy_session_writer(session).begin():
+        # --- block inserts while we scan + swap on postgres, so increments landing mid-scan don't read as drift
+        if (await session.connection()).dialect.name == 'postgresql':
+            await session.execute(sa.text('LOCK TABLE "member_id" IN SHARE MODE;'))
+        counted = await _member_id_stats_counted(session)
+        recomputed = await _member_id_stats_recomputed(session)
+        drift = [
+            { 'dimension': dimension, 'bucket': bucket, 'counted': counted[(dimension, bucket)], 'recomputed': recomputed[(dimension, bucket)] }
+            for dimension, bucket in sorted(set(counted) | set(recomputed))
+            if counted[(dimension, bucket)] != recomputed[(dimension, bucket)]
+        ]
+        if repair and len(drift) > 0:
+            await session.execute(sa.text('DELETE FROM "member_id_stats";'))
+            await member_id_stats_increment(session, recomputed)
+    return { 'drift': drift, 'repaired': repair and len(drift) > 0, 'stats': _member_id_stats_shape(recomputed) }
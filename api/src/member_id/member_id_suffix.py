@@ -0,0 +1,110 @@
+import asyncio
+import sqlalchemy as sa
+
+from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_session_writer
+import env
+from member_id.member_id_codec import member_id_encode
+from member_id.member_id_utils import MEMBER_ID_SUFFIX_SPACE, member_id_suffix_permute
+
+
+# Suffix Allocation Thoughts:
+# - counters live in the "member_id_suffix_counter" table, one row per 'YY-CC-BY-BM' prefix
+# - each worker reserves a block of counters at a time and hands them out from memory, so most creates never touch the counter table
+# - a block that dies w/ its worker is just skipped capacity, never a collision
+# - ids minted before the allocator have random uuid suffixes. each block reservation reads the suffixes already taken in its prefix
+#   (one value_int range scan, since a prefix is a contiguous range) and the allocator skips counters that permute onto one of them
+# - nothing mints random suffixes anymore, so the taken set read w/ a block can't go stale
+# - MEMBER_ID_SUFFIX_KEY has no default. booting w/o it and setting it later would remap counters onto suffixes already issued under the default
+
+
+def member_id_suffix_key() -> bytes:
+    '''Output: Returns the suffix permutation key. Raises if MEMBER_ID_SUFFIX_KEY is unset, so a misconfigured process fails at boot instead of allocating'''
+    key = env.env_get_member_id_suffix_key()
+    if key == None or key == '':
+        raise ValueError('MEMBER_ID_SUFFIX_KEY is not set. Suffixes are permuted w/ it, and it can never change once ids are allocated')
+    return key.encode()
+
+
+class MemberIDSuffixAllocator:
+    '''Per-worker allocator of collision-free member id suffixes, reserving counter blocks from the database'''
+
+    def __init__(self):
+        self._blocks = {} # prefix -> [next counter, end counter (exclusive), suffixes already taken in the prefix]
+        self._locks = {} # prefix -> asyncio.Lock, so a block reservation only holds up creates for its own prefix
+        self._key = None
+
+    def _get_key(self) -> bytes:
+        if self._key == None:
+            self._key = member_id_suffix_key()
+        return self._key
+
+    async def _reserve_block(self, prefix: str, size: int) -> list:
+        '''Bumps the prefix's counter by size in its own short transaction. Returns [start, end, suffixes already taken in the prefix]'''
+        async with create_sqlalchemy_session() as session:
+            async with sqlalchemy_session_writer(session).begin():
+                query_counter = await session.execute(sa.text('''
+                    INSERT INTO "member_id_suffix_counter" (prefix, next_value) VALUES (:prefix, :size)
+                    ON CONFLICT (prefix) DO UPDATE SET next_value = "member_id_suffix_counter".next_value + :size
+                    RETURNING next_value;
+                '''), { 'prefix': prefix, 'size': size })
+                end = query_counter.scalar_one()
+                # --- suffixes of ids minted before the allocator, so they can be skipped
+                prefix_int = member_id_encode(f'{prefix}-0000')
+                query_taken = await session.execute(sa.text('''
+                    SELECT value_int FROM "member_id" WHERE value_int BETWEEN :low AND :high;
+                '''), { 'low': prefix_int, 'high': prefix_int + MEMBER_ID_SUFFIX_SPACE - 1 }) if prefix_int != None else None
+                taken = set(value_int - prefix_int for value_int in query_taken.scalars()) if query_taken != None else set()
+        start = end - size
+        if start >= MEMBER_ID_SUFFIX_SPACE:
+            raise ValueError(f'Member ID suffixes exhausted for {prefix}')
+        return [start, min(end, MEMBER_ID_SUFFIX_SPACE), taken]
+
+    async def allocate_many(self, prefix: str, count: int) -> list[int]:
+        '''
+        Input: Takes a 'YY-CC-BY-BM' prefix and how many suffixes are needed
+        Output: Returns unique (permuted) suffixes for the prefix, none of them already taken by an existing id
+        '''
+        key = self._get_key() # before reserving, so a missing key doesn't burn counters
+        suffixes = []
+        async with self._locks.setdefault(prefix, asyncio.Lock()):
+            while len(suffixes) < count:
+                block = self._blocks.get(prefix)
+                if block == None or block[0] >= block[1]:
+                    # --- bulk requests reserve everything they need at once, single creates reserve a default sized block
+                    block = await self._reserve_block(prefix, max(count - len(suffixes), env.env_get_member_id_suffix_block_size()))
+                    self._blocks[prefix] = block
+                while block[0] < block[1] and len(suffixes) < count:
+                    suffix = member_id_suffix_permute(block[0], key, tweak=prefix)
+                    block[0] += 1
+                    if suffix not in block[2]:
+                        suffixes.append(suffix)
+        return suffixes
+
+    async def allocate(self, prefix: str) -> int:
+        return (await self.allocate_many(prefix, 1))[0]
+
+    def reset(self):
+        '''Drops held blocks (ex: after the counter table is re-created)'''
+        self._blocks = {}
+
+
+member_id_suffix_allocator = MemberIDSuffixAllocator()
+
+
+async def member_id_suffix_capacity(session, limit: int = 100) -> list[dict]:
+    '''
+    Input: Takes a session and a max number of prefixes to report
+    Output: Returns how full each prefix is, fullest first. 'allocated' counts reserved counters (read from the counter table alone, no member_id scan)
+    '''
+    query_counters = await session.execute(sa.text('''
+        SELECT prefix, next_value
+        FROM "member_id_suffix_counter"
+        ORDER BY next_value DESC
+        LIMIT :limit;
+    '''), { 'limit': limit })
+    return [{
+        'prefix': prefix,
+        'allocated': min(next_value, MEMBER_ID_SUFFIX_SPACE),
+        'capacity': MEMBER_ID_SUFFIX_SPACE,
+        'used_pct': round(100 * min(next_value, MEMBER_ID_SUFFIX_SPACE) / MEMBER_ID_SUFFIX_SPACE, 3),
+    } for prefix, next_value in query_counters.all()]
@@ -1,6 +1,6 @@
 from datetime import date
+import hashlib
 import re
-import uuid
 
 from geo.country_codes import country_codes_and_names
 from utils.validators import is_valid_country_code
@@ -21,10 +21,10 @@ def member_id_clean(member_id: str) -> str:
 # - including a dash deliminter to help people read/see in chunks and be easier to memorize
 # - i don't want to reference first/last names, incase they need to change their name
 
-def member_id_generate(year: int, country_code: str, birth_date: date) -> str:
+def member_id_prefix(year: int, country_code: str, birth_date: date) -> str:
     '''
     Input: Takes a variety of member data points
-    Output: Returns a string representing the member ID for the user (non-deterministic bc of UUID selection)
+    Output: Returns the 'YY-CC-BY-BM' prefix of a member ID, which is what suffixes get allocated within
     '''
     # VALIDATE
     # --- year
@@ -45,51 +45,113 @@ def member_id_generate(year: int, country_code: str, birth_date: date) -> str:
         str(str(birth_date.year)[-2:]).zfill(2),
         str(birth_date.month).zfill(2), # 0 pad
         # include birth day?
-        str(uuid.uuid4()).split('-')[1] # start with a random uuid, and just grab the first 4 char chunk
     ]
     # return joined parts w/ dash deliminter
     return '-'.join(id_parts).upper()
 
 
-# Member ID Validation Thoughts:
-# - I think the error codes only make sense internally, they'd probably confuse a user. I'd keep err responses general
+def member_id_generate(year: int, country_code: str, birth_date: date, suffix: int) -> str:
+    '''
+    Input: Takes a variety of member data points, and an allocated suffix (see member_id/member_id_suffix.py)
+    Output: Returns a string representing the member ID for the user
+    '''
+    prefix = member_id_prefix(year=year, country_code=country_code, birth_date=birth_date)
+    return f'{prefix}-{suffix:04X}'
 
-def is_member_id_valid(member_id_str) -> tuple[bool, str]:
+
+# Member ID Suffix Thoughts:
+# - 4 random hex chars only gives 65,536 suffixes per prefix, and birthday-paradox collisions show up way before that
+# - instead we count up per prefix and run the counter through a keyed permutation (small feistel network), so suffixes are unique but don't look sequential
+# - the key can never change once ids are allocated, otherwise old and new counters can map onto the same suffix
+
+MEMBER_ID_SUFFIX_SPACE = 1 << 16
+
+def member_id_suffix_permute(counter: int, key: bytes, tweak: str = '') -> int:
     '''
-    Input: Takes a string, which should represent a Member ID.
-    Output: Returns a tuple of (is_valid, error_message)
+    Input: Takes a counter in [0, 65536), a secret key, and a tweak (the prefix, so each prefix gets its own ordering)
+    Output: Returns the suffix for that counter. A bijection on [0, 65536), so distinct counters never collide
     '''
+    if counter < 0 or counter >= MEMBER_ID_SUFFIX_SPACE:
+        raise ValueError(f'Suffix counter out of range. Got {counter}')
+    left, right = counter >> 8, counter & 0xFF
+    tweak_bytes = tweak.encode()
+    for round_index in range(4):
+        round_value = hashlib.blake2b(bytes((round_index, right)) + tweak_bytes, key=key, digest_size=1).digest()[0]
+        left, right = right, left ^ round_value
+    return (left << 8) | right
+
+
+# Member ID Validation Thoughts:
+# - I think the error codes only make sense internally, they'd probably confuse a user. I'd keep err responses general
+# - patterns are compiled once at import. a single anchored pattern answers the common (valid) case in one match,
+#   and only invalid ids walk the segment checks to find which error message to give
+
+_MEMBER_ID_PATTERN = re.compile(r'(\d{2})-([A-Za-z]{2})-(\d{2})-(0[1-9]|1[0-2])-([a-zA-Z0-9]{4})')
+_MEMBER_ID_TWO_DIGITS_PATTERN = re.compile(r'^\d{2}$')
+_MEMBER_ID_SUFFIX_PATTERN = re.compile(r'^[a-zA-Z0-9]{4}$')
+_MEMBER_ID_COUNTRY_CODES = frozenset(code for code in country_codes_and_names if code != 'US')
+_MEMBER_ID_VALID = (True, None)
+
+
+def _member_id_invalid_reason(member_id_str) -> tuple[bool, str]:
+    '''Walks the segment checks in order, so invalid ids get the same error message they always have'''
     splits = member_id_str.split('-')
 
     # TEST 0: Length
     if len(splits) != 5 or len(member_id_str) != 16:
         return False, 'Member ID is an incorrect length or number of segments.'
+    year, country_code, birth_year, birth_month, rand = splits
     # TEST 1: year (TODO: min/max expectation for year?)
-    year_pattern = re.compile(r'^\d{2}$')
-    if year_pattern.match(splits[0]) is None:
+    if _MEMBER_ID_TWO_DIGITS_PATTERN.match(year) is None:
         return False, 'Incorrect year'
     # TEST 2: country code (not using pattern, just checking against our list)
-    if splits[1].upper() not in country_codes_and_names.keys():
-        return False, f'Incorrect country code. Got {splits[1]}'
+    if country_code.upper() not in country_codes_and_names:
+        return False, f'Incorrect country code. Got {country_code}'
     # --- disallow US based country codes???
-    if splits[1].upper() == 'US':
-        return False, f'Disallowed country code. Got {splits[1]}'
+    if country_code.upper() == 'US':
+        return False, f'Disallowed country code. Got {country_code}'
     # TEST 3: birth year (last 2 digits)
-    birth_year_pattern = re.compile(r'^\d{2}$')
-    if birth_year_pattern.match(splits[2]) is None:
-        return False, f'Expecting 2 digit birth year. Got {splits[2]}'
+    if _MEMBER_ID_TWO_DIGITS_PATTERN.match(birth_year) is None:
+        return False, f'Expecting 2 digit birth year. Got {birth_year}'
     # TEST 3: birth month
-    birth_year_pattern = re.compile(r'^\d{2}$')
-    if birth_year_pattern.match(splits[3]) is None:
-        return False, f'Expecting 2 digit birth month. Got {splits[3]}'
+    if _MEMBER_ID_TWO_DIGITS_PATTERN.match(birth_month) is None:
+        return False, f'Expecting 2 digit birth month. Got {birth_month}'
     # --- expect between 1-12
-    if int(splits[3]) < 1 or int(splits[3]) > 12:
-        return False, f'Expecting birth month between 1-12. Got {splits[3]}'
+    birth_month_int = int(birth_month)
+    if birth_month_int < 1 or birth_month_int > 12:
+        return False, f'Expecting birth month between 1-12. Got {birth_month}'
     # TEST 4: 4 alphanumeric characters
-    rand_pattern = re.compile(r'^[a-zA-Z0-9]{4}$')
-    if rand_pattern.match(splits[4]) is None:
-        return False, f'Expected 4 alphanumeric characters. Got {splits[4]}'
+    if _MEMBER_ID_SUFFIX_PATTERN.match(rand) is None:
+        return False, f'Expected 4 alphanumeric characters. Got {rand}'
 
     # Valid!
-    return True, None
+    return _MEMBER_ID_VALID
+
 
+def is_member_id_valid(member_id_str) -> tuple[bool, str]:
+    '''
+    Input: Takes a string, which should represent a Member ID.
+    Output: Returns a tuple of (is_valid, error_message)
+    '''
+    match = _MEMBER_ID_PATTERN.fullmatch(member_id_str)
+    if match is not None and match.group(2).upper() in _MEMBER_ID_COUNTRY_CODES:
+        return _MEMBER_ID_VALID
+    return _member_id_invalid_reason(member_id_str)
+
+
+def validate_many(member_id_strs) -> list[tuple[bool, str]]:
+    '''
+    Input: Takes an iterable of strings, which should represent Member IDs.
+    Output: Returns a list of (is_valid, error_message) tuples, in the same order
+    '''
+    fullmatch = _MEMBER_ID_PATTERN.fullmatch
+    country_codes = _MEMBER_ID_COUNTRY_CODES
+    results = []
+    append = results.append
+    for member_id_str in member_id_strs:
+        match = fullmatch(member_id_str)
+        if match is not None and match.group(2).upper() in country_codes:
+            append(_MEMBER_ID_VALID)
+        else:
+            append(_member_id_invalid_reason(member_id_str))
+    return results
@@ -1,47 +1,144 @@
 from datetime import datetime
-from sanic.response import json
+import orjson
+import os
+from sanic.response import file_stream, json
 from sanic import Blueprint
-import sqlalchemy as sa
 
-from api.middleware import endpoint_cache
-from member_id.member_id_models import MemberID
-from member_id.member_id_utils import is_member_id_valid, member_id_clean, member_id_generate
-from user.user_models import User
-from utils.to_date import to_date
-from utils.validators import is_valid_country_code, is_valid_date, is_valid_nonempty_str
+from api.middleware import endpoint_cache, endpoint_cache_invalidate
+from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_session_writer
+from jobs.job_queue import job_enqueue
+from member_id.member_id_bulk import member_ids_bulk_create, member_rows_insert
+from member_id.member_id_export import MEMBER_EXPORT_FORMATS, member_export_stream
+from member_id.member_id_filter import member_id_filter_add, member_id_filter_stats
+from member_id.member_id_import import MEMBER_IMPORT_CHUNK_SIZE, MEMBER_IMPORT_FORMATS, member_import_errors_path, member_import_errors_url, member_import_id_parse, member_import_stream
+from member_id.member_id_queries import member_ids_cohort_query, member_ids_find_registered, member_ids_page_query, member_ids_serialize
+from member_id.member_id_schemas import member_create_parse, member_id_cohort_parse, member_id_validate_parse, member_ids_validate_parse, members_parse
+from member_id.member_id_stats import member_id_stats_get
+from member_id.member_id_suffix import member_id_suffix_allocator, member_id_suffix_capacity
+from member_id.member_id_utils import is_member_id_valid, member_id_prefix, validate_many
+from metrics.metrics_registry import metrics_counter_inc, metrics_histogram_observe, metrics_labels
+from utils.pagination import to_pagination_params
 
 
 # ROUTE FORK (aka 'blueprints')
 blueprint_member_id = Blueprint("blueprint_member_id")
 
 
+# CONFIGS
+STREAM_CHUNK_SIZE = 1000 # rows pulled off the server-side cursor per network write
+
+
 # ROUTES
 @blueprint_member_id.route('/v1/member_ids', methods = ['GET'])
-@endpoint_cache(expire=2)
+@endpoint_cache(expire=2, key_on='args', stale=10, local_ttl=2)
 async def app_route_member_id_get(request):
     """
     Endpoint: /v1/member_ids
-    Description: Gets all member ids models
+    Description: Gets member ids models, newest first. Paginated by keyset on id, pass 'next_after' back as 'after' for the next page.
+        Pass 'format=ndjson' to instead stream every member id (from 'after' onwards) as newline delimited json.
+        Pass cohort filters to only get one cohort, in member id order. They must form a prefix of the id: year -> country -> birth_year -> birth_month
+        (ex: ?year=23&country=MX&birth_year=61 for 2023 Mexican members born in 1961). Cohort pages are also keyset paginated via 'next_after'.
     Method: GET
+    Example Request Args: ?limit=100&after=4021 or ?year=23&country=MX&birth_year=61&limit=100
     Example Response: {
         "status": "success"
         "data": {
-            "member_ids": [...]
+            "member_ids": [...],
+            "next_after": 3921
         }
     }
     """
+    limit, after = to_pagination_params(request.args)
+    cohort_range = member_id_cohort_parse(request.args)
+    # --- stream (opt-in)
+    if request.args.get('format') == 'ndjson':
+        if cohort_range != None:
+            raise ValueError("Cohort filters can't be combined w/ 'format=ndjson'")
+        return await _stream_member_ids_ndjson(request, after)
+    # --- cohort page
+    if cohort_range != None:
+        return await _member_ids_cohort_page(request, cohort_range, limit, after)
+    # --- page
+    session = request.ctx.session
+    async with session.begin():
+        query_member_ids = await session.execute(member_ids_page_query(after=after, limit=limit + 1))
+        member_ids = query_member_ids.all()
+    # --- respond (we fetched one extra row to know if there's another page)
+    has_next_page = len(member_ids) > limit
+    member_ids = member_ids[:limit]
+    return json({
+        'status': 'success',
+        'data': {
+            'member_ids': member_ids_serialize(member_ids),
+            'next_after': member_ids[-1].id if has_next_page else None,
+        }
+    })
+
+
+async def _member_ids_cohort_page(request, cohort_range: tuple[int, int], limit: int, after: int = None):
+    '''A page of one cohort. Reads straight off the covering value_int index, and the cursor is the last value_int on the page'''
     session = request.ctx.session
     async with session.begin():
-        query_builder = sa.select(MemberID).order_by(sa.desc(MemberID.id))
-        query_member_ids = await session.execute(query_builder)
-        member_ids = query_member_ids.scalars().all()
+        query_member_ids = await session.execute(member_ids_cohort_query(cohort_range, after=after, limit=limit + 1))
+        member_ids = query_member_ids.all()
     # --- respond
+    has_next_page = len(member_ids) > limit
+    member_ids = member_ids[:limit]
     return json({
         'status': 'success',
-        'data': { 'member_ids': [mid.serialize() for mid in member_ids] }
+        'data': {
+            'member_ids': member_ids_serialize(member_ids),
+            'next_after': member_ids[-1].value_int if has_next_page else None,
+        }
     })
 
 
+async def _stream_member_ids_ndjson(request, after: int = None):
+    '''
+    Streams member ids off a server-side cursor, so memory stays flat regardless of table size.
+    Uses its own session, since the request session is closed by response middleware as soon as we start responding.
+    '''
+    response = await request.respond(content_type='application/x-ndjson')
+    async with create_sqlalchemy_session() as session:
+        async with session.begin():
+            query_member_ids = await session.stream(member_ids_page_query(after=after))
+            async for member_ids in query_member_ids.partitions(STREAM_CHUNK_SIZE):
+                await response.send(b''.join(orjson.dumps(member_id) + b'\n' for member_id in member_ids_serialize(member_ids)))
+    await response.eof()
+
+
+@blueprint_member_id.route('/v1/member_ids/export', methods = ['GET'])
+async def app_route_member_ids__export_get(request):
+    """
+    Endpoint: /v1/member_ids/export
+    Description: Streams every member id joined w/ its user (for audits) as CSV or NDJSON, optionally gzipped. Rows come off a server-side
+        cursor chunk by chunk, so memory stays flat regardless of row count. Rows, bytes + duration are recorded in /metrics
+    Method: GET
+    Example Request Args: ?format=csv&gzip=true
+    Example Response (csv): member_id,member_id_created_at,first_name,last_name,date_of_birth,country,user_created_at
+        23-MX-61-01-2F0D,2023-05-01 12:00:00+00:00,Jose,Vasconcelos,1961-01-01,MX,2023-05-01 12:00:00+00:00
+    """
+    # VALIDATE (before we start responding, so bad args still get a normal error response)
+    encoding = request.args.get('format') or 'csv'
+    if encoding not in MEMBER_EXPORT_FORMATS:
+        raise ValueError(f"'format' must be one of {', '.join(MEMBER_EXPORT_FORMATS)}")
+    is_gzip = request.args.get('gzip') == 'true'
+
+    # EXECUTE
+    # --- own session, since the request session is closed by response middleware as soon as we start responding
+    filename = f'member_ids.{encoding}{".gz" if is_gzip else ""}'
+    response = await request.respond(
+        content_type='application/gzip' if is_gzip else ('text/csv' if encoding == 'csv' else 'application/x-ndjson'),
+        headers={ 'Content-Disposition': f'attachment; filename="{filename}"' })
+    async with create_sqlalchemy_session() as session:
+        export_stats = await member_export_stream(session, response.send, format=encoding, gzip=is_gzip)
+    await response.eof()
+    metric_labels = metrics_labels(format=encoding, gzip=is_gzip)
+    metrics_counter_inc('member_export_rows_total', metric_labels, export_stats['rows'])
+    metrics_counter_inc('member_export_bytes_total', metric_labels, export_stats['bytes'])
+    metrics_histogram_observe('member_export_duration_seconds', metric_labels, export_stats['seconds'])
+
+
 @blueprint_member_id.route('/v1/member_id', methods = ['POST'])
 async def app_route_member_id_post(request):
     """
@@ -58,45 +155,234 @@ async def app_route_member_id_post(request):
         "status": "success"
     }
     """
+    # VALIDATE (parsed once, before a session or suffix is touched)
+    member = member_create_parse(request.json)
+
+    # EXECUTE
+    # --- form id (suffix comes from this worker's reserved block, so it can't collide w/ other allocated ids, or w/ ids minted before the allocator)
+    new_member_id_prefix = member_id_prefix(
+        year=datetime.now().year,
+        country_code=member.country,
+        birth_date=member.date_of_birth,
+    )
+    new_member_id_value = f'{new_member_id_prefix}-{await member_id_suffix_allocator.allocate(new_member_id_prefix):04X}'
+    # --- mark it registered before it exists (a rollback only leaves a false positive, a late add would be a false negative)
+    await member_id_filter_add([new_member_id_value])
+    session = sqlalchemy_session_writer(request.ctx.session)
+    async with session.begin():
+        # --- create the user + their member id (same core insert as bulk, since the member was already validated. if any of this errs, we rollback automatically)
+        await member_rows_insert(session, [{ 'member': member, 'member_id_value': new_member_id_value }])
+    # --- committed, so drop cached listings/validations on every worker
+    await member_ids_cache_invalidate()
+    # --- respond
+    return json({ 'status': 'success' })
+
+
+@blueprint_member_id.route('/v1/member_ids/bulk', methods = ['POST'])
+async def app_route_member_ids_bulk_post(request):
+    """
+    Endpoint: /v1/member_ids/bulk
+    Description: Creates many member id models at once (validated in one pass, inserted in chunked transactions). Reports success/failure per member in request order.
+        With ?async=true the batch is handed to a worker instead, and this responds 202 w/ a job id to poll at /v1/jobs/<job_id>
+    Method: POST
+    Example Request Args: ?async=true
+    Example Request Body: {
+        "members": [
+            { "first_name": "Jose", "last_name": "Vasconcelos", "dob": "01/01/1961", "country": "MX" },
+            ...
+        ]
+    }
+    Example Response: {
+        "status": "success"
+        "data": {
+            "results": [{ "status": "success", "member_id": "23-MX-61-01-2F0D" }, { "status": "failure", "error": "'dob' is required (date of birth)" }],
+            "created": 1,
+            "failed": 1
+        }
+    }
+    """
+    # VALIDATE (every record parsed in one pass. invalid ones are reported per member, not raised)
+    members = members_parse(request.json)
+
+    # EXECUTE
+    # --- async: a worker does the inserts (see jobs/job_handlers.py), results land on the job
+    if request.args.get('async') == 'true':
+        job_id = await job_enqueue('member_ids_bulk_create', { 'members': request.json['members'] })
+        return json({ 'status': 'success', 'data': { 'job_id': job_id } }, status=202)
+    results = await member_ids_bulk_create(request.ctx.session, members)
+    created = sum(1 for result in results if result['status'] == 'success')
+    if created > 0:
+        await member_ids_cache_invalidate()
+    # --- respond
+    return json({
+        'status': 'success',
+        'data': {
+            'results': results,
+            'created': created,
+            'failed': len(results) - created,
+        },
+    })
+
+
+@blueprint_member_id.route('/v1/member_ids/import', methods = ['POST'], stream=True)
+async def app_route_member_ids__import_post(request):
+    """
+    Endpoint: /v1/member_ids/import
+    Description: Imports a CSV (header: first_name,last_name,dob,country) or NDJSON roster from the request body as it streams in,
+        committing every 'chunk_size' rows. Pass an 'import_id' to make it resumable: re-sending the same file w/ the same id skips rows
+        already committed. Rows that fail (incl. lines that aren't valid UTF-8) are appended to an error report (line, error, raw row), downloadable at 'errors_url'
+    Method: POST
+    Example Request Args: ?format=csv&import_id=roster-2023-05&chunk_size=500
+    Example Response: {
+        "status": "success"
+        "data": {
+            "import_id": "roster-2023-05", "resumed_from_line": 0, "line": 150001, "rows": 150000, "created": 149870, "failed": 130,
+            "rows_this_run": 150000, "seconds": 61.2, "rows_per_second": 2450, "errors_url": "/v1/member_ids/import/roster-2023-05/errors"
+        }
+    }
+    """
     # VALIDATE
-    if is_valid_nonempty_str(request.json.get('first_name'), raise_if_fail=False) == False:
-        raise ValueError("'first_name' is required")
-    if is_valid_nonempty_str(request.json.get('last_name'), raise_if_fail=False) == False:
-        raise ValueError("'last_name' is required")
-    if is_valid_country_code(request.json.get('country'), raise_if_fail=False) == False:
-        raise ValueError("'country' is required")
-    if is_valid_date(request.json.get('dob'), raise_if_fail=False) == False:
-        raise ValueError("'dob' is required (date of birth)")
+    encoding = request.args.get('format') or 'csv'
+    if encoding not in MEMBER_IMPORT_FORMATS:
+        raise ValueError(f"'format' must be one of {', '.join(MEMBER_IMPORT_FORMATS)}")
+    import_id = member_import_id_parse(request.args.get('import_id'))
+    try:
+        chunk_size = int(request.args.get('chunk_size') or MEMBER_IMPORT_CHUNK_SIZE)
+    except ValueError:
+        raise ValueError("'chunk_size' must be an integer")
 
     # EXECUTE
+    # --- body chunks are only read as fast as we commit them
+    async def request_body_chunks():
+        while True:
+            chunk = await request.stream.read()
+            if chunk == None:
+                break
+            yield chunk
+    import_summary = await member_import_stream(
+        request.ctx.session,
+        request_body_chunks(),
+        format=encoding,
+        import_id=import_id,
+        chunk_size=chunk_size,
+        errors_path=member_import_errors_path(import_id))
+    if import_summary['rows_this_run'] > 0:
+        await member_ids_cache_invalidate()
+    # --- respond
+    return json({
+        'status': 'success',
+        'data': { **import_summary, 'errors_url': member_import_errors_url(import_id) },
+    })
+
+
+@blueprint_member_id.route('/v1/member_ids/import/<import_id:str>/errors', methods = ['GET'])
+async def app_route_member_ids__import_errors_get(request, import_id: str):
+    """
+    Endpoint: /v1/member_ids/import/<import_id>/errors
+    Description: Downloads an import's error report (csv of line, error, raw row). Reports are kept on the host that ran the import,
+        so imports run by workers on other hosts need MEMBER_IMPORT_ERRORS_DIR on shared storage
+    Method: GET
+    Example Response (text/csv):
+        9,'dob' is required (date of birth),"Ana,Ruiz,,MX"
+        ...
+    """
+    # VALIDATE (ids are kept to [A-Za-z0-9_-], so this can't reach outside the errors dir)
+    errors_path = member_import_errors_path(member_import_id_parse(import_id))
+    if not os.path.exists(errors_path):
+        raise ValueError(f'No error report for import: {import_id}')
+
+    # --- respond
+    return await file_stream(errors_path, mime_type='text/csv', filename=f'{import_id}.errors.csv')
+
+
+@blueprint_member_id.route('/v1/member_ids/capacity', methods = ['GET'])
+async def app_route_member_ids__capacity_get(request):
+    """
+    Endpoint: /v1/member_ids/capacity
+    Description: Reports how full each member id prefix ('YY-CC-BY-BM') is out of its 65,536 suffixes, fullest first
+    Method: GET
+    Example Request Args: ?limit=100
+    Example Response: {
+        "status": "success"
+        "data": {
+            "prefixes": [{ "prefix": "23-MX-61-01", "allocated": 32, "capacity": 65536, "used_pct": 0.049 }]
+        }
+    }
+    """
+    limit, _ = to_pagination_params(request.args)
+    session = request.ctx.session
+    async with session.begin():
+        prefixes = await member_id_suffix_capacity(session, limit=limit)
+    # --- respond
+    return json({
+        'status': 'success',
+        'data': { 'prefixes': prefixes },
+    })
+
+
+@blueprint_member_id.route('/v1/member_ids/stats', methods = ['GET'])
+@endpoint_cache(expire=5)
+async def app_route_member_ids__stats_get(request):
+    """
+    Endpoint: /v1/member_ids/stats
+    Description: Member counts per country, registration year, and birth decade. Read from counters kept up to date by creates (no table scans)
+    Method: GET
+    Example Response: {
+        "status": "success"
+        "data": {
+            "country": { "CA": 3, "MX": 9 },
+            "registration_year": { "2023": 12 },
+            "birth_decade": { "1960s": 10, "1970s": 2 },
+            "total": 12
+        }
+    }
+    """
     session = request.ctx.session
     async with session.begin():
-        # --- form id
-        new_member_id_value = member_id_generate(
-            year=datetime.now().year,
-            country_code=request.json.get('country'),
-            birth_date=to_date(request.json.get('dob')),
-        )
-        # --- if we were able to form a member ID value, let's first create a new user (if any of this errs, we rollback automatically)
-        new_user_and_member_id_record = User(
-            first_name=request.json.get('first_name'),
-            last_name=request.json.get('last_name'),
-            date_of_birth=to_date(request.json.get('dob')),
-            origin_country_code=request.json.get('country'),
-            created_at=datetime.now(),
-            # create the related record as we insert user, so the appropriate foreign keys are set
-            member_id=[MemberID(
-                value=new_member_id_value,
-                created_at=datetime.now(),
-            )]
-        )
-        session.add(new_user_and_member_id_record)
-        # --- respond
-        return json({ 'status': 'success' })
-        
+        stats = await member_id_stats_get(session)
+    return json({
+        'status': 'success',
+        'data': stats,
+    })
+
+
+@blueprint_member_id.route('/v1/member_ids/filter', methods = ['GET'])
+async def app_route_member_ids__filter_get(request):
+    """
+    Endpoint: /v1/member_ids/filter
+    Description: Stats for the registered member id filter (bloom filter that lets validation skip the db on definite negatives)
+    Method: GET
+    Example Response: {
+        "status": "success"
+        "data": {
+            "is_built": true, "bits": 9585059, "hash_count": 7, "count": 1204,
+            "expected_fp_rate": 0.0, "observed_fp_rate": 0.0, ...
+        }
+    }
+    """
+    return json({
+        'status': 'success',
+        'data': await member_id_filter_stats(),
+    })
+
+
+@blueprint_member_id.route('/v1/member_ids/filter/rebuild', methods = ['POST'])
+async def app_route_member_ids__filter_rebuild_post(request):
+    """
+    Endpoint: /v1/member_ids/filter/rebuild
+    Description: Queues a rebuild of the registered member id filter on a worker. Poll /v1/jobs/<job_id> for its stats
+    Method: POST
+    Example Response: {
+        "status": "success"
+        "data": { "job_id": "9f0c6f3e..." }
+    }
+    """
+    job_id = await job_enqueue('member_id_filter_rebuild', {})
+    return json({ 'status': 'success', 'data': { 'job_id': job_id } }, status=202)
+
 
 @blueprint_member_id.route('/v1/member_id/validate', methods = ['POST'])
-@endpoint_cache(expire=30, key_on='json')
+@endpoint_cache(expire=30, key_on='json', stale=30, local_ttl=30)
 async def app_route_member_id__validate_post(request):
     """
     Endpoint: /v1/member_id/validate
@@ -115,27 +401,69 @@ async def app_route_member_id__validate_post(request):
     }
     """
     # VALIDATE/CLEAN
-    if is_valid_nonempty_str(request.json.get('member_id'), raise_if_fail=False) == False:
-        raise ValueError("'member_id' is required")
-    clean_member_id = member_id_clean(request.json.get('member_id'))
-    
+    clean_member_id = member_id_validate_parse(request.json)
+
     # EXECUTE
-    session = request.ctx.session
-    async with session.begin():        
-        # --- check if is a valid format
-        is_valid, invalid_reason = is_member_id_valid(clean_member_id)
-        # --- check if exists in db already (not 'invalid' per se, but extra meta info to show on frontend)
-        query_member_id = await session.execute(
-            sa.select(MemberID).where(MemberID.value == clean_member_id))
-        found_member_id = query_member_id.scalar_one_or_none()
-        # --- setup response payload
-        response_data = {
-            'is_registered': found_member_id is not None,
-            'is_valid': is_valid, # True/False
-            'invalid_reason': invalid_reason, # None/str
+    # --- check if is a valid format
+    is_valid, invalid_reason = is_member_id_valid(clean_member_id)
+    # --- check if exists in db already (not 'invalid' per se, but extra meta info to show on frontend). definite negatives skip the db
+    registered_member_ids = await member_ids_find_registered(request.ctx.session, [clean_member_id])
+    # --- setup response payload
+    response_data = {
+        'is_registered': clean_member_id in registered_member_ids,
+        'is_valid': is_valid, # True/False
+        'invalid_reason': invalid_reason, # None/str
+    }
+    # --- respond
+    return json({
+        'status': 'success',
+        'data': response_data,
+    })
+
+
+@blueprint_member_id.route('/v1/member_ids/validate', methods = ['POST'])
+async def app_route_member_ids__validate_post(request):
+    """
+    Endpoint: /v1/member_ids/validate
+    Description: Validates many member ids at once. Registration status for every valid id is resolved w/ one query. Results are in request order
+    Method: POST
+    Example Request Body: {
+        "member_ids": ["23-MX-61-01-2F0D", "XYZ123"]
+    }
+    Example Response: {
+        "status": "success"
+        "data": {
+            "results": [
+                { "member_id": "23-MX-61-01-2F0D", "is_registered": true, "is_valid": true, "invalid_reason": null },
+                { "member_id": "XYZ123", "is_registered": false, "is_valid": false, "invalid_reason": "..." }
+            ]
         }
-        # --- respond
-        return json({
-            'status': 'success',
-            'data': response_data,
-        })
+    }
+    """
+    # VALIDATE/CLEAN
+    member_ids, clean_member_ids = member_ids_validate_parse(request.json)
+    results = []
+    for member_id, clean_member_id, (is_valid, invalid_reason) in zip(member_ids, clean_member_ids, validate_many(clean_member_ids)):
+        if clean_member_id == '':
+            results.append({ 'member_id': member_id, 'is_registered': False, 'is_valid': False, 'invalid_reason': "'member_id' is required" })
+        else:
+            results.append({ 'member_id': clean_member_id, 'is_registered': False, 'is_valid': is_valid, 'invalid_reason': invalid_reason })
+
+    # EXECUTE
+    # --- only syntactically valid ids can be registered, so just look those up (one round trip, minus the filter's definite negatives)
+    valid_member_ids = [result['member_id'] for result in results if result['is_valid']]
+    if len(valid_member_ids) > 0:
+        registered_member_ids = await member_ids_find_registered(request.ctx.session, valid_member_ids)
+        for result in results:
+            result['is_registered'] = result['member_id'] in registered_member_ids
+    # --- respond
+    return json({
+        'status': 'success',
+        'data': { 'results': results },
+    })
+
+
+# HELPERS
+async def member_ids_cache_invalidate():
+    '''Drops cached listings/validations on every worker. Call after member ids are created (here or in a job)'''
+    await endpoint_cache_invalidate(app_route_member_id_get, app_route_member_id__validate_post)
@@ -0,0 +1,32 @@
+from metrics.metrics_registry import METRICS_BUCKETS, metrics_counter_inc, metrics_histogram_observe, metrics_labels, metrics_merge, metrics_render, metrics_snapshot
+
+
+def test_metrics_labels():
+    assert metrics_labels(route='/v1/member_ids', method='GET') == 'route="/v1/member_ids",method="GET"', 'Unexpected labels'
+    # --- tests: values are escaped per the exposition format
+    assert metrics_labels(endpoint='a"b\\c\nd') == 'endpoint="a\\"b\\\\c\\nd"', 'Label value not escaped'
+
+
+def test_metrics_snapshot_merge_render():
+    labels = metrics_labels(route='/test/metrics_registry', method='GET')
+    metrics_counter_inc('http_requests_total', f'{labels},status="200"')
+    metrics_counter_inc('http_requests_total', f'{labels},status="200"')
+    metrics_histogram_observe('http_request_duration_seconds', labels, 0.003)
+    metrics_histogram_observe('http_request_duration_seconds', labels, 0.001) # on a bucket bound, so counted in that bucket (le)
+    metrics_histogram_observe('http_request_duration_seconds', labels, 30) # past the last bucket, so only in +Inf
+    snapshot = metrics_snapshot()
+    assert snapshot['values']['http_requests_total'][f'{labels},status="200"'] == 2, 'Counter not incremented'
+    assert sum(snapshot['histograms']['http_request_duration_seconds'][labels][:-1]) == 3, 'Histogram count off'
+    # --- tests: merging two workers sums counters + every bucket
+    merged = metrics_merge([snapshot, snapshot])
+    assert merged['values']['http_requests_total'][f'{labels},status="200"'] == 4, 'Counters not summed'
+    rendered = metrics_render(merged)
+    assert f'http_requests_total{{{labels},status="200"}} 4' in rendered, 'Counter not rendered'
+    # --- tests: buckets are cumulative + +Inf matches count
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.0005"}} 0' in rendered, 'Unexpected first bucket'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.001"}} 2' in rendered, 'Bucket bound should be inclusive'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.005"}} 4' in rendered, 'Buckets not cumulative'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="{METRICS_BUCKETS[-1]}"}} 4' in rendered, 'Unexpected last bucket'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 6' in rendered, 'Unexpected +Inf bucket'
+    assert f'http_request_duration_seconds_count{{{labels}}} 6' in rendered, 'Unexpected count'
+    assert '# TYPE http_request_duration_seconds histogram' in rendered, 'Missing type line'
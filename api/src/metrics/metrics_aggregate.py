@@ -0,0 +1,62 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from redis.exceptions import RedisError
+
+from dbs.database_redis import Cacher
+import env
+from metrics.metrics_registry import metrics_merge, metrics_snapshot
+
+
+# Aggregation Thoughts:
+# - sanic runs several worker processes per node, and a scrape lands on just one of them, so each worker publishes its snapshot to a redis hash (one field per worker)
+# - the hash is per node (hostname), so prometheus still scrapes + labels each node as its own instance instead of seeing every node's totals everywhere
+# - the worker answering the scrape publishes its own snapshot right then, others are at most METRICS_SNAPSHOT_SECONDS old
+# - snapshots from workers that stopped publishing are dropped after a few intervals. their counters vanish from the sum, which prometheus reads as a counter reset
+
+METRICS_SNAPSHOT_STALE_INTERVALS = 3
+
+_metrics_worker_id = f'{os.getpid()}'
+
+
+def _metrics_key() -> list[str]:
+    return ['metrics', socket.gethostname()]
+
+
+async def metrics_snapshot_publish():
+    '''Writes this worker's snapshot to the node's hash'''
+    cacher = Cacher()
+    key = cacher.namespace_key(_metrics_key())
+    snapshot = { 'published_at': time.time(), **metrics_snapshot() }
+    async with cacher.client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, _metrics_worker_id, json.dumps(snapshot))
+        pipe.expire(key, env.env_get_metrics_snapshot_seconds() * METRICS_SNAPSHOT_STALE_INTERVALS)
+        await pipe.execute()
+
+
+async def metrics_snapshot_publisher():
+    '''Keeps this worker's snapshot current. Run as a background task per worker'''
+    while True:
+        await asyncio.sleep(env.env_get_metrics_snapshot_seconds())
+        try:
+            await metrics_snapshot_publish()
+        except RedisError:
+            pass
+
+
+async def metrics_collect() -> dict:
+    '''
+    Output: Returns every live worker's snapshot on this node merged into one (just this worker's, if redis is unavailable)
+    '''
+    try:
+        await metrics_snapshot_publish()
+        cached_hash = await Cacher().get_hash(_metrics_key()) or {}
+    except RedisError:
+        cached_hash = { _metrics_worker_id.encode(): json.dumps({ 'published_at': time.time(), **metrics_snapshot() }) }
+    published_after = time.time() - env.env_get_metrics_snapshot_seconds() * METRICS_SNAPSHOT_STALE_INTERVALS
+    snapshots = [snapshot for snapshot in map(json.loads, cached_hash.values()) if snapshot['published_at'] >= published_after]
+    merged = metrics_merge(snapshots)
+    merged['values']['metrics_workers'] = { '': len(snapshots) }
+    return merged
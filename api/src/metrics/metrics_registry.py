@@ -0,0 +1,131 @@
+import bisect
+
+
+# Metrics Thoughts:
+# - each worker counts into plain dicts (no locks needed, a worker is one event loop), then snapshots get merged across workers (see metrics_aggregate.py)
+# - every sample is keyed by its rendered label string (ex: 'route="/v1/member_ids",method="GET"'), so merging snapshots is just adding numbers per key
+# - histograms keep a count per bucket (not cumulative) + a sum, and are rendered as prometheus cumulative buckets at scrape time
+# - gauges that already live elsewhere (ex: pool checkouts) are read at snapshot time by registered collectors, instead of being mirrored on every change
+# - keep label values low cardinality (route patterns, not paths. endpoint names, not cache keys)
+
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10) # seconds
+
+METRICS = {
+    # --- http (see api/api.py middleware)
+    'http_requests_total': ('counter', 'Requests by route pattern, method and response status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by route pattern + method, from request middleware to response middleware'),
+    # --- endpoint cache (see api/middleware.py)
+    'endpoint_cache_lookups_total': ('counter', 'Endpoint cache lookups by endpoint, tier (l1/l2) and result (hit/stale/miss)'),
+    'endpoint_cache_errors_total': ('counter', 'Redis errors the endpoint cache treated as misses/no-ops'),
+    'endpoint_cache_operation_duration_seconds': ('histogram', 'Endpoint cache redis round trips by endpoint + operation (get/set)'),
+    # --- sql (see dbs/sa_sessions.py engine events)
+    'sql_statements_total': ('counter', 'SQL statements executed by operation (SELECT/INSERT/...)'),
+    'sql_statement_errors_total': ('counter', 'SQL statements that raised, by operation'),
+    'sql_statement_duration_seconds': ('histogram', 'SQL statement duration by operation (cursor execute, incl. the db round trip)'),
+    # --- sessions + pool (see dbs/sa_sessions.py, read at snapshot time)
+    'db_session_requests_total': ('counter', 'Requests that went through the session middleware'),
+    'db_sessions_created_total': ('counter', 'Requests that actually created a session'),
+    'db_session_requests_with_connection_total': ('counter', 'Requests that checked out a pooled connection'),
+    'db_session_connections_used_total': ('counter', 'Transactions begun on a pooled connection across requests'),
+    'db_pool_size': ('gauge', 'Configured pool size, by pool (primary, or read for sqlite)'),
+    'db_pool_checked_out': ('gauge', 'Connections checked out right now, by pool'),
+    'db_pool_overflow': ('gauge', 'Overflow connections open right now, by pool'),
+    'db_pool_checkouts_total': ('counter', 'Pool checkouts, by pool'),
+    'db_pool_checkout_timeouts_total': ('counter', 'Pool checkouts that timed out waiting for a connection, by pool'),
+    'db_pool_checkout_wait_seconds_total': ('counter', 'Total seconds spent waiting on pool checkouts, by pool'),
+    # --- exports (see member_id/routes.py, rows/s is rows_total over the duration sum)
+    'member_export_rows_total': ('counter', 'Rows streamed by /v1/member_ids/export, by format + gzip'),
+    'member_export_bytes_total': ('counter', 'Bytes (after gzip) streamed by /v1/member_ids/export, by format + gzip'),
+    'member_export_duration_seconds': ('histogram', 'Time to stream a whole export, by format + gzip'),
+    # --- aggregation
+    'metrics_workers': ('gauge', 'Worker snapshots merged into this scrape'),
+}
+
+_counters: dict[str, dict[str, float]] = {}
+_histograms: dict[str, dict[str, list]] = {} # name -> label string -> [bucket counts..., +Inf count, sum]
+_collectors = []
+
+
+def _metrics_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def metrics_labels(**labels) -> str:
+    '''Renders labels in prometheus form, escaping values. Ex: metrics_labels(route='/v1/x', method='GET') -> 'route="/v1/x",method="GET"' '''
+    return ','.join(f'{name}="{_metrics_label_value(value)}"' for name, value in labels.items())
+
+
+def metrics_counter_inc(name: str, labels: str = '', value: float = 1):
+    samples = _counters.setdefault(name, {})
+    samples[labels] = samples.get(labels, 0) + value
+
+
+def metrics_histogram_observe(name: str, labels: str, seconds: float):
+    samples = _histograms.setdefault(name, {})
+    sample = samples.get(labels)
+    if sample == None:
+        sample = samples[labels] = [0] * (len(METRICS_BUCKETS) + 1) + [0.0]
+    sample[bisect.bisect_left(METRICS_BUCKETS, seconds)] += 1
+    sample[-1] += seconds
+
+
+def metrics_collector_register(collector):
+    '''
+    Input: Takes a function returning [(name, labels, value)] (ex: pool gauges), called on every snapshot
+    '''
+    _collectors.append(collector)
+
+
+def metrics_snapshot() -> dict:
+    '''Output: Returns this worker's samples as plain json-able data. Ex: { "values": { name: { labels: value } }, "histograms": { name: { labels: [...] } } } (values are counters + gauges)'''
+    values = { name: dict(samples) for name, samples in _counters.items() }
+    for collector in _collectors:
+        for name, labels, value in collector():
+            samples = values.setdefault(name, {})
+            samples[labels] = samples.get(labels, 0) + value
+    return {
+        'values': values,
+        'histograms': { name: { labels: list(sample) for labels, sample in samples.items() } for name, samples in _histograms.items() },
+    }
+
+
+def metrics_merge(snapshots: list[dict]) -> dict:
+    '''Output: Returns one snapshot w/ every sample summed across the given snapshots (ex: one per worker)'''
+    merged = { 'values': {}, 'histograms': {} }
+    for snapshot in snapshots:
+        for name, samples in snapshot['values'].items():
+            merged_samples = merged['values'].setdefault(name, {})
+            for labels, value in samples.items():
+                merged_samples[labels] = merged_samples.get(labels, 0) + value
+        for name, samples in snapshot['histograms'].items():
+            merged_samples = merged['histograms'].setdefault(name, {})
+            for labels, sample in samples.items():
+                merged_sample = merged_samples.get(labels)
+                merged_samples[labels] = list(sample) if merged_sample == None else [total + value for total, value in zip(merged_sample, sample)]
+    return merged
+
+
+def _metrics_line(name: str, labels: str, value: float) -> str:
+    value = str(int(value)) if float(value).is_integer() else repr(float(value))
+    return f'{name}{{{labels}}} {value}' if labels else f'{name} {value}'
+
+
+def metrics_render(snapshot: dict) -> str:
+    '''Output: Returns the snapshot in the prometheus text exposition format (v0.0.4)'''
+    lines = []
+    for name, (metric_type, description) in METRICS.items():
+        samples = snapshot['histograms' if metric_type == 'histogram' else 'values'].get(name)
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in sorted(samples.items()):
+            if metric_type != 'histogram':
+                lines.append(_metrics_line(name, labels, value))
+                continue
+            cumulative = 0
+            for upper_bound, count in zip([*METRICS_BUCKETS, '+Inf'], value[:-1]):
+                cumulative += count
+                lines.append(_metrics_line(f'{name}_bucket', f'{labels},le="{upper_bound}"' if labels else f'le="{upper_bound}"', cumulative))
+            lines.append(_metrics_line(f'{name}_sum', labels, value[-1]))
+            lines.append(_metrics_line(f'{name}_count', labels, cumulative))
+    return '\n'.join(lines) + '\n'
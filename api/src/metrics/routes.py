@@ -0,0 +1,25 @@
+from sanic.response import text
+from sanic import Blueprint
+
+from metrics.metrics_aggregate import metrics_collect
+from metrics.metrics_registry import metrics_render
+
+
+# ROUTE FORK (aka 'blueprints')
+blueprint_metrics = Blueprint("blueprint_metrics")
+
+
+# ROUTES
+@blueprint_metrics.route('/metrics', methods = ['GET'])
+async def app_route_metrics(request):
+    """
+    Endpoint: /metrics
+    Description: Prometheus scrape target. Route latency/status, endpoint cache, sql + session/pool metrics, summed across this node's workers
+    Method: GET
+    Example Response (text/plain):
+        # HELP http_requests_total Requests by route pattern, method and response status
+        # TYPE http_requests_total counter
+        http_requests_total{route="/v1/member_ids",method="GET",status="200"} 42
+        ...
+    """
+    return text(metrics_render(await metrics_collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,7 +1,139 @@
-from api.api import start_api
+import argparse
+import asyncio
+import os
+import sys
 
 # For any services I code, I always have a start file
 # That way we can tweak what/how startup happens w/ env flags
 # Ex: api vs. worker vs. cron
+# Mode comes from the first arg, or START_MODE (defaults to api). Ex: `python src/start.py filter-rebuild`
+
+
+def start_api():
+    from api.api import start_api
+    start_api()
+
+
+def start_member_id_filter_rebuild():
+    '''Rebuilds the registered member id filter from the member_id table, then prints its stats'''
+    from dbs.database_redis import redis_client_close, redis_client_connect
+    from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_engine_connect, sqlalchemy_engine_dispose
+    from member_id.member_id_filter import member_id_filter_rebuild
+    async def run():
+        sqlalchemy_engine_connect()
+        await redis_client_connect()
+        try:
+            async with create_sqlalchemy_session() as session:
+                print(await member_id_filter_rebuild(session))
+        finally:
+            await redis_client_close()
+            await sqlalchemy_engine_dispose()
+    asyncio.run(run())
+
+
+def start_member_id_stats_reconcile():
+    '''Recomputes member stats w/ a full scan and prints any drift from the counters. Pass --repair to overwrite the counters'''
+    from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_engine_connect, sqlalchemy_engine_dispose
+    from member_id.member_id_stats import member_id_stats_reconcile
+    from user.user_models import User # MemberID relates to it, so it has to be mapped too
+    async def run():
+        sqlalchemy_engine_connect()
+        try:
+            async with create_sqlalchemy_session() as session:
+                result = await member_id_stats_reconcile(session, repair='--repair' in sys.argv)
+            for bucket in result['drift']:
+                print(f'drift: {bucket["dimension"]}={bucket["bucket"]} counted {bucket["counted"]}, recomputed {bucket["recomputed"]}')
+            print(f'{len(result["drift"])} drifted buckets{" (repaired)" if result["repaired"] else ""}, {result["stats"]["total"]} members')
+        finally:
+            await sqlalchemy_engine_dispose()
+    asyncio.run(run())
+
+
+def start_member_ids_export():
+    '''Streams every member id joined w/ its user to a file (or stdout) as CSV/NDJSON. Ex: `python src/start.py export --format csv --gzip --out members.csv.gz`'''
+    from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_engine_connect, sqlalchemy_engine_dispose
+    from member_id.member_id_export import MEMBER_EXPORT_FORMATS, member_export_stream
+    parser = argparse.ArgumentParser(prog='start.py export')
+    parser.add_argument('--format', choices=MEMBER_EXPORT_FORMATS, default='csv')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--out', help='file to write (defaults to stdout)')
+    args = parser.parse_args(sys.argv[2:])
+    async def run():
+        sqlalchemy_engine_connect()
+        file = open(args.out, 'wb') if args.out else sys.stdout.buffer
+        async def write(data: bytes):
+            file.write(data)
+        try:
+            async with create_sqlalchemy_session() as session:
+                export_stats = await member_export_stream(session, write, format=args.format, gzip=args.gzip)
+            print(f'exported {export_stats["rows"]} rows ({export_stats["bytes"]} bytes) in {export_stats["seconds"]}s, {export_stats["rows_per_second"]} rows/s', file=sys.stderr)
+        finally:
+            if args.out:
+                file.close()
+            await sqlalchemy_engine_dispose()
+    asyncio.run(run())
+
+
+def start_member_ids_import():
+    '''Imports a CSV/NDJSON roster file in committed chunks, resuming from its checkpoint if a previous run was interrupted. Ex: `python src/start.py import --file roster.csv`. Add --async to hand it to a worker'''
+    from dbs.database_redis import redis_client_close, redis_client_connect
+    from dbs.sa_sessions import create_sqlalchemy_session, sqlalchemy_engine_connect, sqlalchemy_engine_dispose
+    from jobs.job_queue import job_enqueue
+    from member_id.member_id_import import MEMBER_IMPORT_CHUNK_SIZE, MEMBER_IMPORT_FORMATS, member_import_errors_path, member_import_file_chunks, member_import_file_format, member_import_file_id, member_import_id_parse, member_import_stream
+    from member_id.routes import member_ids_cache_invalidate
+    parser = argparse.ArgumentParser(prog='start.py import')
+    parser.add_argument('--file', required=True, help='.csv or .ndjson file (optionally .gz)')
+    parser.add_argument('--format', choices=MEMBER_IMPORT_FORMATS, help='defaults to the file extension')
+    parser.add_argument('--import-id', help='checkpoint id (defaults to one derived from the file path/size/mtime, so re-running the same file resumes)')
+    parser.add_argument('--chunk-size', type=int, default=MEMBER_IMPORT_CHUNK_SIZE)
+    parser.add_argument('--errors', help='error report path (defaults to MEMBER_IMPORT_ERRORS_DIR/<import id>.errors.csv)')
+    parser.add_argument('--async', dest='is_async', action='store_true', help='queue it for a worker instead (the file path must be readable by workers)')
+    args = parser.parse_args(sys.argv[2:])
+    file_path = os.path.abspath(args.file)
+    file_format = args.format or member_import_file_format(file_path)
+    import_id = member_import_id_parse(args.import_id or member_import_file_id(file_path))
+    async def run():
+        sqlalchemy_engine_connect()
+        await redis_client_connect()
+        try:
+            if args.is_async:
+                job_id = await job_enqueue('member_ids_import', {
+                    'file': file_path, 'format': file_format, 'import_id': import_id, 'chunk_size': args.chunk_size, 'errors_path': args.errors })
+                print(f'queued import {import_id} as job {job_id} (status at /v1/jobs/{job_id})')
+                return
+            async with create_sqlalchemy_session() as session:
+                errors_path = args.errors or member_import_errors_path(import_id)
+                import_summary = await member_import_stream(session, member_import_file_chunks(file_path), format=file_format, import_id=import_id,
+                    chunk_size=args.chunk_size, errors_path=errors_path)
+            if import_summary['rows_this_run'] > 0:
+                await member_ids_cache_invalidate()
+            print({ **import_summary, 'errors_path': errors_path })
+        finally:
+            await redis_client_close()
+            await sqlalchemy_engine_dispose()
+    asyncio.run(run())
+
+
+def start_worker():
+    '''Consumes background jobs (bulk creates, imports, filter rebuilds) off the redis job queue'''
+    from jobs.job_worker import start_worker
+    start_worker()
+
+
+START_MODES = {
+    'api': start_api,
+    'filter-rebuild': start_member_id_filter_rebuild,
+    'stats-reconcile': start_member_id_stats_reconcile,
+    'export': start_member_ids_export,
+    'import': start_member_ids_import,
+    'worker': start_worker,
+}
+
 if __name__ == "__main__":
-    start_api()
\ No newline at end of file
+    mode = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('START_MODE', 'api')
+    if mode not in START_MODES:
+        raise ValueError(f'Unknown start mode: {mode}. Expected one of {", ".join(START_MODES)}')
+    # --- secrets are fetched once up front, every later env get reads the in-memory snapshot
+    import env
+    env.secrets_load()
+    START_MODES[mode]()
@@ -0,0 +1,25 @@
+import datetime
+from dateutil import parser
+
+from utils.to_date import to_date
+
+
+def test_to_date():
+    # --- tests: fast paths agree w/ dateutil
+    for date_string in ['01/01/1961', '1/2/1961', '12/31/1999', '1961-01-02', '2000-02-29']:
+        assert to_date(date_string) == parser.parse(date_string).date(), f'Fast path disagrees w/ dateutil: {date_string}'
+    # --- tests: invalid month/day in MM/DD/YYYY falls back to dateutil (reads as DD/MM)
+    assert to_date('13/12/5001') == datetime.date(5001, 12, 13), 'Fallback not used'
+    assert to_date('March 4, 1990') == datetime.date(1990, 3, 4), 'Fallback not used'
+    # --- tests: dates + datetimes pass through
+    assert to_date(datetime.date(1961, 1, 1)) == datetime.date(1961, 1, 1), 'Date not passed through'
+    assert to_date(datetime.datetime(1961, 1, 1, 12, 30)) == datetime.date(1961, 1, 1), 'Datetime not truncated'
+
+
+def test_to_date_invalid():
+    for date_string in ['', 'not a date', '02/30/2000', None]:
+        try:
+            to_date(date_string)
+            assert False, f'Expected a failure for {date_string!r}'
+        except (ValueError, OverflowError):
+            pass
@@ -0,0 +1,24 @@
+PAGINATION_LIMIT_DEFAULT = 100
+PAGINATION_LIMIT_MAX = 1000
+
+
+def to_pagination_params(args) -> tuple[int, int or None]:
+    '''
+    Helper function to pull a keyset pagination contract off request args.
+    Output: Returns a tuple of (limit, after). 'after' is the last id seen by the client (None for the first page)
+    '''
+    # --- limit
+    limit = args.get('limit')
+    try:
+        limit = PAGINATION_LIMIT_DEFAULT if limit == None else int(limit)
+    except ValueError:
+        raise ValueError("'limit' must be an integer")
+    if limit < 1 or limit > PAGINATION_LIMIT_MAX:
+        raise ValueError(f"'limit' must be between 1-{PAGINATION_LIMIT_MAX}")
+    # --- after (cursor)
+    after = args.get('after')
+    try:
+        after = None if after == None or after == '' else int(after)
+    except ValueError:
+        raise ValueError("'after' must be an integer cursor")
+    return limit, after
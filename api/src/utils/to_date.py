@@ -1,10 +1,43 @@
-from dateutil import parser
+import datetime
+from functools import lru_cache
+import re
+
+# To Date Thoughts:
+# - strict fast paths for the formats we actually get (MM/DD/YYYY from the frontend, ISO from scripts/exports), dateutil for anything else
+# - memoized, since one request re-parses the same dob several times (validation, id prefix, user model, @validates hook)
+
+TO_DATE_CACHE_SIZE = 4096
+
+_MM_DD_YYYY_PATTERN = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+_ISO_DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+@lru_cache(maxsize=TO_DATE_CACHE_SIZE)
+def _string_to_date(date_string: str) -> datetime.date:
+    # --- fast path: MM/DD/YYYY (if it isn't a real month/day, ex: '13/12/5001', let dateutil try DD/MM)
+    match = _MM_DD_YYYY_PATTERN.fullmatch(date_string)
+    if match != None:
+        try:
+            return datetime.date(int(match[3]), int(match[1]), int(match[2]))
+        except ValueError:
+            pass
+    # --- fast path: ISO (YYYY-MM-DD)
+    if _ISO_DATE_PATTERN.fullmatch(date_string) != None:
+        try:
+            return datetime.date.fromisoformat(date_string)
+        except ValueError:
+            pass
+    # --- fallback: anything dateutil can make sense of (deferred so it's only loaded by processes that need it)
+    from dateutil import parser
+    return parser.parse(date_string).date()
+
 
 def to_date(date_string):
     '''
     Helper function to cast a loose string to a date type data point
     '''
-    date_string_as_datetime = parser.parse(str(date_string))
-    date_string_as_date = date_string_as_datetime.date()
-    return date_string_as_date
-    
\ No newline at end of file
+    if isinstance(date_string, datetime.datetime):
+        return date_string.date()
+    if isinstance(date_string, datetime.date):
+        return date_string
+    return _string_to_date(str(date_string))